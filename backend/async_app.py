@@ -0,0 +1,24 @@
+"""ASGI serving mode of the backend (same routes and port as backend/app.py).
+
+    > hypercorn backend.async_app:app --bind 127.0.0.1:5000
+"""
+from quart import Quart
+from quart_cors import cors
+
+from backend.async_routes import async_query_blueprint
+from backend.openai_pool import close_async_openai_pool
+from database.async_db import close_async_pool
+
+app = cors(Quart(__name__))  # Enable CORS for all routes
+
+app.register_blueprint(async_query_blueprint)
+
+
+@app.after_serving
+async def close_pools():
+    await close_async_pool()
+    await close_async_openai_pool()
+
+
+if __name__ == '__main__':
+    app.run(host="127.0.0.1", port=5000)
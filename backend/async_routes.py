@@ -0,0 +1,195 @@
+"""Async versions of the query_blueprint routes, served by backend/async_app.py.
+
+LLM calls use AsyncOpenAI and chat SELECT pages use asyncpg, so a request waiting on either does
+not hold a thread. The remaining synchronous steps (query guard, batch execution, template store,
+index advisor) run in worker threads.
+"""
+import time
+import asyncio
+import logging
+
+from quart import Blueprint, Response, current_app, jsonify, request
+
+from database.db_utils import is_read_query, CHAT_PAGE_SIZE
+from database.db_router import set_db_session, get_query_router
+from database.async_db import fetch_page_async
+from database.index_advisor import recommend_indexes
+from backend.openai_utils import query_openai_async, stream_query_openai_async, build_team_async
+from backend.question_templates import answer_from_template, get_template_store
+from backend.prompt_cache import get_prompt_cache_stats
+from backend.routes import (crud_request_options, review_generated_query, complete_select_response,
+                            execute_generated_query)
+
+async_query_blueprint = Blueprint('async_query_api', __name__)
+
+logger = logging.getLogger(__name__)
+
+
+async def generate_query(user_input, options):
+    """Template match, else the LLM; returns (sql_query, response_data)."""
+    sql_query, response_data = (None, None) if options["refresh_cache"] else await asyncio.to_thread(
+        answer_from_template, user_input, options["certainty_threshold"])
+    if sql_query is None:
+        started = time.monotonic()
+        sql_query, response_data = await query_openai_async(user_input, **options)
+        if not response_data.get("cache_hit"):
+            get_template_store().record_llm_latency(time.monotonic() - started)
+    return sql_query, response_data
+
+
+async def classify_generated_query_async(user_input, sql_query, response_data, page_size=CHAT_PAGE_SIZE):
+    """Async classify_generated_query: the guard runs in a thread, the first page over asyncpg."""
+    response, status, select_query = await asyncio.to_thread(review_generated_query, sql_query, response_data)
+    if select_query is None:
+        return response, status
+    try:
+        data, page = await fetch_page_async(select_query, page_size)
+    except Exception as e:
+        return {"response": f"Error fetching data from database: {str(e)}"}, 500
+    response, status, _ = await asyncio.to_thread(complete_select_response, user_input, response, data, page)
+    return response, status
+
+
+@async_query_blueprint.route('/crud', methods=['POST'])
+async def crud_operations():
+    try:
+        body = await request.get_json()
+        user_input = body.get("message", "")
+        set_db_session(body.get("session_id"))
+        if not user_input:
+            return jsonify({"response": "Error: No message provided in the request."}), 400
+
+        sql_query, response_data = await generate_query(user_input, crud_request_options(body))
+        response, status = await classify_generated_query_async(
+            user_input, sql_query, response_data, page_size=body.get("page_size", CHAT_PAGE_SIZE)
+        )
+        return jsonify(response), status
+    except Exception as e:
+        return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+
+
+@async_query_blueprint.route('/crud/stream', methods=['POST'])
+async def crud_stream():
+    body = await request.get_json()
+    user_input = body.get("message", "")
+    if not user_input:
+        return jsonify({"response": "Error: No message provided in the request."}), 400
+    options = crud_request_options(body)
+
+    async def generate():
+        try:
+            set_db_session(body.get("session_id"))
+            sql_query, response_data = (None, None) if options["refresh_cache"] else await asyncio.to_thread(
+                answer_from_template, user_input, options["certainty_threshold"])
+            if sql_query is not None:
+                yield sse_event("token", {"text": sql_query, "min_prob": response_data["min_prob"], "avg_prob": response_data["avg_prob"]})
+            else:
+                started = time.monotonic()
+                async for event, data in stream_query_openai_async(user_input, **options):
+                    if event == "token":
+                        yield sse_event("token", data)
+                    else:
+                        sql_query, response_data = data
+                if not response_data.get("cache_hit"):
+                    get_template_store().record_llm_latency(time.monotonic() - started)
+
+            response, status = await classify_generated_query_async(
+                user_input, sql_query, response_data, page_size=body.get("page_size", CHAT_PAGE_SIZE)
+            )
+            response["status"] = status
+            yield sse_event("result", response)
+        except Exception as e:
+            logger.error(f"Error occurred in crud_stream: {str(e)}")
+            yield sse_event("result", {"response": f"An unexpected error occurred: {str(e)}", "status": 500})
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@async_query_blueprint.route('/crud/page', methods=['POST'])
+async def crud_next_page():
+    try:
+        body = await request.get_json()
+        sql_query = body.get("generated_query", "")
+        page_token = body.get("page_token")
+        set_db_session(body.get("session_id"))
+
+        queries = [q.strip() for q in sql_query.split(";") if q.strip()]
+        if len(queries) != 1 or not is_read_query(queries[0]) or not page_token:
+            return jsonify({"response": "Error: a single SELECT query and a page token are required."}), 400
+
+        try:
+            data, page = await fetch_page_async(queries[0], body.get("page_size", CHAT_PAGE_SIZE), page_token=page_token)
+        except ValueError as e:
+            return jsonify({"response": f"Error: {str(e)}"}), 400
+        return jsonify({"generated_query": sql_query, "fetched_data": data if data else "No results found.", "page": page})
+
+    except Exception as e:
+        return jsonify({"response": f"Error fetching data from database: {str(e)}"}), 500
+
+
+@async_query_blueprint.route('/execute', methods=['POST'])
+async def execute_crud():
+    try:
+        response, status = await asyncio.to_thread(execute_generated_query, await request.get_json())
+        return jsonify(response), status
+    except Exception as e:
+        return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@async_query_blueprint.route('/build_team', methods=['POST'])
+async def build_project_team():
+    try:
+        body = await request.get_json()
+        project_description = body.get("description", "")
+        if not project_description or not isinstance(project_description, str):
+            return jsonify({"error": "Please provide a valid project description."}), 400
+
+        result = await build_team_async(description=project_description, model=body.get("model", "gpt-4o-mini"),
+                                        temperature=body.get("temperature", 0.5),
+                                        certainty_threshold=body.get("certainty_threshold", 0.95),
+                                        api_key=body.get("api_key", None),
+                                        remaining_budget=body.get("remaining_budget"))
+        if isinstance(result, dict):
+            return jsonify(result), 402 if result.get("budget_exceeded") else 500
+
+        recommendation, team_builder_response_data = result
+        return jsonify({
+            "Ideal Team Composition": recommendation,
+            "team_builder_response_data": team_builder_response_data,
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error occurred in build_project_team function: {str(e)}")
+        return jsonify({"response": "An unexpected error occurred."}), 500
+
+
+@async_query_blueprint.route('/question_templates/stats', methods=['GET'])
+async def question_template_stats():
+    return jsonify(get_template_store().stats()), 200
+
+
+@async_query_blueprint.route('/prompt_cache/stats', methods=['GET'])
+async def prompt_cache_stats():
+    return jsonify(get_prompt_cache_stats()), 200
+
+
+@async_query_blueprint.route('/db/stats', methods=['GET'])
+async def db_stats():
+    # The first call creates the replica pools
+    router = await asyncio.to_thread(get_query_router)
+    return jsonify({"latency": router.latency_stats(), "pools": router.pool_stats()}), 200
+
+
+@async_query_blueprint.route('/index_advice', methods=['GET'])
+async def index_advice():
+    try:
+        limit = int(request.args.get("limit", 10))
+        return jsonify({"recommendations": await asyncio.to_thread(recommend_indexes, limit=limit)}), 200
+    except Exception as e:
+        logger.error(f"Error occurred in index_advice function: {str(e)}")
+        return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500
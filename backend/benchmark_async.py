@@ -0,0 +1,172 @@
+"""Throughput of the Flask and ASGI backends under concurrent /crud requests.
+
+Each backend is started on its own port with OPENAI_BASE_URL pointing at a local fake OpenAI
+server that answers after `--llm-delay` seconds, so the numbers measure how well each server
+overlaps the LLM wait (no OpenAI cost). The configured database is used for the generated SELECT.
+
+    python -m backend.benchmark_async [--requests 200] [--concurrency 50] [--llm-delay 2] [--targets flask,asgi]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BENCHMARK_SQL = "SELECT firstname, lastname FROM employees ORDER BY employee_id LIMIT 5;"
+SERVER_START_TIMEOUT = 60      # seconds to wait for a backend to accept connections
+
+SERVER_COMMANDS = {
+    "flask": lambda port: [sys.executable, "-m", "flask", "--app", "backend.app", "run", "--port", str(port), "--with-threads"],
+    "asgi": lambda port: [sys.executable, "-m", "hypercorn", "backend.async_app:app", "--bind", f"127.0.0.1:{port}"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_completion(model):
+    tokens = BENCHMARK_SQL.split(" ")
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": BENCHMARK_SQL},
+            "logprobs": {"content": [{"token": token, "logprob": -0.01, "bytes": None, "top_logprobs": []} for token in tokens]},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 500, "completion_tokens": len(tokens), "total_tokens": 500 + len(tokens),
+                  "prompt_tokens_details": {"cached_tokens": 0}},
+    }
+
+
+def start_fake_openai(port, delay):
+    """Serves /v1/chat/completions with a fixed SQL answer after `delay` seconds (in a daemon thread)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(delay)
+            payload = json.dumps(fake_completion(body.get("model", "gpt-4o-mini"))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Backend did not listen on port {port}")
+
+
+async def run_load(url, requests, concurrency):
+    """Sends `requests` /crud calls with at most `concurrency` in flight; returns latencies and errors."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(client):
+        nonlocal errors
+        # A unique question per request: no LLM cache hit and no question template match
+        payload = {"message": f"list employee names, request {uuid.uuid4().hex}", "api_key": "benchmark"}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=payload)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def benchmark_target(target, fake_port, args):
+    port = free_port()
+    env = dict(os.environ, OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1")
+    process = subprocess.Popen(SERVER_COMMANDS[target](port), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        latencies, errors, elapsed = asyncio.run(run_load(f"http://127.0.0.1:{port}/crud", args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies.sort()
+    return {
+        "target": target,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(args.requests / elapsed, 2),
+        "p50": round(statistics.median(latencies), 3),
+        "p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /crud throughput of the Flask and ASGI backends.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=2.0, help="seconds the fake OpenAI server takes per completion")
+    parser.add_argument("--targets", default="flask,asgi")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    fake_port = free_port()
+    fake_server = start_fake_openai(fake_port, args.llm_delay)
+    results = []
+    try:
+        for target in args.targets.split(","):
+            result = benchmark_target(target.strip(), fake_port, args)
+            results.append(result)
+            print(f"{result['target']:<6} {result['throughput']:>8.2f} req/s   p50 {result['p50']:.3f}s   "
+                  f"p95 {result['p95']:.3f}s   errors {result['errors']}/{result['requests']}")
+    finally:
+        fake_server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
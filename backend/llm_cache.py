@@ -0,0 +1,127 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+from database.db_config import get_data_path
+
+logger = logging.getLogger(__name__)
+
+
+LLM_CACHE_FILE = "llm_cache.sqlite3"     # in the data directory
+LLM_CACHE_MAX_ENTRIES = 2000
+LLM_CACHE_TTL = 7 * 24 * 3600        # seconds, generated SQL goes stale with the data it was written for
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_responses (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+"""
+
+
+def normalize_question(question):
+    """Collapses whitespace and drops trailing punctuation (case is kept: names end up in SQL literals)."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.! ")
+
+
+class LLMResponseCache:
+    """On-disk (SQLite) LRU of LLM responses with TTL, shared by every process using the same file."""
+
+    def __init__(self, path=None, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self._path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ready = False
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "errors": 0}
+
+    @property
+    def path(self):
+        # Resolved on first use: the data directory comes from the environment or st.secrets
+        if self._path is None:
+            self._path = get_data_path(LLM_CACHE_FILE)
+        return self._path
+
+    def make_key(self, question, model, temperature, max_tokens, schema_hash):
+        payload = [normalize_question(question), model, float(temperature), int(max_tokens), schema_hash]
+        return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (hit, value)."""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT value, created_at FROM llm_responses WHERE key = ?;", (key,)).fetchone()
+                if row is None:
+                    self._stats["misses"] += 1
+                    return False, None
+                if row[1] + self.ttl < now:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?;", (key,))
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return False, None
+                conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?;", (now, key))
+                self._stats["hits"] += 1
+                return True, json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            # A broken cache only costs an LLM call
+            self._stats["errors"] += 1
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            return False, None
+
+    def put(self, key, value):
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?);",
+                             (key, json.dumps(value, default=str), now, now))
+                self._stats["stores"] += 1
+                evicted = conn.execute(
+                    "DELETE FROM llm_responses WHERE created_at < ? OR key IN "
+                    "(SELECT key FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?);",
+                    (now - self.ttl, self.max_entries),
+                ).rowcount
+                self._stats["evictions"] += max(0, evicted)
+        except (sqlite3.Error, TypeError) as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Could not store the LLM response in the cache: {e}")
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_responses;")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection committing on success (sqlite connections are not shared across threads)."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL;")
+                conn.execute(CREATE_TABLE_SQL)
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+_llm_cache = LLMResponseCache()
+
+
+def get_llm_cache():
+    """Returns the process-wide LLM response cache."""
+    return _llm_cache
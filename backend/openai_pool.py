@@ -0,0 +1,175 @@
+import time
+import atexit
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+OPENAI_MAX_CONNECTIONS = 20          # connections to the API across every key
+OPENAI_MAX_KEEPALIVE = 10            # idle connections kept open for reuse
+OPENAI_KEEPALIVE_EXPIRY = 120        # seconds an idle connection is kept
+OPENAI_CONNECT_TIMEOUT = 10          # seconds
+OPENAI_REQUEST_TIMEOUT = 180         # seconds, default for completions
+OPENAI_MAX_CLIENTS = 32              # API keys with a client; least recently used are dropped
+OPENAI_CLIENT_IDLE_TTL = 1800        # seconds before the client of an unused key is dropped
+
+
+class OpenAIClientPool:
+    """OpenAI clients per API key, all sending through one keep-alive httpx connection pool."""
+
+    def __init__(self, max_clients=OPENAI_MAX_CLIENTS, idle_ttl=OPENAI_CLIENT_IDLE_TTL):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self._clients = OrderedDict()        # sha256(api key) -> (client, last used)
+        self._streams = weakref.WeakSet()    # network streams (connections) already used once
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "new_connections": 0, "reused_connections": 0, "http2_requests": 0,
+                       "clients_created": 0, "client_hits": 0, "evictions": 0}
+        self._http_client = self._make_http_client()
+
+    def _http_options(self):
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "limits": httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                   max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                                   keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+            "timeout": httpx.Timeout(OPENAI_REQUEST_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        }
+
+    def _make_http_client(self):
+        return httpx.Client(event_hooks={"response": [self._on_response]}, **self._http_options())
+
+    def _make_client(self, api_key):
+        return OpenAI(api_key=api_key, http_client=self._http_client, timeout=OPENAI_REQUEST_TIMEOUT)
+
+    def get(self, api_key):
+        """Returns the client for an API key, creating it on first use."""
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            if key in self._clients:
+                client = self._clients[key][0]
+                self._stats["client_hits"] += 1
+            else:
+                client = self._make_client(api_key)
+                self._stats["clients_created"] += 1
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                # Dropping a client does not close anything: the connections belong to the shared pool
+                self._clients.popitem(last=False)
+                self._stats["evictions"] += 1
+        return client
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["clients"] = len(self._clients)
+        stats["http2"] = HTTP2_AVAILABLE
+        stats["connection_reuse_rate"] = round(stats["reused_connections"] / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+        self._http_client.close()
+
+    def _evict_idle(self, now):
+        idle = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_ttl]
+        for key in idle:
+            del self._clients[key]
+        self._stats["evictions"] += len(idle)
+
+    def _on_response(self, response):
+        # A response arriving on a stream that already carried one reused a kept-alive connection
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self._stats["requests"] += 1
+            if response.http_version == "HTTP/2":
+                self._stats["http2_requests"] += 1
+            if stream is None:
+                return
+            if stream in self._streams:
+                self._stats["reused_connections"] += 1
+            else:
+                self._streams.add(stream)
+                self._stats["new_connections"] += 1
+
+
+class AsyncOpenAIClientPool(OpenAIClientPool):
+    """AsyncOpenAI clients per API key over one httpx.AsyncClient (create and use it in one event loop)."""
+
+    def _make_http_client(self):
+        return httpx.AsyncClient(event_hooks={"response": [self._on_response_async]}, **self._http_options())
+
+    def _make_client(self, api_key):
+        return AsyncOpenAI(api_key=api_key, http_client=self._http_client, timeout=OPENAI_REQUEST_TIMEOUT)
+
+    async def _on_response_async(self, response):
+        self._on_response(response)
+
+    async def aclose(self):
+        with self._lock:
+            self._clients.clear()
+        await self._http_client.aclose()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_openai_pool():
+    """Returns the process-wide OpenAI client pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OpenAIClientPool()
+        return _pool
+
+
+def get_openai_pool_stats():
+    """Returns client and connection reuse counters, or an empty dict if the pool has not been created."""
+    return _pool.stats() if _pool is not None else {}
+
+
+def close_openai_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_openai_pool)
+
+
+_async_pool = None
+
+
+def get_async_openai_pool():
+    """Returns the AsyncOpenAI client pool of the ASGI app (call from its event loop)."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncOpenAIClientPool()
+    return _async_pool
+
+
+async def close_async_openai_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.aclose()
+        _async_pool = None
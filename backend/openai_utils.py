@@ -1,9 +1,20 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-from database.db_utils import get_database_schema, get_build_team_data
+from database.db_utils import get_database_schema
+from database.schema_cache import get_schema_hash
+from database.team_data_store import TeamDataStore
+from database.workload_log import record_statement
+from backend.schema_retriever import get_schema_retriever, get_relevant_schema_text, MAX_TABLES
+from backend.token_utils import count_tokens
+from backend.llm_cache import get_llm_cache
+from backend.openai_pool import get_openai_pool, get_async_openai_pool
+from backend.prompt_cache import record_prompt_usage
+from backend.token_budget import (estimate_request, within_budget, prompt_tokens_allowed, truncate_lines,
+                                  budget_error)
 import math
 import re
+from functools import lru_cache
+import asyncio
 import logging
 import streamlit as st
 
@@ -16,86 +27,311 @@ logger = logging.getLogger(__name__)
 
 
 # Load environment variables
+def resolve_api_key(api_key_from_request=None):
+    return api_key_from_request or st.secrets["openai"]["api_key"]
+
+
 def get_openai_client(api_key_from_request=None):
-    api_key = api_key_from_request or st.secrets["openai"]["api_key"]
+    api_key = resolve_api_key(api_key_from_request)
     if not api_key:
         return None
-    return OpenAI(api_key=api_key, timeout=180)
+    # One client per key, sharing a keep-alive connection pool across requests
+    return get_openai_pool().get(api_key)
 
-SCHEMA_TEXT = get_database_schema()
+def get_schema_text():
+    """Returns the full schema text from the cached schema snapshot."""
+    return str(get_database_schema())
 
 
- 
-def query_openai(prompt, model, temperature, max_tokens, certainty_threshold, api_key):
-        
-    agent = get_openai_client(api_key)  # Use the best available API key
-    if not agent:
-        return None, {"error": "Missing OpenAI API Key"}
-    
-    system_prompt = (
-        "You are an AI assistant that generates SQL queries for CRUD operations (Create, Read, Update, Delete) "
-        "on an employee management system. The database schema is as follows:\n\n"
-        f"{SCHEMA_TEXT}\n\n"
-        "Generate relevant SQL queries in plain text based on the user's input. Do not include any extra text, explanations, or instructions."
-        "Ensure the queries are properly formatted, valid, syntactically correct, properly quoted, and correspond to one of the following operations: "
-        "SELECT (Read), INSERT (Create), UPDATE, DELETE."
-    )
-    
-
-    response = agent.chat.completions.create(
-        model= model,
-        messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
-        max_tokens= max_tokens,
-        temperature= temperature,
-        logprobs= True
-    )
-        
-    sql_query = response.choices[0].message.content
+# Build the schema retriever index at startup (it is rebuilt whenever the schema hash changes)
+try:
+    get_schema_retriever()
+except Exception as e:
+    logger.warning(f"Could not build the schema retriever index at startup: {e}")
 
-    sql_query = format_sql_query(sql_query)
-        
-    # The log probabilities of each output token reflecting certainty    
-    token_log_prob = response.choices[0].logprobs   
-    
-    # Convert logprobs to probabilities
-    if token_log_prob and hasattr(token_log_prob, "content"):
-        token_probabilities = [
-            {"token": token_data.token, "probability": round(math.exp(token_data.logprob), 3)}
-            for token_data in token_log_prob.content
-        ]
-        
-        min_prob = min(tp['probability'] for tp in token_probabilities)
-        avg_prob = round(sum(tp['probability'] for tp in token_probabilities) / len(token_probabilities),3)
-        
-        # Check if min_prov and avg_prob are above threshold to confirm accuracy
-        valid_prob_threshold = min_prob > 0.2 and avg_prob > certainty_threshold
-        
-    else:
-        token_probabilities = []
-        valid_prob_threshold = False
-        
-    # Extract additional response data
+
+ 
+QUERY_INSTRUCTIONS = (
+    "You are an AI assistant that generates SQL queries for CRUD operations (Create, Read, Update, Delete) "
+    "on an employee management system. "
+    "Generate relevant SQL queries in plain text based on the user's input. Do not include any extra text, explanations, or instructions."
+    "Ensure the queries are properly formatted, valid, syntactically correct, properly quoted, and correspond to one of the following operations: "
+    "SELECT (Read), INSERT (Create), UPDATE, DELETE.\n\n"
+    "The relevant part of the database schema is as follows (PK = primary key, FK = foreign key):\n\n"
+)
+
+
+@lru_cache(maxsize=32)
+def full_schema_tokens(schema_hash, model):
+    """Tokens of the full schema text; counted once per schema version and model."""
+    return count_tokens(get_schema_text(), model)
+
+
+def build_query_prompt(prompt, model, max_tables=MAX_TABLES):
+    """Returns the system prompt for a question and the schema pruning figures."""
+    # Only send the tables relevant to the question (plus the tables they reference)
+    schema_text, schema_tables = get_relevant_schema_text(prompt, max_tables)
+    schema_tokens_full = full_schema_tokens(get_schema_hash(), model)
+    schema_tokens_pruned = count_tokens(schema_text, model)
+
+    # Static instructions first, then the schema, then (in the user message) the question:
+    # requests on the same tables share a byte-identical prefix that OpenAI can serve from its prompt cache
+    system_prompt = QUERY_INSTRUCTIONS + schema_text
+    schema_info = {
+        'schema_tables': schema_tables,
+        'schema_tokens_full': schema_tokens_full,
+        'schema_tokens_pruned': schema_tokens_pruned,
+        'schema_tokens_saved': max(0, schema_tokens_full - schema_tokens_pruned),
+    }
+    return system_prompt, schema_info
+
+
+def fit_query_prompt(prompt, model, max_tokens, remaining_budget=None):
+    """Builds the query messages, keeping fewer schema tables while the estimate is over budget.
+
+    Returns (messages, schema_info) with the pre-flight estimate in schema_info, or (None, error
+    response data) when even the smallest schema is over the remaining budget.
+    """
+    for max_tables in range(MAX_TABLES, 0, -1):
+        system_prompt, schema_info = build_query_prompt(prompt, model, max_tables)
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+        estimate = estimate_request(messages, model, max_tokens)
+        schema_info.update({
+            'estimated_prompt_tokens': estimate["prompt_tokens"],
+            'estimated_cost': estimate["cost"],
+            'context_shrunk': max_tables < MAX_TABLES,
+        })
+        if within_budget(estimate, remaining_budget):
+            return messages, schema_info
+    return None, {"error": budget_error(estimate, remaining_budget), "budget_exceeded": True, **schema_info}
+
+
+def token_probabilities_from(logprobs):
+    """Converts the logprobs of a choice (or stream chunk) to [{"token", "probability"}]."""
+    if not logprobs or not getattr(logprobs, "content", None):
+        return []
+    return [
+        {"token": token_data.token, "probability": round(math.exp(token_data.logprob), 3)}
+        for token_data in logprobs.content
+    ]
+
+
+def certainty_summary(token_probabilities, certainty_threshold):
+    """Returns (min_prob, avg_prob, valid_prob_threshold) of the output tokens."""
+    if not token_probabilities:
+        return 0, 0, False
+    min_prob = min(tp['probability'] for tp in token_probabilities)
+    avg_prob = round(sum(tp['probability'] for tp in token_probabilities) / len(token_probabilities), 3)
+    # Check if min_prov and avg_prob are above threshold to confirm accuracy
+    return min_prob, avg_prob, min_prob > 0.2 and avg_prob > certainty_threshold
+
+
+def query_response_data(sql_query, response_id, finish_reason, usage, model, token_probabilities, certainty_threshold, temperature, schema_info, endpoint):
+    min_prob, avg_prob, valid_prob_threshold = certainty_summary(token_probabilities, certainty_threshold)
+    # A stream can end without its usage chunk (aborted, proxies, compatible endpoints): no token accounting then
+    usage_missing = usage is None
     response_data = {
         'query':sql_query, 
-        'response_id': response.id,
-        'finish_reason': finish_reason_dict.get(response.choices[0].finish_reason, "Unknown reason"), 
-        'total_tokens': response.usage.total_tokens,
-        'prompt_tokens': response.usage.prompt_tokens,
-        'completion_tokens': response.usage.completion_tokens,
-        'cached_tokens': max(0, response.usage.prompt_tokens - response.usage.completion_tokens),
+        'response_id': response_id,
+        'finish_reason': finish_reason_dict.get(finish_reason, "Unknown reason"), 
+        'total_tokens': 0 if usage_missing else usage.total_tokens,
+        'prompt_tokens': 0 if usage_missing else usage.prompt_tokens,
+        'completion_tokens': 0 if usage_missing else usage.completion_tokens,
+        'cached_tokens': 0 if usage_missing else record_prompt_usage(endpoint, usage),
+        'usage_missing': usage_missing,
         'token_prob':token_probabilities,
         'min_prob': min_prob,
         'avg_prob': avg_prob,
         'certainty_threshold': certainty_threshold,
         'valid_prob_threshold': valid_prob_threshold,
-        'model': response.model,
-        'temparature': temperature
+        'model': model,
+        'temparature': temperature,
+        'cache_hit': False
     }
- 
-
+    response_data.update(schema_info)
+    return response_data
+
+
+def prepare_query_request(prompt, model, temperature, max_tokens, certainty_threshold, refresh_cache=False, remaining_budget=None):
+    """Steps shared by the query variants before the completion is requested.
+
+    Returns {"cache_key", "messages", "schema_info", "answer"}: `answer` is (sql_query, response_data)
+    when nothing has to be sent, i.e. an LLM cache hit or a request over the remaining budget.
+    """
+    # Same question, model, settings and schema: reuse the stored answer (`refresh_cache` asks for a new one)
+    llm_cache = get_llm_cache()
+    request = {"cache_key": llm_cache.make_key(prompt, model, temperature, max_tokens, get_schema_hash()),
+               "messages": None, "schema_info": None, "answer": None}
+    if not refresh_cache:
+        hit, cached_data = llm_cache.get(request["cache_key"])
+        if hit:
+            request["answer"] = (cached_data["query"], cached_response_data(cached_data, certainty_threshold))
+            return request
+
+    # Counted and priced before sending: over the remaining budget, less schema is sent or nothing at all
+    messages, schema_info = fit_query_prompt(prompt, model, max_tokens, remaining_budget)
+    if messages is None:
+        request["answer"] = (None, schema_info)
+    request["messages"], request["schema_info"] = messages, schema_info
+    return request
+
+
+def completion_arguments(request, model, temperature, max_tokens, stream=False):
+    arguments = {"model": model, "messages": request["messages"], "max_tokens": max_tokens,
+                 "temperature": temperature, "logprobs": True}
+    if stream:
+        arguments.update(stream=True, stream_options={"include_usage": True})
+    return arguments
+
+
+def finish_query_request(request, completion, certainty_threshold, temperature, endpoint):
+    """Steps shared by the query variants once the completion (a StreamedCompletion or a response) is complete."""
+    if isinstance(completion, StreamedCompletion):
+        content, response_id, response_model = "".join(completion.parts), completion.response_id, completion.model
+        finish_reason, usage, token_probabilities = completion.finish_reason, completion.usage, completion.token_probabilities
+    else:
+        choice = completion.choices[0]
+        content, response_id, response_model = choice.message.content, completion.id, completion.model
+        # The log probabilities of each output token reflecting certainty
+        finish_reason, usage, token_probabilities = choice.finish_reason, completion.usage, token_probabilities_from(choice.logprobs)
+
+    sql_query = format_sql_query(content)
+    record_statement(sql_query, "llm")
+    response_data = query_response_data(sql_query, response_id, finish_reason, usage, response_model,
+                                        token_probabilities, certainty_threshold, temperature, request["schema_info"], endpoint)
+
+    # Truncated or filtered completions are not worth replaying
+    if finish_reason == "stop":
+        get_llm_cache().put(request["cache_key"], response_data)
     return sql_query, response_data
 
 
+class StreamedCompletion:
+    """Collects the chunks of a streamed completion and the certainty so far."""
+
+    def __init__(self, certainty_threshold):
+        self.certainty_threshold = certainty_threshold
+        self.parts, self.token_probabilities = [], []
+        self.response_id = self.model = self.finish_reason = self.usage = None
+
+    def add(self, chunk):
+        """Adds a chunk; returns the "token" event to send, or None when it carried no text."""
+        self.response_id, self.model = chunk.id, chunk.model
+        if chunk.usage is not None:
+            self.usage = chunk.usage       # sent in a last chunk without choices
+        if not chunk.choices:
+            return None
+        choice = chunk.choices[0]
+        self.finish_reason = choice.finish_reason or self.finish_reason
+        text = choice.delta.content or ""
+        self.token_probabilities += token_probabilities_from(choice.logprobs)
+        if not text:
+            return None
+        self.parts.append(text)
+        min_prob, avg_prob, _ = certainty_summary(self.token_probabilities, self.certainty_threshold)
+        return {"text": text, "min_prob": min_prob, "avg_prob": avg_prob}
+
+
+def answer_events(answer):
+    """Stream events of an answer given without calling the model (cache hit or refusal)."""
+    sql_query, response_data = answer
+    if sql_query is not None:
+        yield "token", {"text": sql_query, "min_prob": response_data["min_prob"], "avg_prob": response_data["avg_prob"]}
+    yield "done", answer
+
+
+def query_openai(prompt, model, temperature, max_tokens, certainty_threshold, api_key, refresh_cache=False, remaining_budget=None):
+        
+    agent = get_openai_client(api_key)  # Use the best available API key
+    if not agent:
+        return None, {"error": "Missing OpenAI API Key"}
+
+    request = prepare_query_request(prompt, model, temperature, max_tokens, certainty_threshold, refresh_cache, remaining_budget)
+    if request["answer"] is not None:
+        return request["answer"]
+
+    response = agent.chat.completions.create(**completion_arguments(request, model, temperature, max_tokens))
+    return finish_query_request(request, response, certainty_threshold, temperature, "/crud")
+
+
+def stream_query_openai(prompt, model, temperature, max_tokens, certainty_threshold, api_key, refresh_cache=False, remaining_budget=None):
+    """Streaming variant of query_openai.
+
+    Yields ("token", {"text", "min_prob", "avg_prob"}) as the completion arrives (certainty so far),
+    then ("done", (sql_query, response_data)) once the usage is known.
+    """
+    agent = get_openai_client(api_key)
+    if not agent:
+        yield "done", (None, {"error": "Missing OpenAI API Key"})
+        return
+
+    request = prepare_query_request(prompt, model, temperature, max_tokens, certainty_threshold, refresh_cache, remaining_budget)
+    if request["answer"] is not None:
+        yield from answer_events(request["answer"])
+        return
+
+    completion = StreamedCompletion(certainty_threshold)
+    for chunk in agent.chat.completions.create(**completion_arguments(request, model, temperature, max_tokens, stream=True)):
+        event = completion.add(chunk)
+        if event is not None:
+            yield "token", event
+    yield "done", finish_query_request(request, completion, certainty_threshold, temperature, "/crud/stream")
+
+
+async def query_openai_async(prompt, model, temperature, max_tokens, certainty_threshold, api_key, refresh_cache=False, remaining_budget=None):
+    """query_openai for the ASGI app: the completion is awaited, blocking helpers run in a thread."""
+    api_key = resolve_api_key(api_key)
+    if not api_key:
+        return None, {"error": "Missing OpenAI API Key"}
+    agent = get_async_openai_pool().get(api_key)
+
+    request = await asyncio.to_thread(prepare_query_request, prompt, model, temperature, max_tokens, certainty_threshold,
+                                      refresh_cache, remaining_budget)
+    if request["answer"] is not None:
+        return request["answer"]
+
+    response = await agent.chat.completions.create(**completion_arguments(request, model, temperature, max_tokens))
+    return await asyncio.to_thread(finish_query_request, request, response, certainty_threshold, temperature, "/crud")
+
+
+async def stream_query_openai_async(prompt, model, temperature, max_tokens, certainty_threshold, api_key, refresh_cache=False, remaining_budget=None):
+    """Async generator counterpart of stream_query_openai."""
+    api_key = resolve_api_key(api_key)
+    if not api_key:
+        yield "done", (None, {"error": "Missing OpenAI API Key"})
+        return
+    agent = get_async_openai_pool().get(api_key)
+
+    request = await asyncio.to_thread(prepare_query_request, prompt, model, temperature, max_tokens, certainty_threshold,
+                                      refresh_cache, remaining_budget)
+    if request["answer"] is not None:
+        for event in answer_events(request["answer"]):
+            yield event
+        return
+
+    completion = StreamedCompletion(certainty_threshold)
+    async for chunk in await agent.chat.completions.create(**completion_arguments(request, model, temperature, max_tokens, stream=True)):
+        event = completion.add(chunk)
+        if event is not None:
+            yield "token", event
+    yield "done", await asyncio.to_thread(finish_query_request, request, completion, certainty_threshold, temperature, "/crud/stream")
+
+
+def cached_response_data(cached_data, certainty_threshold):
+    """Response data of a cache hit: no tokens billed, certainty re-checked against the current threshold."""
+    response_data = dict(cached_data)
+    response_data.update({
+        'cache_hit': True,
+        'total_tokens': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_tokens': 0,
+        'certainty_threshold': certainty_threshold,
+        'valid_prob_threshold': cached_data['min_prob'] > 0.2 and cached_data['avg_prob'] > certainty_threshold,
+    })
+    return response_data
+
+
 finish_reason_dict = {
     "stop": "stop -> Response completed naturally ✅",
     "length": "length -> Response was cut off due to the token limit ⚠️",
@@ -132,110 +368,204 @@ def format_sql_query(sql_query):
 
 
 import os
-from openai import OpenAI
 
-DATA = get_build_team_data()    # Includes information about employees (profile, experience...)
+# Includes information about employees (profile, experience...), kept fresh by a background refresher
+team_data_store = TeamDataStore(token_counter=count_tokens)
+team_data_store.start()
+
 
+TEAM_BUILDER_INSTRUCTIONS = (
+    "You are an AI HR assistant helping managers build project teams by selecting employees based on their roles, skills, availability, and past validated tasks. "
+    "Your goal is to first generate an **Ideal Team Composition** based on the project requirements given by the user, then match the best employees from the provided dataset (`DATA`)."
 
-def build_team(description, model, temperature, certainty_threshold, api_key=None):
+    "\n\n### Part 1: Ideal Team Composition (General Roles & Skills)\n"
+    "- Identify key roles needed for this project.\n"
+    "- List essential skills and experience levels required for each role.\n"
+    "- Consider **junior employees** for some positions.\n"
+    "- Estimate the number of team members required per role.\n\n"
+
+    "- This section should **not** consider the provided employee data (`DATA`).\n\n"
+
+    "### Part 2: Matching Employees from Provided Data\n"
+    "From the available employees in the dataset (`DATA`), match the best candidates based on:\n"
+    "- **Role**: Must align with the required project roles.\n"
+    "- **Skills & Proficiency Level**: Match required skills as closely as possible.\n"
+    "- **Years of Experience**: Consider experience relevant to the role.\n"
+    "- **Validated Tasks**: Prior successful tasks should be prioritized.\n\n"
+
+    "### Output Format:\n"
+    "**Required Profiles:**\n"
+    "- Role 1: [Required Skills, Experience Level]\n"
+    "- Role 2: [Required Skills, Experience Level]\n"
+    "- (Continue listing all required roles)\n\n"
+
+    "**Matching Employees:**\n"
+    "- Role 1: [employee_1, employee_2, ...]\n"
+    "- Role 2: [employee3, employee_4 ...]\n"
+    "- (Continue listing all roles with matched Employee firstname and lastname only)\n\n"
+
+    "Important Notes:\n"
+    "- **Only use employees from `DATA`**, as it already contains only available profiles.\n"
+    "- Ensure optimal team composition based on the best possible matches.\n"
+    "- If no exact match is found, suggest the closest alternative.\n\n"
+
+    "### DATA (available employees, ensure you are matching roles correctly):\n"
+)
+
+
+TEAM_BUILDER_MAX_TOKENS = 800
+MIN_TEAM_DATA_EMPLOYEES = 10    # a cut DATA keeps at least this many employees...
+MIN_TEAM_DATA_SHARE = 0.25      # ...or this share of the snapshot when it is smaller, else the request is refused
+
+
+def min_team_data_employees(total_employees):
+    """Fewest employees a budget-cut DATA may keep for a snapshot of `total_employees`."""
+    return min(MIN_TEAM_DATA_EMPLOYEES, max(1, math.ceil(total_employees * MIN_TEAM_DATA_SHARE)))
+
+
+def too_few_employees_error(kept, total_employees, needed, remaining_budget):
+    return (f"Request refused: only {kept} of the {total_employees} available employees fit in the remaining session "
+            f"budget (€{max(remaining_budget, 0):.4f}), at least {needed} are needed to build a team.")
+
+
+def team_builder_messages(description, data_text):
+    return [
+        {"role": "system", "content": TEAM_BUILDER_INSTRUCTIONS + data_text},
+        {"role": "user", "content": f"### Project Description & Requirements:\n{description}"},
+    ]
+
+
+def build_team_prompt(description, model, remaining_budget=None):
+    """Returns the team builder messages, the employee snapshot and the pre-flight estimate.
+
+    The system prompt (instructions, then DATA) only changes when the snapshot is refreshed, so
+    OpenAI can serve it from its prompt cache; the project description goes in the user message.
+    Over the remaining budget, only the employees that fit are sent; messages is None (and the
+    third value holds the error) when fewer than min_team_data_employees of them would.
+    """
+    team_data = team_data_store.get()
+    messages = team_builder_messages(description, team_data.text)
+    estimate = estimate_request(messages, model, TEAM_BUILDER_MAX_TOKENS)
+    budget_info = {"data_employees_dropped": 0}
+
+    if not within_budget(estimate, remaining_budget):
+        # DATA is the bulk of the prompt: cut it to what the budget leaves after the rest of the prompt
+        other_tokens = estimate["prompt_tokens"] - count_tokens(team_data.text, model)
+        data_budget = prompt_tokens_allowed(model, TEAM_BUILDER_MAX_TOKENS, remaining_budget) - other_tokens
+        data_text, kept, dropped = truncate_lines(team_data.text, data_budget, model)
+        budget_info["data_employees_dropped"] = dropped
+        needed = min_team_data_employees(kept + dropped)
+        if kept < needed:
+            error = too_few_employees_error(kept, kept + dropped, needed, remaining_budget)
+            return None, team_data, {"error": error, "budget_exceeded": True, **budget_info}
+        messages = team_builder_messages(description, data_text)
+        estimate = estimate_request(messages, model, TEAM_BUILDER_MAX_TOKENS)
+        if not within_budget(estimate, remaining_budget):
+            return None, team_data, {"error": budget_error(estimate, remaining_budget), "budget_exceeded": True, **budget_info}
+
+    budget_info.update({"estimated_prompt_tokens": estimate["prompt_tokens"], "estimated_cost": estimate["cost"]})
+    return messages, team_data, budget_info
+
+
+def team_builder_response(response, team_data, temperature, certainty_threshold, budget_info=None, endpoint="/build_team"):
+    """Returns (recommendation, team_builder_response_data) from a completion."""
+    if not response.choices:
+        raise ValueError("No valid choices in the response.")
+
+    recommendation = response.choices[0].message.content
+    token_log_prob = response.choices[0].logprobs if hasattr(response.choices[0], "logprobs") else None
+
+    # Convert logprobs to probabilities if available
+    if token_log_prob and hasattr(token_log_prob, "content"):
+        token_probabilities = [
+            {"token": token_data.token, "probability": round(math.exp(token_data.logprob), 3)}
+            for token_data in token_log_prob.content
+        ]
+        min_prob = min(tp["probability"] for tp in token_probabilities)
+        avg_prob = round(sum(tp["probability"] for tp in token_probabilities) / len(token_probabilities), 2)
+        valid_prob_threshold = min_prob > 0.2 and avg_prob > certainty_threshold
+    else:
+        token_probabilities = []
+        min_prob = 0
+        avg_prob = 0
+        valid_prob_threshold = False
+
+    # Extract additional response data
+    team_builder_response_data = {
+        "response_id": response.id,
+        "finish_reason": finish_reason_dict.get(response.choices[0].finish_reason, "Unknown reason"), 
+        "total_tokens": response.usage.total_tokens,
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens,
+        "cached_tokens": record_prompt_usage(endpoint, response.usage),
+        "min_prob": min_prob,
+        "avg_prob": avg_prob,
+        "certainty_threshold": certainty_threshold,
+        "valid_prob_threshold": valid_prob_threshold,
+        "model": response.model,
+        "temperature": temperature,
+        "data_tokens_before": team_data.stats.get("tokens_before"),
+        "data_tokens_after": team_data.stats.get("tokens_after"),
+        "data_refreshed_at": team_data.refreshed_at
+    }
+    team_builder_response_data.update(budget_info or {})
+
+    return recommendation, team_builder_response_data
+
+
+def get_team_builder_api_key(api_key=None):
+    # Get API key: prioritize function argument > Streamlit secrets > .env
+    api_key = api_key or st.secrets.get("openai", {}).get("api_key") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("Missing OpenAI API key. Set it in Streamlit secrets, .env, or provide it as an argument.")
+    return api_key
+
+
+def build_team(description, model, temperature, certainty_threshold, api_key=None, remaining_budget=None):
     try:
-        # Get API key: prioritize function argument > Streamlit secrets > .env
-        api_key = api_key or st.secrets.get("openai", {}).get("api_key") or os.getenv("OPENAI_API_KEY")
-
-        if not api_key:
-            raise ValueError("Missing OpenAI API key. Set it in Streamlit secrets, .env, or provide it as an argument.")
-
-        agent = OpenAI(api_key=api_key, timeout=60)  # Adjust timeout if needed
-
-        system_prompt = (
-            "You are an AI HR assistant helping managers build project teams by selecting employees based on their roles, skills, availability, and past validated tasks. "
-            "Your goal is to first generate an **Ideal Team Composition** based on the project requirements, then match the best employees from the provided dataset (`DATA`)."
-
-            "\n\n### Project Description & Requirements:\n"
-            f"{description}\n\n"
-
-            "### Part 1: Ideal Team Composition (General Roles & Skills)\n"
-            "- Identify key roles needed for this project.\n"
-            "- List essential skills and experience levels required for each role.\n"
-            "- Consider **junior employees** for some positions.\n"
-            "- Estimate the number of team members required per role.\n\n"
-
-            "- This section should **not** consider the provided employee data (`DATA`).\n\n"
-
-            "### Part 2: Matching Employees from Provided Data\n"
-            "From the available employees in the dataset (`DATA`), match the best candidates based on:\n"
-            "- **Role**: Must align with the required project roles.\n"
-            "- **Skills & Proficiency Level**: Match required skills as closely as possible.\n"
-            "- **Years of Experience**: Consider experience relevant to the role.\n"
-            "- **Validated Tasks**: Prior successful tasks should be prioritized.\n"
-            
-            "Here are some example employees from the dataset (ensure you are matching roles correctly):\n"
-            f"{DATA}\n\n" 
-
-            "### Output Format:\n"
-            "**Required Profiles:**\n"
-            "- Role 1: [Required Skills, Experience Level]\n"
-            "- Role 2: [Required Skills, Experience Level]\n"
-            "- (Continue listing all required roles)\n\n"
-
-            "**Matching Employees:**\n"
-            "- Role 1: [employee_1, employee_2, ...]\n"
-            "- Role 2: [employee3, employee_4 ...]\n"
-            "- (Continue listing all roles with matched Employee firstname and lastname only)\n\n"
-
-            "Important Notes:\n"
-            "- **Only use employees from `DATA`**, as it already contains only available profiles.\n"
-            "- Ensure optimal team composition based on the best possible matches.\n"
-            "- If no exact match is found, suggest the closest alternative."
-        )
+        api_key = get_team_builder_api_key(api_key)
+        agent = get_openai_pool().get(api_key).with_options(timeout=60)  # Adjust timeout if needed
+
+        # Counted and priced before sending: over the remaining budget, DATA is cut or the request refused
+        messages, team_data, budget_info = build_team_prompt(description, model, remaining_budget)
+        if messages is None:
+            return budget_info
 
         response = agent.chat.completions.create(
             model=model,  
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": description}],
-            max_tokens=800,
+            messages=messages,
+            max_tokens=TEAM_BUILDER_MAX_TOKENS,
             temperature=temperature,
             logprobs=True
         )
 
-        if not response.choices:
-            raise ValueError("No valid choices in the response.")
-
-        recommendation = response.choices[0].message.content
-        token_log_prob = response.choices[0].logprobs if hasattr(response.choices[0], "logprobs") else None
-
-        # Convert logprobs to probabilities if available
-        if token_log_prob and hasattr(token_log_prob, "content"):
-            token_probabilities = [
-                {"token": token_data.token, "probability": round(math.exp(token_data.logprob), 3)}
-                for token_data in token_log_prob.content
-            ]
-            min_prob = min(tp["probability"] for tp in token_probabilities)
-            avg_prob = round(sum(tp["probability"] for tp in token_probabilities) / len(token_probabilities), 2)
-            valid_prob_threshold = min_prob > 0.2 and avg_prob > certainty_threshold
-        else:
-            token_probabilities = []
-            min_prob = 0
-            avg_prob = 0
-            valid_prob_threshold = False
-
-        # Extract additional response data
-        team_builder_response_data = {
-            "response_id": response.id,
-            "finish_reason": finish_reason_dict.get(response.choices[0].finish_reason, "Unknown reason"), 
-            "total_tokens": response.usage.total_tokens,
-            "prompt_tokens": response.usage.prompt_tokens,
-            "completion_tokens": response.usage.completion_tokens,
-            "cached_tokens": max(0, response.usage.prompt_tokens - response.usage.completion_tokens),
-            "min_prob": min_prob,
-            "avg_prob": avg_prob,
-            "certainty_threshold": certainty_threshold,
-            "valid_prob_threshold": valid_prob_threshold,
-            "model": response.model,
-            "temperature": temperature
-        }
-
-        return recommendation, team_builder_response_data
+        return team_builder_response(response, team_data, temperature, certainty_threshold, budget_info)
 
     except Exception as e:
         logger.error(f"Error occurred in build_team function: {str(e)}")
         return {"error": f"An error occurred: {str(e)}"}
+
+
+async def build_team_async(description, model, temperature, certainty_threshold, api_key=None, remaining_budget=None):
+    """build_team for the ASGI app: the completion is awaited instead of holding a thread."""
+    try:
+        api_key = get_team_builder_api_key(api_key)
+        agent = get_async_openai_pool().get(api_key).with_options(timeout=60)
+
+        messages, team_data, budget_info = await asyncio.to_thread(build_team_prompt, description, model, remaining_budget)
+        if messages is None:
+            return budget_info
+
+        response = await agent.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=TEAM_BUILDER_MAX_TOKENS,
+            temperature=temperature,
+            logprobs=True
+        )
+
+        return team_builder_response(response, team_data, temperature, certainty_threshold, budget_info)
+
+    except Exception as e:
+        logger.error(f"Error occurred in build_team_async function: {str(e)}")
+        return {"error": f"An error occurred: {str(e)}"}
@@ -0,0 +1,48 @@
+import threading
+
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens OpenAI served from its prompt cache (0 when the usage has no details)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+
+class PromptCacheStats:
+    """Prompt tokens sent and served from the provider-side prompt cache, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, prompt_tokens, cached_tokens):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {"requests": 0, "cached_requests": 0,
+                                                          "prompt_tokens": 0, "cached_tokens": 0})
+            stats["requests"] += 1
+            stats["cached_requests"] += 1 if cached_tokens else 0
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def stats(self):
+        """Returns {endpoint: counters plus `token_hit_rate` and `request_hit_rate`}."""
+        with self._lock:
+            endpoints = {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+        for stats in endpoints.values():
+            stats["token_hit_rate"] = round(stats["cached_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+            stats["request_hit_rate"] = round(stats["cached_requests"] / stats["requests"], 4)
+        return endpoints
+
+
+_stats = PromptCacheStats()
+
+
+def record_prompt_usage(endpoint, usage):
+    """Counts the prompt and cached tokens of a completion; returns the cached tokens."""
+    cached_tokens = cached_prompt_tokens(usage)
+    if usage is not None:
+        _stats.record(endpoint, usage.prompt_tokens, cached_tokens)
+    return cached_tokens
+
+
+def get_prompt_cache_stats():
+    return _stats.stats()
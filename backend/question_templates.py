@@ -0,0 +1,312 @@
+"""Question templates learned from successful /crud runs.
+
+A question and the SQL generated for it are turned into a template by replacing the literals
+found in both ("what is the salary of {0} {1}" / "... WHERE firstname = '{0}' AND lastname = '{1}'").
+A new question whose words outside the slots are exactly those of a template gets the template
+SQL with the new literals filled in, without calling the LLM. Only read-only SQL is templated.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from difflib import SequenceMatcher
+
+from database.query_cache import STRING_LITERAL
+from database.db_utils import is_read_query
+from database.db_config import get_data_path
+from database.schema_cache import get_schema_hash
+
+logger = logging.getLogger(__name__)
+
+
+TEMPLATE_STORE_FILE = "question_templates.json"     # in the data directory
+TEMPLATE_STORE_MAX = 500             # least recently used templates are dropped above this
+
+WORD = re.compile(r"\w+(?:['.@-]\w+)*")
+NUMBER = re.compile(r"(?<![\w.'])-?\d+(?:\.\d+)?(?![\w.'])")
+SLOT_PREFIX = "\x00slot"
+
+
+def words(text):
+    """[(word, start, end)] of a question; punctuation is ignored."""
+    return [(match.group(0), match.start(), match.end()) for match in WORD.finditer(text)]
+
+
+def is_slot(token):
+    return token.startswith(SLOT_PREFIX)
+
+
+def find_span(question_words, value_words, taken):
+    """Index range of `value_words` in the question words (case-insensitive), or None."""
+    size = len(value_words)
+    lowered = [word.lower() for word, _, _ in question_words]
+    for start in range(len(lowered) - size + 1):
+        if lowered[start:start + size] == value_words and not taken & set(range(start, start + size)):
+            return start, start + size
+    return None
+
+
+def letter_case(sql_value, question_value):
+    """How the question text was turned into the SQL literal (upper case is kept as is: usually an acronym)."""
+    for name, convert in (("keep", str), ("lower", str.lower), ("title", str.title)):
+        if convert(question_value) == sql_value:
+            return name
+    return "keep"
+
+
+def apply_case(value, name):
+    return {"lower": str.lower, "title": str.title}.get(name, str)(value)
+
+
+def sql_literals(sql_query):
+    """[(start, end, kind, core, prefix, suffix)] for string and numeric literals, in order."""
+    literals = []
+    for match in STRING_LITERAL.finditer(sql_query):
+        content = match.group(0)[1:-1].replace("''", "'")
+        core = content.strip("%")
+        prefix = content[:len(content) - len(content.lstrip("%"))]
+        suffix = content[len(content.rstrip("%")):] if core else ""
+        literals.append((match.start(), match.end(), "string", core, prefix, suffix))
+    masked = STRING_LITERAL.sub(lambda match: " " * len(match.group(0)), sql_query)
+    for match in NUMBER.finditer(masked):
+        literals.append((match.start(), match.end(), "number", match.group(0), "", ""))
+    return sorted(literals)
+
+
+def build_template(question, sql_query):
+    """Returns (pattern tokens, sql template, slots) or None if no literal of the SQL is in the question."""
+    question_words = words(question)
+    taken, slots, slot_of = set(), [], {}
+    sql_parts, position = [], 0
+    spans = {}
+
+    for start, end, kind, core, prefix, suffix in sql_literals(sql_query):
+        value_words = [word.lower() for word, _, _ in words(core)]
+        key = (kind, core.lower())
+        if key not in slot_of:
+            span = find_span(question_words, value_words, taken) if value_words else None
+            # The literal must be exactly those words (not e.g. a date the question spells differently)
+            if span is None or " ".join(value_words) != core.lower():
+                continue
+            question_value = question[question_words[span[0]][1]:question_words[span[1] - 1][2]]
+            slot_of[key] = len(slots)
+            slots.append({"kind": kind, "case": letter_case(core, question_value)})
+            spans[span] = slot_of[key]
+            taken |= set(range(*span))
+        index = slot_of[key]
+        literal = "{%d}" % index if kind == "number" else "'%s{%d}%s'" % (prefix, index, suffix)
+        sql_parts.append(sql_query[position:start].replace("{", "{{").replace("}", "}}"))
+        sql_parts.append(literal)
+        position = end
+
+    if not slots:
+        return None
+    sql_parts.append(sql_query[position:].replace("{", "{{").replace("}", "}}"))
+
+    pattern, index = [], 0
+    for span in sorted(spans):
+        pattern += [word.lower() for word, _, _ in question_words[index:span[0]]]
+        pattern.append(f"{SLOT_PREFIX}{spans[span]}")
+        index = span[1]
+    pattern += [word.lower() for word, _, _ in question_words[index:]]
+    return pattern, "".join(sql_parts), slots
+
+
+def match_pattern(pattern, question):
+    """Aligns a question with a template pattern; returns {slot: text} or None.
+
+    Every word outside the slots must be equal: a single added, removed or changed word (e.g. a
+    "not") can change the meaning of the question, so only the slot values may differ.
+    """
+    question_words = words(question)
+    matcher = SequenceMatcher(a=pattern, b=[word.lower() for word, _, _ in question_words], autojunk=False)
+    values = {}
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        slots = [int(token[len(SLOT_PREFIX):]) for token in pattern[i1:i2] if is_slot(token)]
+        if not slots or len(slots) != i2 - i1 or j2 == j1:
+            return None          # changed fixed words, a slot next to them, or a slot with no value
+        if len(slots) == 1:
+            ranges = [(j1, j2)]
+        elif len(slots) == j2 - j1:
+            ranges = [(j, j + 1) for j in range(j1, j2)]
+        else:
+            return None          # several slots over several words: ambiguous
+        for slot, (start, end) in zip(slots, ranges):
+            values[slot] = question[question_words[start][1]:question_words[end - 1][2]]
+
+    if len(values) != sum(1 for token in pattern if is_slot(token)):
+        return None
+    return values
+
+
+def fill_template(template, values):
+    """Renders the template SQL with the slot values, or None if a value does not fit its slot."""
+    rendered = []
+    for index, slot in enumerate(template["slots"]):
+        value = apply_case(values[index], slot["case"])
+        if slot["kind"] == "number":
+            if not NUMBER.fullmatch(value):
+                return None
+            rendered.append(value)
+        else:
+            rendered.append(value.replace("'", "''"))
+    return template["sql"].format(*rendered)
+
+
+def is_read_only(sql_query):
+    return all(is_read_query(query) for query in sql_query.split(";") if query.strip())
+
+
+def fixed_words(template):
+    return sum(1 for token in template["pattern"] if not is_slot(token))
+
+
+class QuestionTemplateStore:
+    """LRU of question templates persisted to a JSON file, with match statistics."""
+
+    def __init__(self, path=None, max_templates=TEMPLATE_STORE_MAX):
+        self._path = path
+        self.max_templates = max_templates
+        self._templates = None      # pattern key -> template, loaded on first use
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "matches": 0, "learned": 0, "saved_seconds": 0.0}
+        self._llm_latency = None    # moving average of LLM round trips, in seconds
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = get_data_path(TEMPLATE_STORE_FILE)
+        return self._path
+
+    def learn(self, question, sql_query, response_data=None):
+        """Stores the template of a question whose SQL ran successfully; returns True if one was stored."""
+        # Writes are never served without the LLM, so there is nothing to learn from them
+        if not is_read_only(sql_query):
+            return False
+        built = build_template(question, sql_query)
+        if built is None:
+            return False
+        pattern, sql_template, slots = built
+        response_data = response_data or {}
+        template = {
+            "pattern": pattern,
+            "sql": sql_template,
+            "slots": slots,
+            "example": question,
+            "schema_hash": get_schema_hash(),
+            "model": response_data.get("model"),
+            "min_prob": response_data.get("min_prob"),
+            "avg_prob": response_data.get("avg_prob"),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            templates = self._load()
+            templates[json.dumps(pattern)] = template
+            while len(templates) > self.max_templates:
+                oldest = min(templates, key=lambda key: templates[key]["last_used"])
+                del templates[oldest]
+            self._stats["learned"] += 1
+            self._save()
+        return True
+
+    def match(self, question):
+        """Returns (sql, template) of the most specific template matching a question, or None."""
+        start = time.monotonic()
+        schema_hash = get_schema_hash()
+        best = None
+        with self._lock:
+            self._stats["lookups"] += 1
+            for template in self._load().values():
+                if template["schema_hash"] != schema_hash or not is_read_only(template["sql"]):
+                    continue
+                # Several templates can match (slots in different places): keep the one with most fixed words
+                if best and fixed_words(template) <= fixed_words(best[1]):
+                    continue
+                values = match_pattern(template["pattern"], question)
+                sql_query = fill_template(template, values) if values is not None else None
+                if sql_query is not None:
+                    best = (sql_query, template)
+            if best is None:
+                return None
+            best[1]["last_used"] = time.time()
+            self._stats["matches"] += 1
+            if self._llm_latency is not None:
+                self._stats["saved_seconds"] += max(0.0, self._llm_latency - (time.monotonic() - start))
+        return best
+
+    def record_llm_latency(self, seconds):
+        """Feeds the LLM round trip time used to estimate the latency saved by a match."""
+        with self._lock:
+            self._llm_latency = seconds if self._llm_latency is None else 0.8 * self._llm_latency + 0.2 * seconds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["templates"] = len(self._load())
+            stats["avg_llm_latency"] = round(self._llm_latency, 3) if self._llm_latency is not None else None
+        stats["match_rate"] = round(stats["matches"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
+
+    def _load(self):
+        if self._templates is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self._templates = json.load(file)
+            except FileNotFoundError:
+                self._templates = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load question templates, starting empty: {e}")
+                self._templates = {}
+        return self._templates
+
+    def _save(self):
+        try:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._templates, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save question templates: {e}")
+
+
+_template_store = QuestionTemplateStore()
+
+
+def get_template_store():
+    """Returns the process-wide question template store."""
+    return _template_store
+
+
+def answer_from_template(question, certainty_threshold):
+    """Returns (sql_query, response_data) from the best matching template, or (None, None)."""
+    match = _template_store.match(question)
+    if match is None:
+        return None, None
+    sql_query, template = match
+    min_prob = template["min_prob"] or 0
+    avg_prob = template["avg_prob"] or 0
+    response_data = {
+        'query': sql_query,
+        'response_id': None,
+        'finish_reason': "template -> Filled from a stored question template ♻️",
+        'total_tokens': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_tokens': 0,
+        'token_prob': [],
+        'min_prob': min_prob,
+        'avg_prob': avg_prob,
+        'certainty_threshold': certainty_threshold,
+        # The words around the slots are those of the original question: it inherits its certainty
+        'valid_prob_threshold': min_prob > 0.2 and avg_prob > certainty_threshold,
+        'model': template["model"],
+        'cache_hit': True,
+        'template_match': {"example": template["example"]},
+    }
+    return sql_query, response_data
@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify
-from database.db_utils import fetch_from_db, execute_query
-from backend.openai_utils import query_openai, build_team
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from database.db_utils import fetch_page, is_read_query, CHAT_PAGE_SIZE
+from database.batch_executor import execute_batch_queries
+from database.arrow_utils import ARROW_AVAILABLE, ARROW_STREAM_MIMETYPE, table_to_ipc
+from database.db_router import set_db_session, get_query_router
+from database.query_guard import estimate_queries, describe_estimate
+from database.index_advisor import recommend_indexes
+from backend.openai_utils import query_openai, stream_query_openai, build_team
+from backend.question_templates import answer_from_template, get_template_store
+from backend.prompt_cache import get_prompt_cache_stats
 from frontend.panel_functions import calculate_cost
 import streamlit as st
 import logging
+import time
 
 query_blueprint = Blueprint('query_api', __name__)
 
@@ -14,123 +22,298 @@ logging.basicConfig( level=logging.DEBUG, format='%(asctime)s - %(levelname)s -
 logger = logging.getLogger(__name__)
 
 
+def wants_arrow():
+    """True if the client asked for Arrow IPC results and pyarrow is installed."""
+    return ARROW_AVAILABLE and ARROW_STREAM_MIMETYPE in request.headers.get("Accept", "")
+
+
+def arrow_response(table, metadata):
+    """Builds an Arrow IPC stream response carrying `metadata` in the schema metadata."""
+    return Response(table_to_ipc(table, metadata), mimetype=ARROW_STREAM_MIMETYPE)
+
+
+def crud_request_options(body):
+    """Reads the generation settings shared by /crud and /crud/stream from a request body."""
+    return {
+        "model": body.get("model", "gpt-4o-mini"),
+        "temperature": body.get("temperature", 0.5),
+        "max_tokens": body.get("max_tokens", 100),
+        "certainty_threshold": body.get("certainty_threshold", 0.95),
+        "api_key": body.get("api_key", None),
+        "refresh_cache": body.get("refresh_cache", False),   # "Regenerate" wants a new answer, not the cached one
+        "remaining_budget": body.get("remaining_budget"),    # session budget left, checked before calling the LLM
+    }
+
+
+def review_generated_query(sql_query, response_data):
+    """Validates and estimates a generated query.
+
+    Returns (response, status, select_query). When `select_query` is set the caller fetches its
+    first page and completes `response` with complete_select_response; otherwise `response` is final.
+    """
+    # The pre-flight estimate was over the session budget: nothing was sent to the LLM
+    if response_data.get("budget_exceeded"):
+        return {"response": response_data["error"], "response_data": response_data}, 402, None
+
+    # Check if the query is valid for SELECT, INSERT, UPDATE, DELETE 
+    if not sql_query or "SELECT" not in sql_query.upper() and not any(op in sql_query.upper() for op in ["INSERT", "UPDATE", "DELETE"]):
+        return {"response": "Error: Invalid SQL query generated."}, 400, None
+
+    response = {}
+
+    # Split queries if multiple
+    queries = [q.strip() for q in sql_query.split(";") if q.strip()]
+
+    # Determine if all queries meet the valid probability threshold
+    approved_accuracy = response_data.get("valid_prob_threshold", False)
+    
+    # Construct confirmation message based on accuracy
+    accuracy_warning = "\n❗The generated response might be biased. Consider checking or regenerating with another model." if not approved_accuracy else "\n ✨ Generated Query is qualified as accurate"
+    if "template_match" in response_data:
+        accuracy_warning += f"\n♻️ Filled from the template of \"{response_data['template_match']['example']}\""
+
+    # Estimate cost and impact (EXPLAIN, or a rolled back dry run for writes) before running anything
+    guard_report = estimate_queries(queries)
+    response_data["query_estimate"] = guard_report
+    estimate_message = "\n" + describe_estimate(guard_report)
+
+    if guard_report["verdict"] == "reject":
+        response = {
+            "generated_query": sql_query,
+            "approved_accuracy": approved_accuracy,
+            "rejected": True,
+            "confirmation_message": "This query was not run: it is too expensive or the database rejected it." + estimate_message,
+            "response_data": response_data
+        }
+
+    elif len(queries) > 1:
+                confirmation_message = f"Multiple queries detected ({len(queries)}). Do you want to proceed with all operations? Please confirm. \n"
+                response = {
+                    "generated_query": sql_query,
+                    "approved_accuracy": approved_accuracy,
+                    "confirmation_message": confirmation_message + accuracy_warning + estimate_message,
+                    "response_data": response_data
+                }
+
+    # Expensive single SELECT: ask for confirmation instead of running it straight away
+    elif is_read_query(queries[0]) and guard_report["verdict"] == "confirm":
+        response = {
+            "generated_query": sql_query,
+            "approved_accuracy": approved_accuracy,
+            "confirmation_message": "This query looks expensive. Do you want to run it? Please confirm." + "\n" + accuracy_warning + estimate_message,
+            "response_data": response_data
+        }
+
+    # Handle a single SELECT query (a WITH that modifies data is confirmed like any write)
+    elif is_read_query(queries[0]):
+        response = {
+            "confirmation_message" : accuracy_warning,
+            "generated_query": sql_query,
+            "approved_accuracy": approved_accuracy,
+            "response_data": response_data
+        }
+        return response, 200, queries[0]
+
+    # Handle a single non-SELECT query (INSERT, UPDATE, DELETE)
+    else:
+        confirmation_message = "Do you want to proceed with this operation? Please confirm."
+        response = {
+            "generated_query": sql_query,
+            "approved_accuracy": approved_accuracy,
+            "confirmation_message": confirmation_message + "\n" + accuracy_warning + estimate_message,
+            "response_data": response_data
+        }
+        
+    return response, 200, None
+
+
+def complete_select_response(user_input, response, data, page, columnar=False):
+    """Adds the first page of a SELECT to its response; returns (response, status, arrow_table)."""
+    if page["has_more"]:
+        response["confirmation_message"] += f"\n⏬ Showing the first {page['row_count']} rows."
+
+    # The query ran: remember the question shape (answers filled from a template are not re-learned)
+    if "template_match" not in response["response_data"]:
+        get_template_store().learn(user_input, response["generated_query"], response["response_data"])
+
+    response["page"] = page
+    # Columnar mode: the rows travel as Arrow IPC, everything else as schema metadata
+    if columnar:
+        return response, 200, data
+    response["fetched_data"] = data if data else "No results found."
+    return response, 200, None
+
+
+def classify_generated_query(user_input, sql_query, response_data, page_size=CHAT_PAGE_SIZE, columnar=False):
+    """Estimates a generated query and either runs it (single SELECT) or asks for confirmation.
+
+    Returns (response, status, arrow_table); `arrow_table` holds the rows (and `response` has no
+    "fetched_data") only when `columnar` is set and the query was run.
+    """
+    response, status, select_query = review_generated_query(sql_query, response_data)
+    if select_query is None:
+        return response, status, None
+    try:
+        # Only the first page is fetched; the client asks for more with page["next_token"]
+        data, page = fetch_page(select_query, page_size=page_size, columnar=columnar)
+    except Exception as e:
+        return {"response": f"Error fetching data from database: {str(e)}"}, 500, None
+    return complete_select_response(user_input, response, data, page, columnar)
+
+
 # Route for CRUD operations with confirmation
 @query_blueprint.route('/crud', methods=['POST'])
 def crud_operations():
     try:
         user_input = request.json.get("message", "")
+        set_db_session(request.json.get("session_id"))
         if not user_input:
             return jsonify({"response": "Error: No message provided in the request."}), 400
         
-        model = request.json.get("model", "gpt-4o-mini")  
-        temperature = request.json.get("temperature", 0.5)  
-        max_tokens = request.json.get("max_tokens", 100) 
-        certainty_threshold  = request.json.get("certainty_threshold", 0.95)
-        api_key = request.json.get("api_key", None)
+        options = crud_request_options(request.json)
         
-        sql_query, response_data = query_openai(user_input, model = model,  temperature = temperature, max_tokens = max_tokens, certainty_threshold = certainty_threshold, api_key = api_key)
+        # Known question shape: fill the stored template instead of asking the LLM
+        sql_query, response_data = (None, None) if options["refresh_cache"] else answer_from_template(user_input, options["certainty_threshold"])
+        if sql_query is None:
+            started = time.monotonic()
+            sql_query, response_data = query_openai(user_input, **options)
+            if not response_data.get("cache_hit"):
+                get_template_store().record_llm_latency(time.monotonic() - started)
 
-        # Check if the query is valid for SELECT, INSERT, UPDATE, DELETE 
-        if not sql_query or "SELECT" not in sql_query.upper() and not any(op in sql_query.upper() for op in ["INSERT", "UPDATE", "DELETE"]):
-            return jsonify({"response": "Error: Invalid SQL query generated."}), 400
+        response, status, arrow_table = classify_generated_query(
+            user_input, sql_query, response_data,
+            page_size=request.json.get("page_size", CHAT_PAGE_SIZE), columnar=wants_arrow()
+        )
+        if arrow_table is not None:
+            return arrow_response(arrow_table, response)
+        return jsonify(response), status
+    except Exception as e:
+            return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500  
 
-        response = {}
 
-        # Split queries if multiple
-        queries = [q.strip() for q in sql_query.split(";") if q.strip()]
 
-        # Determine if all queries meet the valid probability threshold
-        approved_accuracy = response_data.get("valid_prob_threshold", False)
-        
-        # Construct confirmation message based on accuracy
-        accuracy_warning = "\n❗The generated response might be biased. Consider checking or regenerating with another model." if not approved_accuracy else "\n ✨ Generated Query is qualified as accurate"
-    
-        if len(queries) > 1:
-                    confirmation_message = f"Multiple queries detected ({len(queries)}). Do you want to proceed with all operations? Please confirm. \n"
-                    response = {
-                        "generated_query": sql_query,
-                        "approved_accuracy": approved_accuracy,
-                        "confirmation_message": confirmation_message + accuracy_warning,
-                        "response_data": response_data
-                    }
-
-        # Handle a single SELECT query
-        elif "SELECT" in queries[0].upper():
-            confirmation_message = ""
-            try:
-                data = fetch_from_db(queries[0])
-            except Exception as e:
-                return jsonify({"response": f"Error fetching data from database: {str(e)}"}), 500
-
-            response = {
-                "confirmation_message" : accuracy_warning,
-                "generated_query": sql_query,
-                "approved_accuracy": approved_accuracy,
-                "fetched_data": data if data else "No results found.",
-                "response_data": response_data
-            }
-
-        # Handle a single non-SELECT query (INSERT, UPDATE, DELETE)
-        else:
-            confirmation_message = "Do you want to proceed with this operation? Please confirm."
-            response = {
-                "generated_query": sql_query,
-                "approved_accuracy": approved_accuracy,
-                "confirmation_message": confirmation_message + "\n" + accuracy_warning,
-                "response_data": response_data
-            }
-            
-        return jsonify(response)
-    except Exception as e:
-            return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500  
 
+def sse_event(event, data):
+    """Formats one Server-Sent Event (JSON data, encoded like jsonify does)."""
+    return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
 
 
+# Streaming variant of /crud: SQL tokens and running certainty as Server-Sent Events, then the result
+@query_blueprint.route('/crud/stream', methods=['POST'])
+def crud_stream():
+    user_input = request.json.get("message", "")
+    session_id = request.json.get("session_id")
+    page_size = request.json.get("page_size", CHAT_PAGE_SIZE)
+    if not user_input:
+        return jsonify({"response": "Error: No message provided in the request."}), 400
+    options = crud_request_options(request.json)
 
-@query_blueprint.route('/execute', methods=['POST'])
-def execute_crud():
+    def generate():
+        try:
+            set_db_session(session_id)
+            sql_query, response_data = (None, None) if options["refresh_cache"] else answer_from_template(user_input, options["certainty_threshold"])
+            if sql_query is not None:
+                yield sse_event("token", {"text": sql_query, "min_prob": response_data["min_prob"], "avg_prob": response_data["avg_prob"]})
+            else:
+                started = time.monotonic()
+                for event, data in stream_query_openai(user_input, **options):
+                    if event == "token":
+                        yield sse_event("token", data)
+                    else:
+                        sql_query, response_data = data
+                if not response_data.get("cache_hit"):
+                    get_template_store().record_llm_latency(time.monotonic() - started)
+
+            response, status, _ = classify_generated_query(user_input, sql_query, response_data, page_size=page_size)
+            response["status"] = status
+            yield sse_event("result", response)
+        except Exception as e:
+            logger.error(f"Error occurred in crud_stream: {str(e)}")
+            yield sse_event("result", {"response": f"An unexpected error occurred: {str(e)}", "status": 500})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+
+
+# Route for the following pages of a chat SELECT result
+@query_blueprint.route('/crud/page', methods=['POST'])
+def crud_next_page():
     try:
         sql_query = request.json.get("generated_query", "")
-        confirm = request.json.get("confirm", False)
-        
-        # Validate the query
-        if not sql_query or "SELECT" not in sql_query.upper() and not any(op in sql_query.upper() for op in ["INSERT", "UPDATE", "DELETE"]):
-            return jsonify({"response": "Error: Invalid SQL query generated."}), 400
-
-        response = {"queries": []}
+        page_token = request.json.get("page_token")
+        page_size = request.json.get("page_size", CHAT_PAGE_SIZE)
+        set_db_session(request.json.get("session_id"))
 
-        # Split queries if multiple
         queries = [q.strip() for q in sql_query.split(";") if q.strip()]
+        if len(queries) != 1 or not is_read_query(queries[0]) or not page_token:
+            return jsonify({"response": "Error: a single SELECT query and a page token are required."}), 400
 
-        for query in queries:
-            try:
-                if "SELECT" in query.upper():
-                    # Fetch data for SELECT queries immediately
-                    data = fetch_from_db(query)
-                    response["queries"].append({
-                        "generated_query": query,
-                        "fetched_data": data if data else "No results found."
-                    })
-                else:
-                    # Confirm before modifying data
-                    if not confirm:
-                        return jsonify({"response": "Operation cancelled by user."}), 200
-
-                    # Execute the query using the updated execute_query
-                    query_result = execute_query(query)
-                    response["queries"].append({
-                        "generated_query": query,
-                        **query_result,  # This will include success or error message, 
-                        
-                    })     
-
-            except Exception as e:
-                response["queries"].append({
-                    "generated_query": query,
-                    "error": f"Error processing query: {str(e)}"
-                })
-       
-        return jsonify(response)
+        columnar = wants_arrow()
+        try:
+            data, page = fetch_page(queries[0], page_size=page_size, page_token=page_token, columnar=columnar)
+        except ValueError as e:
+            return jsonify({"response": f"Error: {str(e)}"}), 400
+
+        if columnar:
+            return arrow_response(data, {"generated_query": sql_query, "page": page})
+        return jsonify({"generated_query": sql_query, "fetched_data": data if data else "No results found.", "page": page})
+
+    except Exception as e:
+        return jsonify({"response": f"Error fetching data from database: {str(e)}"}), 500
+
+
+
+
+def execute_generated_query(body):
+    """Runs a confirmed batch from an /execute request body; returns (response, status)."""
+    sql_query = body.get("generated_query", "")
+    confirm = body.get("confirm", False)
+    set_db_session(body.get("session_id"))
+    
+    # Validate the query
+    if not sql_query or "SELECT" not in sql_query.upper() and not any(op in sql_query.upper() for op in ["INSERT", "UPDATE", "DELETE"]):
+        return {"response": "Error: Invalid SQL query generated."}, 400
+
+    # Split queries if multiple
+    queries = [q.strip() for q in sql_query.split(";") if q.strip()]
+    continue_on_error = body.get("continue_on_error", False)
+
+    # Confirm before modifying data
+    if not confirm and any(not is_read_query(query) for query in queries):
+        return {"response": "Operation cancelled by user."}, 200
+
+    # Re-check the estimate: rejected statements never run, expensive ones need `confirm_estimate`
+    guard_report = estimate_queries(queries)
+    if guard_report["verdict"] == "reject":
+        return {"response": "Query rejected: " + "; ".join(guard_report["reasons"]),
+                "query_estimate": guard_report}, 400
+    if guard_report["verdict"] == "confirm" and not body.get("confirm_estimate", False):
+        return {"response": "Operation cancelled: the estimate needs an extra confirmation.",
+                "query_estimate": guard_report}, 200
+
+    # Run the whole batch in a single transaction on one pooled connection
+    batch_report = execute_batch_queries(queries, continue_on_error=continue_on_error)
+    response = {
+        "queries": batch_report["queries"],
+        "committed": batch_report["committed"],
+        "round_trips": batch_report["round_trips"],
+        "query_estimate": guard_report,
+    }
+
+    if not batch_report["committed"]:
+        return response, 500
+    if body.get("message") and not body.get("from_template", False):
+        get_template_store().learn(body["message"], sql_query)
+    return response, 200
+
+
+@query_blueprint.route('/execute', methods=['POST'])
+def execute_crud():
+    try:
+        response, status = execute_generated_query(request.json)
+        return jsonify(response), status
 
     except Exception as e:
         return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500
@@ -146,12 +329,17 @@ def build_project_team():
         temperature = request.json.get("temperature", 0.5)  
         certainty_threshold  = request.json.get("certainty_threshold", 0.95)
         api_key = request.json.get("api_key", None)
+        remaining_budget = request.json.get("remaining_budget")
         
         
         if not project_description or not isinstance(project_description, str):
             return jsonify({"error": "Please provide a valid project description."}), 400
 
-        recommendation , team_builder_response_data = build_team(description=project_description, model = model,  temperature = temperature, certainty_threshold = certainty_threshold, api_key = api_key)
+        result = build_team(description=project_description, model = model,  temperature = temperature, certainty_threshold = certainty_threshold, api_key = api_key, remaining_budget = remaining_budget)
+        if isinstance(result, dict):
+            return jsonify(result), 402 if result.get("budget_exceeded") else 500
+
+        recommendation , team_builder_response_data = result
         logger.debug(f" \n \n !! Rcommendation from team builder: {recommendation} \n")
 
         #st.session_state.team_builder_response_data = team_builder_response_data        
@@ -175,3 +363,37 @@ def build_project_team():
     except Exception as e:
         logger.error(f"Error occurred in build_project_team function: {str(e)}")
         return jsonify({"response": "An unexpected error occurred."}), 500
+
+
+
+
+# Match rate and saved LLM latency of the question templates
+@query_blueprint.route('/question_templates/stats', methods=['GET'])
+def question_template_stats():
+    return jsonify(get_template_store().stats()), 200
+
+
+# Share of prompt tokens OpenAI served from its prompt cache, per endpoint
+@query_blueprint.route('/prompt_cache/stats', methods=['GET'])
+def prompt_cache_stats():
+    return jsonify(get_prompt_cache_stats()), 200
+
+
+# Latency per routing target (primary, replica_N) and pool usage counters
+@query_blueprint.route('/db/stats', methods=['GET'])
+def db_stats():
+    router = get_query_router()
+    return jsonify({"latency": router.latency_stats(), "pools": router.pool_stats()}), 200
+
+
+
+
+# Ranked CREATE INDEX recommendations for the recorded query workload
+@query_blueprint.route('/index_advice', methods=['GET'])
+def index_advice():
+    try:
+        limit = int(request.args.get("limit", 10))
+        return jsonify({"recommendations": recommend_indexes(limit=limit)}), 200
+    except Exception as e:
+        logger.error(f"Error occurred in index_advice function: {str(e)}")
+        return jsonify({"response": f"An unexpected error occurred: {str(e)}"}), 500
@@ -0,0 +1,173 @@
+import re
+import math
+import logging
+import threading
+from collections import Counter
+
+from database.schema_cache import get_schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_TABLES = 3          # best matching tables kept before adding their FK neighbours
+MIN_SCORE = 0.1         # tables scoring below this are not considered relevant
+RELATIVE_SCORE = 0.3    # tables scoring below this fraction of the best match are dropped
+
+# Words users say for things the schema names differently
+SYNONYMS = {
+    "staff": "employee",
+    "people": "employee",
+    "person": "employee",
+    "worker": "employee",
+    "colleague": "employee",
+    "wage": "salary",
+    "pay": "salary",
+    "paid": "salary",
+    "earn": "salary",
+    "holiday": "vacation",
+    "leave": "vacation",
+    "sick": "sick_leave",
+    "overtime": "overtime_hours",
+    "hour": "hours",
+    "cost": "budget",
+    "money": "budget",
+    "team": "member",
+    "ability": "skill",
+    "competence": "skill",
+    "expertise": "proficiency",
+}
+
+
+def normalize_token(token):
+    """Lower-cases a token and strips a simple plural suffix."""
+    token = token.lower()
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Splits text and snake_case identifiers into normalized tokens (with synonyms expanded)."""
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9]+", text.replace("_", " ")):
+        token = normalize_token(word)
+        tokens.append(token)
+        if token in SYNONYMS:
+            tokens.extend(normalize_token(part) for part in SYNONYMS[token].split("_"))
+    return tokens
+
+
+class SchemaRetriever:
+    """BM25 index over tables, columns and FK relationships of the schema snapshot."""
+
+    def __init__(self, snapshot):
+        self.schema_hash = snapshot.schema_hash
+        self.schema = snapshot.schema
+        self.references = {table: set() for table in self.schema}   # tables each table points to via FKs
+        self.documents = {}
+
+        for table, details in self.schema.items():
+            # The table name is repeated so that a direct mention outweighs a matching column
+            terms = tokenize(table) * 3
+            for column_info in details["columns"]:
+                terms += tokenize(column_info["column_name"])
+            for fk in details.get("foreign_keys", []):
+                target_table = fk.split("->")[1].strip().split(".")[0]
+                terms += tokenize(target_table)
+                if target_table in self.schema and target_table != table:
+                    self.references[table].add(target_table)
+            self.documents[table] = Counter(terms)
+
+        self.avg_length = (sum(sum(doc.values()) for doc in self.documents.values()) / len(self.documents)) if self.documents else 0
+        document_frequency = Counter(term for doc in self.documents.values() for term in doc)
+        n_docs = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (n_docs - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    def score(self, question):
+        """Returns {table: bm25 score} for a question."""
+        query_terms = set(tokenize(question))
+        scores = {}
+        for table, doc in self.documents.items():
+            length = sum(doc.values())
+            score = 0.0
+            for term in query_terms:
+                tf = doc.get(term, 0)
+                if not tf:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+                score += self.idf[term] * tf * (BM25_K1 + 1) / norm
+            scores[table] = score
+        return scores
+
+    def retrieve(self, question, max_tables=MAX_TABLES, min_score=MIN_SCORE):
+        """Returns the tables relevant to a question plus the tables they reference (all tables if none match)."""
+        scores = self.score(question)
+        best = max(scores.values(), default=0)
+        threshold = max(min_score, best * RELATIVE_SCORE)
+        ranked = [table for table, score in sorted(scores.items(), key=lambda item: -item[1]) if score >= threshold]
+        if not ranked:
+            return list(self.schema.keys())
+
+        # Only follow outgoing FKs: those are the joins a query on the selected tables needs
+        selected = ranked[:max_tables]
+        for table in list(selected):
+            for neighbour in sorted(self.references[table]):
+                if neighbour not in selected:
+                    selected.append(neighbour)
+        return selected
+
+    def render(self, tables):
+        """Renders the given tables in a compact DDL-like form."""
+        lines = []
+        for table in tables:
+            details = self.schema[table]
+            primary_keys = set(details.get("primary_key_columns") or [])
+            references = {}
+            for fk in details.get("foreign_keys", []):
+                column, target = [part.strip() for part in fk.split("->")]
+                references[column] = target
+
+            columns = []
+            for column_info in details["columns"]:
+                name = column_info["column_name"]
+                column = f"{name} {column_info['data_type']}"
+                if name in primary_keys:
+                    column += " PK"
+                if name in references:
+                    column += f" FK->{references[name]}"
+                columns.append(column)
+            lines.append(f"{table}({', '.join(columns)})")
+        return "\n".join(lines)
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_schema_retriever():
+    """Returns the retriever for the current schema snapshot, rebuilding it when the schema changed."""
+    global _retriever
+    snapshot = get_schema_snapshot()
+    if _retriever is None or _retriever.schema_hash != snapshot.schema_hash:
+        with _retriever_lock:
+            if _retriever is None or _retriever.schema_hash != snapshot.schema_hash:
+                _retriever = SchemaRetriever(snapshot)
+                logger.info(f"Built schema retriever index over {len(snapshot.schema)} tables")
+    return _retriever
+
+
+def get_relevant_schema_text(question, max_tables=MAX_TABLES):
+    """Returns (schema_text, tables) with only the tables relevant to the question."""
+    retriever = get_schema_retriever()
+    tables = retriever.retrieve(question, max_tables=max_tables)
+    # Schema order rather than relevance order: the same tables always render to the same text
+    return retriever.render([table for table in retriever.schema if table in tables]), tables
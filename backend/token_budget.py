@@ -0,0 +1,83 @@
+import re
+import logging
+
+from backend.token_utils import count_tokens
+from frontend.panel_functions import OPENAI_PRICING
+
+logger = logging.getLogger(__name__)
+
+
+MESSAGE_OVERHEAD_TOKENS = 3   # role and separators added by the chat format, per message
+REPLY_PRIMING_TOKENS = 3      # every reply is primed with <|start|>assistant<|message|>
+
+
+def model_pricing(model):
+    """Returns (input, cached input, output) prices per 1M tokens, or None for an unknown model.
+
+    Aliases ("gpt-4o-mini") resolve to the latest dated snapshot in the pricing table.
+    """
+    if model in OPENAI_PRICING:
+        return OPENAI_PRICING[model]
+    snapshots = [name for name in OPENAI_PRICING
+                 if name.startswith(model + "-") and re.fullmatch(r"\d{4}(-\d{2}-\d{2})?", name[len(model) + 1:])]
+    return OPENAI_PRICING[max(snapshots)] if snapshots else None
+
+
+def count_message_tokens(messages, model):
+    """Prompt tokens of a chat request, counted locally on the rendered messages."""
+    return sum(count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS for message in messages) + REPLY_PRIMING_TOKENS
+
+
+def estimate_request(messages, model, max_tokens):
+    """Worst case cost of a chat request: no cached prompt tokens and `max_tokens` completion tokens.
+
+    Returns {"prompt_tokens", "max_completion_tokens", "cost"}; `cost` is None when the model has no price.
+    """
+    prompt_tokens = count_message_tokens(messages, model)
+    pricing = model_pricing(model)
+    cost = None
+    if pricing is not None:
+        input_price, _, output_price = pricing
+        cost = round((prompt_tokens * input_price + max_tokens * output_price) / 1000000, 6)
+    return {"prompt_tokens": prompt_tokens, "max_completion_tokens": max_tokens, "cost": cost}
+
+
+def within_budget(estimate, remaining_budget):
+    """True when the request fits the remaining session budget (or there is nothing to check against)."""
+    if remaining_budget is None:
+        return True
+    if estimate["cost"] is None:
+        logger.debug("No price for the model, the budget check is skipped")
+        return True
+    return estimate["cost"] <= remaining_budget
+
+
+def prompt_tokens_allowed(model, max_tokens, remaining_budget):
+    """Largest prompt (in tokens) a request can send within the remaining budget, or None if unlimited."""
+    pricing = model_pricing(model)
+    if remaining_budget is None or pricing is None:
+        return None
+    input_price, _, output_price = pricing
+    return max(0, int((remaining_budget * 1000000 - max_tokens * output_price) / input_price))
+
+
+def truncate_lines(text, max_tokens, model, keep_first=1):
+    """Keeps the first `keep_first` lines and as many following lines as fit in `max_tokens`.
+
+    Returns (text, kept, dropped) where kept/dropped count the lines after the first ones.
+    """
+    lines = text.rstrip("\n").split("\n")
+    head, body = lines[:keep_first], lines[keep_first:]
+    used = count_tokens("\n".join(head), model)
+    kept = []
+    for line in body:
+        used += count_tokens(line, model) + 1   # + the newline
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(head + kept) + "\n", len(kept), len(body) - len(kept)
+
+
+def budget_error(estimate, remaining_budget):
+    return (f"Request refused: the estimated cost (€{estimate['cost']:.4f} for {estimate['prompt_tokens']} prompt tokens) "
+            f"is above the remaining session budget (€{max(remaining_budget, 0):.4f}).")
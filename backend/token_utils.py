@@ -0,0 +1,38 @@
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, fall back to a character-based estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+CHARS_PER_TOKEN = 4   # rough average for English text and SQL when no tokenizer is available
+DEFAULT_ENCODING = "o200k_base"
+
+_encodings = {}
+
+
+def get_encoding(model=None):
+    """Returns the tiktoken encoding for a model (cached), or None if tiktoken is unavailable."""
+    if tiktoken is None:
+        return None
+    key = model or DEFAULT_ENCODING
+    if key not in _encodings:
+        try:
+            _encodings[key] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+        except KeyError:
+            logger.debug(f"No tokenizer registered for model {model}, using {DEFAULT_ENCODING}")
+            _encodings[key] = tiktoken.get_encoding(DEFAULT_ENCODING)
+    return _encodings[key]
+
+
+def count_tokens(text, model=None):
+    """Counts the tokens of a text for the given model."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, round(len(text) / CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,67 @@
+import json
+import logging
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional, the columnar mode is disabled without it
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+ARROW_AVAILABLE = pa is not None
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+RESPONSE_METADATA_KEY = b"response"   # schema metadata key carrying the non-tabular part of a response
+
+
+def require_arrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the columnar result mode (pip install pyarrow)")
+
+
+def rows_to_record_batch(columns, rows):
+    """Builds an Arrow RecordBatch column by column from DB-API row tuples."""
+    require_arrow()
+    if not rows:
+        return pa.RecordBatch.from_arrays([pa.array([], type=pa.null()) for _ in columns], names=columns)
+    arrays = [pa.array(values) for values in zip(*rows)]
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+def batches_to_table(batches, columns=None):
+    """Concatenates record batches into one Table, promoting all-null columns to the type found later."""
+    require_arrow()
+    batches = list(batches)
+    if not batches:
+        return pa.table({column: pa.array([], type=pa.null()) for column in (columns or [])})
+    tables = [pa.Table.from_batches([batch]) for batch in batches]
+    return pa.concat_tables(tables, promote_options="default") if len(tables) > 1 else tables[0]
+
+
+def table_to_ipc(table, metadata=None):
+    """Serializes a Table to the Arrow IPC stream format, attaching `metadata` (JSON) to the schema."""
+    require_arrow()
+    if metadata is not None:
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[RESPONSE_METADATA_KEY] = json.dumps(metadata, default=str).encode("utf-8")
+        table = table.replace_schema_metadata(schema_metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_table(payload):
+    """Reads an Arrow IPC stream and returns (table, metadata)."""
+    require_arrow()
+    table = pa.ipc.open_stream(pa.py_buffer(payload)).read_all()
+    schema_metadata = table.schema.metadata or {}
+    metadata = json.loads(schema_metadata[RESPONSE_METADATA_KEY]) if RESPONSE_METADATA_KEY in schema_metadata else {}
+    return table, metadata
+
+
+def table_to_dataframe(table):
+    """Converts a Table to pandas, avoiding copies where the column types allow it."""
+    # No self_destruct: tables may be shared through the query cache
+    return table.to_pandas(split_blocks=True)
@@ -0,0 +1,115 @@
+"""asyncpg access for the ASGI app (backend/async_app.py).
+
+Reads made here go to the primary from a pool owned by the event loop; everything else
+(schema, caches, query guard, batch execution) keeps using the psycopg2 pool in a worker thread.
+"""
+import json
+import asyncio
+import logging
+
+import asyncpg
+
+from database.db_pool import get_db_config
+from database.db_utils import plan_page, finish_page, new_fetch_report, take_within_caps
+from database.query_cache import get_query_cache
+
+logger = logging.getLogger(__name__)
+
+
+ASYNC_POOL_MIN_CONNECTIONS = 2
+ASYNC_POOL_MAX_CONNECTIONS = 20
+ASYNC_COMMAND_TIMEOUT = 60           # seconds
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def page_query_text(sql_query, page_size, state, order):
+    """asyncpg ($n placeholders) counterpart of db_utils.page_query."""
+    if order is None:
+        return f"SELECT * FROM ({sql_query}) AS chat_page LIMIT $1 OFFSET $2", [page_size + 1, state["offset"]]
+
+    columns, descending = order
+    keys = ", ".join(quote_ident(column) for column in columns)
+    order_by = ", ".join(quote_ident(column) + (" DESC" if descending else "") for column in columns)
+    params, where = [], ""
+    if state["keys"] is not None:
+        placeholders = ", ".join(f"${index}" for index in range(1, len(columns) + 1))
+        where = f"WHERE ({keys}) {'<' if descending else '>'} ({placeholders})"
+        params.extend(state["keys"])
+    params.append(page_size + 1)
+    return f"SELECT * FROM ({sql_query}) AS chat_page {where} ORDER BY {order_by} LIMIT ${len(params)}", params
+
+
+async def init_connection(conn):
+    # Same Python types as psycopg2 for json columns
+    for json_type in ("json", "jsonb"):
+        await conn.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def get_async_pool():
+    """Returns the asyncpg pool of the running event loop, creating it on first use."""
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            return _pool
+        dsn_params, pool_options = get_db_config()
+        _pool = await asyncpg.create_pool(
+            database=dsn_params.get("dbname"),
+            user=dsn_params.get("user"),
+            password=dsn_params.get("password"),
+            host=dsn_params.get("host"),
+            port=dsn_params.get("port"),
+            ssl=dsn_params.get("sslmode"),
+            min_size=ASYNC_POOL_MIN_CONNECTIONS,
+            max_size=max(ASYNC_POOL_MAX_CONNECTIONS, pool_options["maxconn"]),
+            command_timeout=ASYNC_COMMAND_TIMEOUT,
+            init=init_connection,
+        )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def fetch_page_async(sql_query, page_size, page_token=None):
+    """Async fetch_page (row dicts only): same tokens, cache entries and fallbacks."""
+    # Planning may refresh the schema snapshot over psycopg2
+    plan = await asyncio.to_thread(plan_page, sql_query, page_size, page_token, False)
+    hit, cached = get_query_cache().get(plan["cache_key"])
+    if hit:
+        return cached
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            try:
+                async with conn.transaction():     # savepoint, so the fallback can run after an error
+                    records = await conn.fetch(*page_query_args(plan))
+            except (asyncpg.UndefinedColumnError, asyncpg.AmbiguousColumnError, asyncpg.DataError):
+                if plan["method"] != "keyset":
+                    raise
+                # Sort key not selected, or key values the driver cannot bind from the token: page by offset
+                plan["method"] = "offset"
+                records = await conn.fetch(*page_query_args(plan))
+
+    # Column names only matter for non-empty pages
+    columns = list(records[0].keys()) if records else []
+    # Same byte cap as the psycopg2 driver (the LIMIT already bounds the row count)
+    report = new_fetch_report(max_rows=None)
+    rows = take_within_caps((tuple(record.values()) for record in records), report)
+    return finish_page(plan, columns, rows, report)
+
+
+def page_query_args(plan):
+    query, params = page_query_text(plan["sql"], plan["page_size"], plan["state"],
+                                    plan["order"] if plan["method"] == "keyset" else None)
+    return (query, *params)
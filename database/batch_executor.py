@@ -0,0 +1,122 @@
+import logging
+
+import psycopg2
+
+from database.db_utils import get_db_connection, is_read_query, fetch_capped
+from database.db_router import get_query_router
+from database.query_cache import record_write, invalidate_after_commit
+from database.workload_log import record_statement
+
+logger = logging.getLogger(__name__)
+
+
+def group_statements(queries):
+    """Splits a batch into runs of consecutive writes (pipelined together) and single reads."""
+    groups = []
+    for index, query in enumerate(queries):
+        if is_read_query(query) or not groups or groups[-1]["read"]:
+            groups.append({"read": is_read_query(query), "items": [(index, query)]})
+        else:
+            groups[-1]["items"].append((index, query))
+    return groups
+
+
+def run_statement(conn, cur, index, query, use_savepoint):
+    """Runs one statement (optionally inside its own savepoint) and returns its report entry.
+
+    Reads go through fetch_capped (a server-side cursor with the row and byte caps), so a SELECT
+    in a batch cannot pull more into memory than one fetched by the chat.
+    """
+    savepoint = f"batch_stmt_{index}"
+    if use_savepoint:
+        cur.execute(f"SAVEPOINT {savepoint};")
+    try:
+        if is_read_query(query):
+            rows, fetch_report = fetch_capped(conn, query)
+            entry = {"generated_query": query, "success": True, "rowcount": fetch_report["row_count"],
+                     "fetched_data": rows if rows else "No results found.", "fetch_report": fetch_report}
+        else:
+            cur.execute(query)
+            entry = {"generated_query": query, "success": True, "rowcount": cur.rowcount}
+        if use_savepoint:
+            cur.execute(f"RELEASE SAVEPOINT {savepoint};")
+        return entry
+    except psycopg2.Error as e:
+        if use_savepoint:
+            cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint};")
+        return {"generated_query": query, "success": False, "error": f"Error processing query: {str(e)}"}
+
+
+def execute_batch_queries(queries, continue_on_error=False, pipeline=True):
+    """Executes a confirmed multi-statement batch in one transaction on one pooled connection.
+
+    By default the batch is all-or-nothing: the first failing statement rolls back the whole
+    transaction. With `continue_on_error=True` every statement runs inside its own savepoint,
+    a failing statement is rolled back to it and the rest of the batch still commits.
+
+    With `pipeline=True` (all-or-nothing mode only) consecutive writes are sent to the server
+    in a single round trip; psycopg2 only reports the row count of the last statement of such a
+    group, so the other entries carry `rowcount: None`. If a pipelined group fails it is replayed
+    statement by statement to find the failing one.
+
+    Returns {"success", "committed", "round_trips", "queries": [per-statement report]}.
+    """
+    report = {"success": True, "committed": False, "round_trips": 0, "queries": []}
+    pipeline = pipeline and not continue_on_error
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            for group in group_statements(queries):
+                items = group["items"]
+
+                if pipeline and not group["read"] and len(items) > 1:
+                    savepoint = f"batch_group_{items[0][0]}"
+                    try:
+                        cur.execute(f"SAVEPOINT {savepoint}; " + "; ".join(query for _, query in items) + ";")
+                        report["round_trips"] += 1
+                        for position, (_, query) in enumerate(items):
+                            last = position == len(items) - 1
+                            report["queries"].append({
+                                "generated_query": query,
+                                "success": True,
+                                "rowcount": cur.rowcount if last else None,
+                                "pipelined": True,
+                            })
+                        continue
+                    except psycopg2.Error as e:
+                        logger.info(f"Pipelined group failed ({e}), replaying statements one by one")
+                        cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint};")
+                        report["round_trips"] += 1
+
+                for index, query in items:
+                    # Savepoints are only needed when the rest of the batch must survive a failure
+                    entry = run_statement(conn, cur, index, query, use_savepoint=continue_on_error)
+                    report["round_trips"] += 3 if continue_on_error else 1
+                    report["queries"].append(entry)
+                    if not entry["success"]:
+                        report["success"] = False
+                        if not continue_on_error:
+                            break
+
+                if not report["success"] and not continue_on_error:
+                    break
+
+            if report["success"] or continue_on_error:
+                written_tables = [record_write(cur, query) for query in queries if not is_read_query(query)]
+                conn.commit()
+                report["committed"] = True
+                if written_tables:
+                    invalidate_after_commit(written_tables)
+                    get_query_router().mark_write()
+                for entry in report["queries"]:
+                    if entry["success"]:
+                        record_statement(entry["generated_query"], "execute")
+            else:
+                conn.rollback()
+                # Statements after the failing one were never attempted
+                attempted = len(report["queries"])
+                for query in queries[attempted:]:
+                    report["queries"].append({"generated_query": query, "success": False, "error": "Skipped: batch rolled back"})
+
+    logger.debug(f"Batch of {len(queries)} statements finished: committed={report['committed']}, round trips={report['round_trips']}")
+    return report
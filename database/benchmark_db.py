@@ -0,0 +1,101 @@
+"""Benchmarks the db_utils read paths against synthetic data on a throwaway PostgreSQL.
+
+    python -m database.benchmark_db [--scales 1k,10k,100k] [--repeat 5] [--json results.json]
+"""
+import json
+import time
+import logging
+import argparse
+import statistics
+
+import psycopg2
+
+from database.db_pool import use_database
+from database.db_router import reset_query_router
+from database.db_utils import fetch_from_db, fetch_page, get_table_page, get_build_team_data
+from database.arrow_utils import ARROW_AVAILABLE
+from database.pg_fixture import ThrowawayPostgres
+from database.query_cache import get_query_cache
+from database.schema_cache import get_schema_snapshot, invalidate_schema_cache
+from database.synthetic_data import LOAD_ORDER, load_synthetic_data, parse_scale
+from database.table_stats import get_table_statistics
+
+logger = logging.getLogger(__name__)
+
+
+BENCHMARK_SELECT = """
+    SELECT e.firstname, e.lastname, e.role, t.description, t.work_hours
+    FROM tasks t JOIN employees e ON e.employee_id = t.employee_id
+    WHERE e.department = 'IT' ORDER BY t.task_id
+"""
+
+BENCHMARKS = {
+    "schema_snapshot": lambda: get_schema_snapshot(force_refresh=True),
+    "fetch_from_db": lambda: fetch_from_db(BENCHMARK_SELECT, use_cache=False),
+    "fetch_page": lambda: fetch_page(BENCHMARK_SELECT),
+    "table_page": lambda: get_table_page("tasks"),
+    "table_statistics": lambda: get_table_statistics("tasks", ["work_hours"]),
+    "build_team_data": get_build_team_data,
+}
+if ARROW_AVAILABLE:
+    BENCHMARKS["fetch_from_db_columnar"] = lambda: fetch_from_db(BENCHMARK_SELECT, columnar=True, use_cache=False)
+
+
+def time_operation(operation, repeat):
+    """Runs `operation` `repeat` times with cold result caches; returns the timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        get_query_cache().invalidate_tables(set(LOAD_ORDER))
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark_scale(employees, repeat):
+    """Loads `employees` worth of synthetic data into a fresh instance and times every benchmark."""
+    with ThrowawayPostgres() as pg:
+        pg.create_schema()
+        conn = psycopg2.connect(**pg.dsn_params)
+        try:
+            load_report = load_synthetic_data(conn, employees)
+        finally:
+            conn.close()
+
+        use_database(pg.dsn_params)
+        reset_query_router()
+        invalidate_schema_cache()
+        get_query_cache().invalidate_tables(None)
+
+        results = {}
+        for name, operation in BENCHMARKS.items():
+            timings = time_operation(operation, repeat)
+            results[name] = {"min": round(min(timings), 4), "median": round(statistics.median(timings), 4)}
+            logger.info(f"{name}: min {results[name]['min']}s, median {results[name]['median']}s")
+    return {"employees": employees, "load": load_report, "operations": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the database paths on synthetic data.")
+    parser.add_argument("--scales", default="1k,10k,100k", help="comma separated employee counts (1k to 10m)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales.split(","):
+        result = benchmark_scale(parse_scale(scale.strip()), args.repeat)
+        results.append(result)
+        loaded = sum(table["rows"] for table in result["load"].values())
+        print(f"\n{scale.strip()} employees ({loaded:,} rows)")
+        for name, timing in result["operations"].items():
+            print(f"  {name:<24} min {timing['min'] * 1000:>10.1f} ms   median {timing['median'] * 1000:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
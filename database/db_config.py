@@ -11,3 +11,26 @@ from dotenv import load_dotenv
 #    "port": os.getenv("DB_PORT")
 #}
 
+
+
+import streamlit as st
+
+DEFAULT_DATA_DIR = "data"     # runtime state (caches, logs), ignored by git
+
+
+def get_data_dir():
+    """Directory for runtime state: $APP_DATA_DIR, `data_dir` in the [app] secrets, or ./data."""
+    data_dir = os.getenv("APP_DATA_DIR")
+    if not data_dir:
+        try:
+            data_dir = st.secrets["app"].get("data_dir") if "app" in st.secrets else None
+        except FileNotFoundError:   # no secrets file
+            data_dir = None
+    data_dir = data_dir or DEFAULT_DATA_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+def get_data_path(filename):
+    """Path of a runtime state file in the data directory."""
+    return os.path.join(get_data_dir(), filename)
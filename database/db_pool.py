@@ -0,0 +1,272 @@
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions as pg_extensions
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+
+# Default pool settings (can be overridden in the [postgresql] section of st.secrets)
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+POOL_ACQUIRE_TIMEOUT = 30         # seconds to wait for a free connection before giving up
+CONNECTION_MAX_LIFETIME = 1800    # seconds before a connection is closed and replaced
+HEALTH_CHECK_INTERVAL = 60        # seconds a connection may sit idle before it is pinged on borrow
+
+CONNECTION_KEYS = ("dbname", "user", "password", "host", "port", "sslmode")
+
+
+# Settings used instead of st.secrets after use_database() (e.g. a throwaway benchmark instance)
+_settings_override = None
+
+# Called with each connection a pool closes or discards (e.g. to drop per-connection state)
+_close_hooks = []
+
+
+def add_connection_close_hook(callback):
+    """Registers `callback(conn)`, called whenever any pool closes or discards a connection."""
+    _close_hooks.append(callback)
+
+
+def get_db_settings():
+    """Returns the [postgresql] settings: st.secrets, or the ones given to use_database()."""
+    if _settings_override is not None:
+        return _settings_override
+    if "postgresql" not in st.secrets:
+        raise KeyError("Missing 'postgresql' key in st.secrets")
+    return st.secrets["postgresql"]
+
+
+def get_db_config():
+    """Reads the PostgreSQL connection settings and pool options from st.secrets."""
+    settings = get_db_settings()
+    dsn_params = {key: settings[key] for key in CONNECTION_KEYS if key in settings}
+    pool_options = {
+        "minconn": int(settings.get("pool_min_connections", POOL_MIN_CONNECTIONS)),
+        "maxconn": int(settings.get("pool_max_connections", POOL_MAX_CONNECTIONS)),
+        "acquire_timeout": float(settings.get("pool_acquire_timeout", POOL_ACQUIRE_TIMEOUT)),
+        "max_lifetime": float(settings.get("connection_max_lifetime", CONNECTION_MAX_LIFETIME)),
+        "health_check_interval": float(settings.get("health_check_interval", HEALTH_CHECK_INTERVAL)),
+    }
+    return dsn_params, pool_options
+
+
+def get_replica_dsns():
+    """Returns the read replica DSNs listed under `replica_dsns` in the [postgresql] secrets (may be empty)."""
+    if _settings_override is None and "postgresql" not in st.secrets:
+        return []
+    replica_dsns = get_db_settings().get("replica_dsns", [])
+    if isinstance(replica_dsns, str):
+        replica_dsns = [replica_dsns]
+    return list(replica_dsns)
+
+
+class ConnectionManager:
+    """Bounded, thread-safe pool of psycopg2 connections with health checks and lifetime recycling."""
+
+    def __init__(self, dsn_params, minconn=POOL_MIN_CONNECTIONS, maxconn=POOL_MAX_CONNECTIONS,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT, max_lifetime=CONNECTION_MAX_LIFETIME,
+                 health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.dsn_params = dsn_params
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **dsn_params)
+        # ThreadedConnectionPool raises instead of waiting when exhausted, so borrowers queue here
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._created_at = {}   # id(conn) -> time the connection was opened
+        self._last_used = {}    # id(conn) -> time the connection was last returned
+
+        self._stats = {
+            "borrowed": 0,
+            "returned": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "opened": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "acquire_timeouts": 0,
+            "total_wait_time": 0.0,
+        }
+
+    def getconn(self):
+        """Borrows a healthy connection from the pool, waiting up to `acquire_timeout` seconds."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._stats["acquire_timeouts"] += 1
+            raise pg_pool.PoolError(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["borrowed"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+            self._stats["total_wait_time"] += time.monotonic() - start
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Returns a connection to the pool, discarding it if it is broken or was asked to be closed."""
+        try:
+            if not conn.closed and not close:
+                # Never hand out a connection with an open or aborted transaction
+                if conn.get_transaction_status() != pg_extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+            close = close or bool(conn.closed)
+            if close:
+                self._forget(conn)
+            else:
+                self._touch(conn)
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._stats["returned"] += 1
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always gives it back."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def stats(self):
+        """Returns a snapshot of the pool usage counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_connections"] = self.maxconn
+        stats["idle"] = len(self._pool._pool)
+        stats["avg_wait_time"] = round(stats["total_wait_time"] / stats["borrowed"], 6) if stats["borrowed"] else 0.0
+        return stats
+
+    def close(self):
+        """Closes every connection held by the pool."""
+        if not self._pool.closed:
+            for conn in list(self._pool._pool) + list(self._pool._used.values()):
+                self._forget(conn)
+            self._pool.closeall()
+
+    def _checkout_healthy(self):
+        conn = self._pool.getconn()
+        now = time.monotonic()
+        key = id(conn)
+
+        with self._lock:
+            if key not in self._created_at:
+                self._created_at[key] = now
+                self._last_used[key] = now
+                self._stats["opened"] += 1
+            created_at = self._created_at[key]
+            last_used = self._last_used[key]
+
+        # Recycle connections that are closed or have outlived their maximum lifetime
+        if conn.closed or now - created_at > self.max_lifetime:
+            with self._lock:
+                self._stats["recycled"] += 1
+            return self._replace(conn)
+
+        # Ping connections that have been idle for a while before handing them out
+        if now - last_used > self.health_check_interval:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Discarding unhealthy pooled connection: {e}")
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                return self._replace(conn)
+
+        return conn
+
+    def _replace(self, conn):
+        self._forget(conn)
+        self._pool.putconn(conn, close=True)
+        new_conn = self._pool.getconn()
+        now = time.monotonic()
+        with self._lock:
+            self._created_at[id(new_conn)] = now
+            self._last_used[id(new_conn)] = now
+            self._stats["opened"] += 1
+        return new_conn
+
+    def _touch(self, conn):
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+
+    def _forget(self, conn):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+            self._last_used.pop(id(conn), None)
+        for hook in _close_hooks:
+            try:
+                hook(conn)
+            except Exception as e:
+                logger.warning(f"Connection close hook failed: {e}")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_connection_manager():
+    """Returns the process-wide ConnectionManager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                dsn_params, pool_options = get_db_config()
+                _manager = ConnectionManager(dsn_params, **pool_options)
+                logger.info(f"Created PostgreSQL connection pool (max {pool_options['maxconn']} connections)")
+    return _manager
+
+
+def close_connection_manager():
+    """Closes the process-wide pool (registered to run at interpreter exit)."""
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+
+
+def use_database(settings):
+    """Points the process at another database, given as a dict of [postgresql] settings.
+
+    The current pool is closed; callers should also reset the query router and caches.
+    """
+    global _settings_override
+    close_connection_manager()
+    _settings_override = dict(settings)
+
+
+def get_pool_stats():
+    """Returns usage counters of the process-wide pool, or an empty dict if it has not been created."""
+    return _manager.stats() if _manager is not None else {}
+
+
+atexit.register(close_connection_manager)
@@ -0,0 +1,160 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from database.db_pool import ConnectionManager, get_connection_manager, get_db_config, get_db_settings, get_replica_dsns
+
+logger = logging.getLogger(__name__)
+
+
+READ_YOUR_WRITES_WINDOW = 5     # seconds a session reads from the primary after it wrote
+REPLICA_RETRY_DELAY = 30        # seconds an unreachable replica is skipped before it is tried again
+
+# Identifies the caller (e.g. the chat session) for read-your-writes pinning; None means process-wide
+_session_id = contextvars.ContextVar("db_session_id", default=None)
+
+
+def set_db_session(session_id):
+    """Sets the session used for read-your-writes pinning in the current context."""
+    _session_id.set(session_id)
+
+
+class QueryRouter:
+    """Sends read-only statements to replicas round-robin and everything else to the primary."""
+
+    def __init__(self, primary, replicas, read_your_writes_window=READ_YOUR_WRITES_WINDOW):
+        self.primary = primary
+        self.replicas = replicas            # list of (name, ConnectionManager)
+        self.read_your_writes_window = read_your_writes_window
+        self._next_replica = 0
+        self._down_until = {}               # replica name -> time it may be retried
+        self._pinned_until = {}             # session id -> time reads may go back to replicas
+        self._lock = threading.Lock()
+        self._latency = {}                  # target name -> {"count", "errors", "total", "max"}
+
+    @contextmanager
+    def connection(self, read_only=False):
+        """Borrows a connection from the target chosen for this statement."""
+        name, manager = self._choose(read_only)
+        start = time.monotonic()
+        failed = False
+        connection_lost = True      # until the pool handed out a connection
+        try:
+            with manager.connection() as conn:
+                connection_lost = False
+                try:
+                    yield conn
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Statement errors (e.g. QueryCanceled) leave the connection open: the replica is fine
+                    connection_lost = bool(conn.closed)
+                    raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, pg_pool.PoolError):
+            failed = True
+            if name != "primary" and connection_lost:
+                self._mark_down(name)
+            raise
+        finally:
+            self._record(name, time.monotonic() - start, failed)
+
+    def mark_write(self, session_id=None):
+        """Pins the session to the primary for the read-your-writes window."""
+        session_id = session_id if session_id is not None else _session_id.get()
+        now = time.monotonic()
+        with self._lock:
+            # Expired pins are dropped here so the dict only holds sessions that wrote recently
+            self._pinned_until = {key: until for key, until in self._pinned_until.items() if until > now}
+            self._pinned_until[session_id] = now + self.read_your_writes_window
+
+    def latency_stats(self):
+        """Returns per-target latency counters (seconds), served by GET /db/stats."""
+        with self._lock:
+            return {
+                name: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "avg_latency": round(stats["total"] / stats["count"], 6) if stats["count"] else 0.0,
+                    "max_latency": round(stats["max"], 6),
+                }
+                for name, stats in self._latency.items()
+            }
+
+    def pool_stats(self):
+        stats = {"primary": self.primary.stats()}
+        for name, manager in self.replicas:
+            stats[name] = manager.stats()
+        return stats
+
+    def _choose(self, read_only):
+        if not read_only or not self.replicas or self._is_pinned():
+            return "primary", self.primary
+
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                name, manager = self.replicas[self._next_replica]
+                self._next_replica = (self._next_replica + 1) % len(self.replicas)
+                if self._down_until.get(name, 0) <= now:
+                    return name, manager
+        # Every replica is down: reads go to the primary
+        return "primary", self.primary
+
+    def _is_pinned(self):
+        session_id = _session_id.get()
+        now = time.monotonic()
+        with self._lock:
+            for key in (session_id, None):
+                if key in self._pinned_until and self._pinned_until[key] <= now:
+                    del self._pinned_until[key]
+            return self._pinned_until.get(session_id, 0) > now or self._pinned_until.get(None, 0) > now
+
+    def _mark_down(self, name):
+        logger.warning(f"Replica {name} unreachable, skipping it for {REPLICA_RETRY_DELAY}s")
+        with self._lock:
+            self._down_until[name] = time.monotonic() + REPLICA_RETRY_DELAY
+
+    def _record(self, name, elapsed, failed):
+        with self._lock:
+            stats = self._latency.setdefault(name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_query_router():
+    """Returns the process-wide QueryRouter, creating the replica pools on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _, pool_options = get_db_config()
+                window = float(get_db_settings().get("read_your_writes_window", READ_YOUR_WRITES_WINDOW))
+                replicas = []
+                for index, dsn in enumerate(get_replica_dsns()):
+                    try:
+                        replicas.append((f"replica_{index}", ConnectionManager({"dsn": dsn}, **pool_options)))
+                    except psycopg2.Error as e:
+                        logger.warning(f"Could not create the pool for replica_{index}, ignoring it: {e}")
+                _router = QueryRouter(get_connection_manager(), replicas, read_your_writes_window=window)
+                if replicas:
+                    logger.info(f"Routing read-only queries to {len(replicas)} replica(s)")
+    return _router
+
+
+def reset_query_router():
+    """Drops the process-wide router so the next call rebuilds it (after db_pool.use_database)."""
+    global _router
+    with _router_lock:
+        if _router is not None:
+            for _, manager in _router.replicas:
+                manager.close()
+        _router = None
@@ -1,11 +1,21 @@
+import re
+import json
+import uuid
+import hashlib
+import base64
 import psycopg2
+from psycopg2 import sql
 #from database.db_config import DB_CONFIG
 import logging
 import pandas as pd
 import streamlit as st
 from urllib.parse import quote_plus
-from st_supabase_connection import SupabaseConnection
-from supabase import create_client, Client
+from contextlib import nullcontext
+from database.db_router import get_query_router
+from database.schema_cache import get_schema_snapshot, get_schema_hash
+from database.query_cache import get_query_cache, record_write, invalidate_after_commit, tables_read, strip_literals
+from database.workload_log import record_statement
+from database.arrow_utils import ARROW_AVAILABLE, rows_to_record_batch, batches_to_table, table_to_dataframe
 
 # Set up logging configuration
 logging.basicConfig(level=logging.DEBUG,  
@@ -16,86 +26,49 @@ logger = logging.getLogger(__name__)
 
 
 
-def get_db_connection():
-    """Establishes a connection to the PostgreSQL database via Supabase."""
-    try:
-        # Check if the keys exist in secrets
-        if "postgresql" not in st.secrets:
-            raise KeyError("Missing 'postgresql' key in st.secrets")
-        
-        # Get the Supabase URL and Key from secrets
-        url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
-        key = st.secrets["connections"]["supabase"]["SUPABASE_KEY"]
-
-        # Initialize the Supabase client
-        supabase: Client = create_client(url, key)
-        
-        # Return the client (or the result, depending on the use case)
-        return supabase
-    
-    except Exception as e:
-        # General exception handling for any other errors
-        print(f"Error: {e}")
-        return None
-
-
-      
-      
+def get_db_connection(read_only=False):
+    """Borrows a pooled connection (use as a context manager); read-only work may be routed to a replica."""
+    return get_query_router().connection(read_only=read_only)
 
 
+def rows_to_records(cur):
+    """Converts the rows of an executed cursor into a list of dicts keyed by column name."""
+    if cur.description is None:
+        return []
+    columns = [col.name for col in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
 
 
         
 def execute_query(sql_query):
     """Executes a single SQL query."""
-    conn = get_db_connection()
-    #cur = conn.cursor()
-    
     try:
-        print("Executing...\n", sql_query)
-        #cur.execute(sql_query)
-        conn.query(sql_query).execute()
-        conn.commit()  # Commit after each query
+        with get_db_connection() as conn:
+            print("Executing...\n", sql_query)
+            with conn.cursor() as cur:
+                cur.execute(sql_query)
+                rowcount = cur.rowcount
+                written_tables = record_write(cur, sql_query)
+            conn.commit()  # Commit after each query
+            invalidate_after_commit([written_tables])
+        record_statement(sql_query, "execute")
+        # Keep this session's reads on the primary until replicas caught up with the write
+        get_query_router().mark_write()
         print("Query executed successfully!")
-        return {"success": True, "message": "Query executed successfully"}
+        return {"success": True, "message": "Query executed successfully", "rowcount": rowcount}
     
     except Exception as e:
-        conn.rollback()  # Rollback on failure
+        # The pool rolls back any failed transaction when the connection is returned
         return {"error": str(e), "message": f"Error with query: {sql_query}"}
-    
-    finally:
-        cur.close()
-        conn.close()
 
 
         
 
 def get_database_schema():
     """Fetches the full database schema, including primary keys, foreign keys, and column data types."""
-    conn = get_db_connection()
-
-    # Check connection
-    if not conn:
-        return None, None
-
     try:
-        # Fetch database name
-        db_name_result = conn.rpc('current_database').execute()
-        db_name = db_name_result.data[0]
-
-        # Fetch schema (using Supabase client methods or raw SQL queries)
-        schema_result = conn.from_('information_schema.columns').select('*').execute()
-
-        schema = {}
-        for record in schema_result.data:
-            table = record['table_name']
-            column = record['column_name']
-            data_type = record['data_type']
-            if table not in schema:
-                schema[table] = {"columns": [], "primary_key": None, "foreign_keys": []}
-            schema[table]["columns"].append({"column_name": column, "data_type": data_type})
-
-        return db_name, schema
+        # Served from the cached snapshot, refreshed on TTL expiry or DDL notification
+        return get_schema_snapshot().as_tuple()
     except Exception as e:
         print(f"Error fetching database schema: {e}")
         return None, None
@@ -106,41 +79,201 @@ def get_database_schema():
 
 
 
-def fetch_from_db(sql_query):
-    """Executes an SQL query and fetches results."""
-    conn = get_db_connection()
-    #cur = conn.cursor()
-    #conn.query(sql_query)
-    results = conn.query(sql_query).execute().to_dict(orient="records")
-    #cur.close()
-    conn.close()
+def query_cache_key(sql_query, *variant):
+    """Result cache key for a read statement (None if it must not be cached)."""
+    if not is_read_query(sql_query):
+        return None
+    return get_query_cache().make_key(sql_query, get_schema_hash(), *variant)
+
+
+def fetch_from_db(sql_query, columnar=False, use_cache=True):
+    """Executes an SQL query and fetches results.
+
+    Returns a list of row dicts, or a pyarrow Table when `columnar=True`. Results of
+    read statements are served from the query cache until a write touches their tables.
+    """
+    cache_key = query_cache_key(sql_query, "columnar" if columnar else "records") if use_cache else None
+    hit, results = get_query_cache().get(cache_key)
+    if hit:
+        return results
+
+    with get_db_connection(read_only=is_read_query(sql_query)) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql_query)
+            if not columnar:
+                results = rows_to_records(cur)
+            else:
+                columns = [col.name for col in cur.description] if cur.description else []
+                rows = cur.fetchall() if cur.description else []
+                # Built column by column, without an intermediate dict per row
+                results = batches_to_table([rows_to_record_batch(columns, rows)], columns)
+
+    get_query_cache().put(cache_key, results, len(results))
+    record_statement(sql_query, "fetch")
     return results
 
 
+def fetch_dataframe(sql_query):
+    """Executes an SQL query and returns the results as a DataFrame (built from Arrow when available)."""
+    if ARROW_AVAILABLE:
+        return table_to_dataframe(fetch_from_db(sql_query, columnar=True))
+    return pd.DataFrame(fetch_from_db(sql_query))
+
+
+# Limits for streamed SELECT results (protect the Flask worker from huge LLM-generated queries)
+STREAM_ITERSIZE = 2000                   # rows fetched from the server-side cursor per round trip
+STREAM_MAX_ROWS = 10000                  # hard cap on rows returned to the caller
+STREAM_MAX_BYTES = 10 * 1024 * 1024      # hard cap on the (approximate) size of returned values
+
+READ_QUERY_PREFIXES = ("SELECT", "WITH", "VALUES", "TABLE")
+DATA_MODIFYING = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+
+
+def is_read_query(sql_query):
+    """True if the statement is a plain read that can run on a server-side cursor (and on a replica).
+
+    A WITH statement whose CTEs insert, update, delete or merge is a write.
+    """
+    statement = sql_query.lstrip(" (\n\t").upper()
+    if not statement.startswith(READ_QUERY_PREFIXES):
+        return False
+    return not (statement.startswith("WITH") and DATA_MODIFYING.search(strip_literals(sql_query)))
+
+
+def new_fetch_report(max_rows=STREAM_MAX_ROWS, max_bytes=STREAM_MAX_BYTES):
+    """Counters filled while rows are taken under the caps (see take_within_caps)."""
+    return {
+        "row_count": 0,
+        "byte_count": 0,
+        "truncated": False,
+        "limit_reason": None,
+        "max_rows": max_rows,
+        "max_bytes": max_bytes,
+    }
+
+
+def take_within_caps(rows, report):
+    """Returns the leading `rows` that still fit under the report's row and byte caps.
+
+    The byte size of a row is approximated by the length of its values as text. `report` is
+    updated with the counts and, when a row did not fit, marked as truncated.
+    """
+    kept = []
+    for row in rows:
+        row_bytes = sum(len(str(value)) for value in row)
+        if report["max_rows"] is not None and report["row_count"] >= report["max_rows"]:
+            report["truncated"], report["limit_reason"] = True, "max_rows"
+            break
+        if report["max_bytes"] is not None and report["byte_count"] + row_bytes > report["max_bytes"]:
+            report["truncated"], report["limit_reason"] = True, "max_bytes"
+            break
+        kept.append(row)
+        report["row_count"] += 1
+        report["byte_count"] += row_bytes
+    return kept
+
+
+def capped_row_batches(cur, itersize, report):
+    """Yields lists of row tuples fetched `itersize` at a time from `cur` until a cap is hit."""
+    while not report["truncated"]:
+        rows = cur.fetchmany(itersize)
+        if not rows:
+            break
+        kept = take_within_caps(rows, report)
+        if kept:
+            yield kept
+
+
+def stream_from_db(sql_query, itersize=STREAM_ITERSIZE, max_rows=STREAM_MAX_ROWS, max_bytes=STREAM_MAX_BYTES,
+                   columnar=False, conn=None):
+    """Executes a SELECT on a named server-side cursor and yields batches of row dicts.
+
+    Returns (batches, report): `batches` is a generator of lists of dicts (Arrow RecordBatches
+    when `columnar=True`), and `report` is updated while iterating with the row/byte counts
+    and whether a cap was hit. The cursor is opened on `conn` when given (e.g. inside a batch
+    transaction), otherwise on a borrowed read-only connection.
+    """
+    report = new_fetch_report(max_rows, max_bytes)
+
+    def batches():
+        with (nullcontext(conn) if conn is not None else get_db_connection(read_only=True)) as connection:
+            with connection.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = itersize
+                cur.execute(sql_query.strip().rstrip(";"))
+                for rows in capped_row_batches(cur, itersize, report):
+                    columns = [col.name for col in cur.description]
+                    if columnar:
+                        yield rows_to_record_batch(columns, rows)
+                    else:
+                        yield [dict(zip(columns, row)) for row in rows]
+
+        if report["truncated"]:
+            logger.warning(f"Result truncated at {report['row_count']} rows ({report['limit_reason']}): {sql_query}")
+
+    return batches(), report
+
+
+def fetch_capped(conn, sql_query, itersize=STREAM_ITERSIZE, max_rows=STREAM_MAX_ROWS, max_bytes=STREAM_MAX_BYTES):
+    """Collects stream_from_db on `conn` into (rows, report), with the caps applied."""
+    batches, report = stream_from_db(sql_query, itersize=itersize, max_rows=max_rows, max_bytes=max_bytes, conn=conn)
+    rows = [record for batch in batches for record in batch]
+    return rows, report
+
+
+def fetch_from_db_capped(sql_query, itersize=STREAM_ITERSIZE, max_rows=STREAM_MAX_ROWS, max_bytes=STREAM_MAX_BYTES,
+                         columnar=False):
+    """Fetches a SELECT through stream_from_db, returning (rows, report) with the caps applied.
+
+    `rows` is a list of dicts, or a pyarrow Table when `columnar=True`.
+    """
+    if not is_read_query(sql_query):
+        rows = fetch_from_db(sql_query, columnar=columnar)
+        return rows, {"row_count": len(rows), "byte_count": None, "truncated": False, "limit_reason": None,
+                      "max_rows": max_rows, "max_bytes": max_bytes}
+
+    cache_key = query_cache_key(sql_query, "capped", columnar, max_rows, max_bytes)
+    hit, cached = get_query_cache().get(cache_key)
+    if hit:
+        rows, report = cached
+        return rows, dict(report, cache_hit=True)
+
+    batches, report = stream_from_db(sql_query, itersize=itersize, max_rows=max_rows, max_bytes=max_bytes,
+                                     columnar=columnar)
+    if columnar:
+        rows = batches_to_table(batches)
+    else:
+        rows = []
+        for batch in batches:
+            rows.extend(batch)
+
+    get_query_cache().put(cache_key, (rows, report), report["row_count"])
+    return rows, report
+
+
 def get_database_data():
     """Fetches all data from all tables in the database in real-time."""
-    conn = get_db_connection()
-    if not conn:
-        return None, None  # Return early if connection fails
-
     db_data = {}
     
     try:
-        # Fetch all table names from the public schema
-        tables = conn.query("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public';
-        """).execute().to_dict(orient="records")
-        
-        # Iterate over the tables and fetch data
-        for table in tables:
-            table_name = table['table_name']  # Extract table name from result
-            table_data = conn.query(f"SELECT * FROM {table_name};").to_dict(orient="records")
-            
-            if table_data:
-                columns = table_data[0].keys()  # Extract column names from the first row
-                db_data[table_name] = {"columns": list(columns), "rows": table_data}
+        with get_db_connection(read_only=True) as conn:
+            with conn.cursor() as cur:
+                # Fetch all table names from the public schema
+                cur.execute("""
+                    SELECT table_name 
+                    FROM information_schema.tables 
+                    WHERE table_schema = 'public';
+                """)
+                tables = rows_to_records(cur)
+
+                # Iterate over the tables and fetch data on the same borrowed connection
+                for table in tables:
+                    table_name = table['table_name']  # Extract table name from result
+                    cur.execute(f'SELECT * FROM "{table_name}";')
+                    table_data = rows_to_records(cur)
+
+                    if table_data:
+                        columns = table_data[0].keys()  # Extract column names from the first row
+                        db_data[table_name] = {"columns": list(columns), "rows": table_data}
         
         db_name, schema = get_database_schema()  # Assuming this function works as intended
 
@@ -155,52 +288,382 @@ def get_database_data():
 
 
 
-def get_build_team_data():
-    # Define the SQL query
-    sql_query = """
+VIEWER_PAGE_SIZE = 50   # rows per page in the Database Viewer
+
+
+def encode_page_cursor(values):
+    """Encodes the last seen key values (or an offset) into an opaque cursor string."""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+
+
+def get_table_page(table_name, page_size=VIEWER_PAGE_SIZE, cursor=None):
+    """Fetches one page of a table using keyset pagination on its primary key.
+
+    Returns {"columns", "rows", "next_cursor", "approx_row_count"}; pass `next_cursor`
+    back to get the following page (None when the last page was reached).
+    """
+    db_name, schema = get_database_schema()
+    if not schema or table_name not in schema:
+        raise ValueError(f"Unknown table: {table_name}")
+
+    table_schema = schema[table_name]
+    columns = [column_info["column_name"] for column_info in table_schema["columns"]]
+    key_columns = table_schema.get("primary_key_columns") or []
+    last_seen = decode_page_cursor(cursor) if cursor else None
+
+    table = sql.Identifier(table_name)
+    params = []
+    if key_columns:
+        keys = sql.SQL(", ").join(sql.Identifier(col) for col in key_columns)
+        where = sql.SQL("")
+        if last_seen is not None:
+            # Row comparison lets the index on the primary key seek directly to the next page
+            where = sql.SQL("WHERE ({}) > ({})").format(keys, sql.SQL(", ").join(sql.Placeholder() * len(key_columns)))
+            params.extend(last_seen)
+        query = sql.SQL("SELECT * FROM {} {} ORDER BY {} LIMIT %s").format(table, where, keys)
+        params.append(page_size + 1)
+    else:
+        # Tables without a primary key fall back to OFFSET pagination
+        offset = last_seen or 0
+        query = sql.SQL("SELECT * FROM {} LIMIT %s OFFSET %s").format(table)
+        params.extend([page_size + 1, offset])
+
+    with get_db_connection(read_only=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = rows_to_records(cur)
+            cur.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s);",
+                (sql.Identifier(table_name).as_string(cur),)
+            )
+            reltuples = cur.fetchone()
+    # reltuples is -1 for tables that were never vacuumed or analyzed
+    approx_row_count = reltuples[0] if reltuples and reltuples[0] is not None and reltuples[0] >= 0 else None
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        if key_columns:
+            next_cursor = encode_page_cursor([rows[-1][col] for col in key_columns])
+        else:
+            next_cursor = encode_page_cursor((last_seen or 0) + page_size)
+
+    if rows:
+        columns = list(rows[0].keys())
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "next_cursor": next_cursor,
+        "approx_row_count": approx_row_count,
+    }
+
+
+
+
+
+CHAT_PAGE_SIZE = 100    # rows per page of SELECT results shown in the chat
+
+ORDER_ITEM = re.compile(r'^\s*(?:"?\w+"?\.)?"?(\w+)"?(?:\s+(asc|desc))?\s*$', re.IGNORECASE)
+
+
+def mask_nested(sql_query):
+    """Blanks string literals and everything inside parentheses, keeping offsets unchanged."""
+    masked, depth, in_string = [], 0, False
+    for char in sql_query:
+        if char == "'":
+            in_string = not in_string
+            masked.append(" ")
+            continue
+        if not in_string and char == "(":
+            depth += 1
+        elif not in_string and char == ")":
+            depth -= 1
+            masked.append(" ")
+            continue
+        masked.append(char if depth == 0 and not in_string else " ")
+    return "".join(masked)
+
+
+def keyset_order(sql_query):
+    """Returns (columns, descending) if the statement can be paged by keyset, else None.
+
+    That is the case when its outermost ORDER BY lists plain columns in one direction that
+    include the primary key of every table it reads (so the order is unique), and it has no
+    LIMIT/OFFSET or set operation of its own.
+    """
+    masked = mask_nested(sql_query)
+    if re.search(r"\b(limit|offset|fetch|union|intersect|except)\b", masked, re.IGNORECASE):
+        return None
+    matches = list(re.finditer(r"\border\s+by\b", masked, re.IGNORECASE))
+    if not matches:
+        return None
+
+    start = matches[-1].end()
+    bounds = [start] + [start + i + 1 for i, char in enumerate(masked[start:]) if char == ","] + [len(sql_query) + 1]
+    columns, directions = [], set()
+    for begin, end in zip(bounds, bounds[1:]):
+        item = ORDER_ITEM.match(sql_query[begin:end - 1])
+        if item is None:
+            return None
+        columns.append(item.group(1).lower())
+        directions.add((item.group(2) or "asc").lower())
+    if len(directions) != 1:
+        return None
+
+    _, schema = get_database_schema()
+    tables = tables_read(sql_query)
+    for table in tables:
+        key_columns = schema.get(table, {}).get("primary_key_columns") if isinstance(schema, dict) else None
+        if not key_columns or not set(key_columns) <= set(columns):
+            return None
+    return (columns, directions == {"desc"}) if tables else None
+
+
+def fetch_page(sql_query, page_size=CHAT_PAGE_SIZE, page_token=None, columnar=False):
+    """Fetches one page of a SELECT by wrapping it in an outer query with a LIMIT.
+
+    Statements ordered by a unique key (see keyset_order) are paged by keyset, everything else
+    by OFFSET. The page is read from a server-side cursor and ends early once its values reach
+    STREAM_MAX_BYTES. Returns (rows or pyarrow Table, page_info) where page_info holds
+    `next_token`, to be passed back to get the following page (None after the last page).
+    """
+    plan = plan_page(sql_query, page_size, page_token, columnar)
+    hit, cached = get_query_cache().get(plan["cache_key"])
+    if hit:
+        return cached
+
+    with get_db_connection(read_only=True) as conn:
+        try:
+            columns, rows, report = fetch_page_rows(conn, plan)
+        except (psycopg2.errors.UndefinedColumn, psycopg2.errors.AmbiguousColumn):
+            if plan["method"] != "keyset":
+                raise
+            # The sort key is not (unambiguously) among the selected columns: page by offset instead
+            conn.rollback()
+            plan["method"] = "offset"
+            columns, rows, report = fetch_page_rows(conn, plan)
+
+    return finish_page(plan, columns, rows, report)
+
+
+def fetch_page_rows(conn, plan, itersize=STREAM_ITERSIZE):
+    """Runs the paging query of `plan` on a named cursor; returns (columns, rows, report) under the byte cap."""
+    report = new_fetch_report(max_rows=None)
+    with conn.cursor(name=f"page_{uuid.uuid4().hex}") as cur:
+        cur.itersize = itersize
+        cur.execute(*page_query(plan["sql"], plan["page_size"], plan["state"], plan["order"] if plan["method"] == "keyset" else None))
+        rows = [row for batch in capped_row_batches(cur, itersize, report) for row in batch]
+        columns = [col.name for col in cur.description] if cur.description else []
+    return columns, rows, report
+
+
+def plan_page(sql_query, page_size, page_token, columnar):
+    """Decodes the page token and picks the paging method (shared with the async driver)."""
+    sql_query = sql_query.strip().rstrip(";").strip()
+    page_size = max(1, min(int(page_size), STREAM_MAX_ROWS))
+    fingerprint = hashlib.sha256(sql_query.encode("utf-8")).hexdigest()[:12]
+    state = decode_page_cursor(page_token) if page_token else {"query": fingerprint, "offset": 0, "keys": None}
+    if state.get("query") != fingerprint:
+        raise ValueError("The page token does not belong to this query")
+
+    order = keyset_order(sql_query)
+    method = "keyset" if order and (state["keys"] is None or None not in state["keys"]) else "offset"
+    if state["offset"] and state["keys"] is None:
+        method = "offset"   # earlier pages were paged by offset
+    return {
+        "sql": sql_query,
+        "page_size": page_size,
+        "page_token": page_token,
+        "columnar": columnar,
+        "fingerprint": fingerprint,
+        "state": state,
+        "order": order,
+        "method": method,
+        "cache_key": query_cache_key(sql_query, "page", columnar, page_size, page_token),
+    }
+
+
+def finish_page(plan, columns, rows, report=None):
+    """Builds (result, page_info) from the fetched rows (page_size + 1 at most) and caches it.
+
+    When `report` says the byte cap cut the page short, the next token resumes after the last kept row.
+    """
+    page_size, state = plan["page_size"], plan["state"]
+    cut_short = bool(report and report["truncated"])
+    if cut_short and not rows:
+        raise ValueError(f"A single row of this result is larger than the {report['max_bytes']} byte limit")
+    has_more = len(rows) > page_size or cut_short
+    rows = rows[:page_size]
+    next_token = None
+    if has_more:
+        keys = [rows[-1][columns.index(column)] for column in plan["order"][0]] if plan["method"] == "keyset" else None
+        next_token = encode_page_cursor({"query": plan["fingerprint"], "offset": state["offset"] + len(rows), "keys": keys})
+
+    page_info = {
+        "method": plan["method"],
+        "page_size": page_size,
+        "offset": state["offset"],
+        "row_count": len(rows),
+        "has_more": has_more,
+        "next_token": next_token,
+        "limit_reason": report["limit_reason"] if cut_short else None,
+    }
+    if plan["columnar"]:
+        result = batches_to_table([rows_to_record_batch(columns, rows)], columns)
+    else:
+        result = [dict(zip(columns, row)) for row in rows]
+
+    get_query_cache().put(plan["cache_key"], (result, page_info), len(rows))
+    if plan["page_token"] is None:
+        record_statement(plan["sql"], "fetch")
+    return result, page_info
+
+
+def page_query(sql_query, page_size, state, order):
+    """Builds the outer paging query and its parameters (keyset when `order` is given)."""
+    # The generated statement is embedded verbatim, so its own % signs must not be taken as placeholders
+    inner = sql.SQL(sql_query.replace("%", "%%"))
+    if order is None:
+        query = sql.SQL("SELECT * FROM ({}) AS chat_page LIMIT %s OFFSET %s").format(inner)
+        return query, [page_size + 1, state["offset"]]
+
+    columns, descending = order
+    direction = sql.SQL(" DESC" if descending else "")
+    keys = sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+    order_by = sql.SQL(", ").join(sql.Composed([sql.Identifier(column), direction]) for column in columns)
+    params = []
+    where = sql.SQL("")
+    if state["keys"] is not None:
+        where = sql.SQL("WHERE ({}) {} ({})").format(
+            keys, sql.SQL("<" if descending else ">"), sql.SQL(", ").join(sql.Placeholder() * len(columns))
+        )
+        params.extend(state["keys"])
+    query = sql.SQL("SELECT * FROM ({}) AS chat_page {} ORDER BY {} LIMIT %s").format(inner, where, order_by)
+    return query, params + [page_size + 1]
+
+
+
+
+
+# One row per available employee: skills and validated tasks are aggregated server-side
+BUILD_TEAM_SELECT = """
     SELECT 
-        e.employee_id,  -- Include employee ID for reference
+        e.employee_id,
         e.role, 
         e.firstname,
         e.lastname,
-        s.skill_name, 
-        s.proficiency_level, 
-        s.years_of_experience, 
-        t.description AS validated_task
+        COALESCE(sk.skills, '[]'::jsonb) AS skills,
+        COALESCE(tk.validated_tasks, ARRAY[]::text[]) AS validated_tasks
     FROM employees e
-    LEFT JOIN skills s ON e.employee_id = s.employee_id
-    LEFT JOIN tasks t ON e.employee_id = t.employee_id AND t.validation = TRUE
-    LEFT JOIN work_and_vacation w ON e.employee_id = w.employee_id
-    WHERE w.availability = TRUE;  -- Only consider available employees
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(
+                   jsonb_build_object('name', s.skill_name, 'level', s.proficiency_level, 'years', s.years_of_experience)
+                   ORDER BY s.skill_name
+               ) AS skills
+        FROM skills s
+        WHERE s.employee_id = e.employee_id
+    ) sk ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(DISTINCT t.description ORDER BY t.description) AS validated_tasks
+        FROM tasks t
+        WHERE t.employee_id = e.employee_id AND t.validation = TRUE
+    ) tk ON TRUE
+    WHERE EXISTS (  -- Only consider available employees
+        SELECT 1 FROM work_and_vacation w WHERE w.employee_id = e.employee_id AND w.availability = TRUE
+    )
+"""
+BUILD_TEAM_QUERY = BUILD_TEAM_SELECT + "    ORDER BY e.lastname, e.firstname\n"
+# Same rollup restricted to a list of employees (used for incremental refreshes)
+BUILD_TEAM_QUERY_FOR_EMPLOYEES = BUILD_TEAM_SELECT + "    AND e.employee_id = ANY(%s::uuid[])\n"
+
+BUILD_TEAM_COLUMNS = ['employee_id', 'role', 'firstname', 'lastname', 'skills', 'validated_tasks']
+
+BUILD_TEAM_HEADER = "Name | Role | Skills (proficiency, years of experience) | Validated tasks"
+
+
+def get_build_team_data(token_counter=None):
+    """Fetches available employees with their skills and validated tasks, formatted for the LLM.
+
+    If `token_counter` (a callable text -> token count) is given, returns (formatted_data, stats)
+    with the token counts of the previous row-per-(skill x task) format and of the compact one.
     """
-                                                           ##### Build a system to track employee attendance, calculate hours worked, and generate payroll. Requirements: Track work hours and holidays.  
-                                                           # Calculate wages and generate payroll reports.
-    # Fetch the data from the database
-    data = fetch_from_db(sql_query)
-    
-    # Convert data into DataFrame for easy manipulation
-    columns = [
-        'employee_id', 'role', 'firstname', 'lastname', 'skill_name', 
-        'proficiency_level', 'years_of_experience', 'validated_task'
-    ]
-    df = pd.DataFrame(data, columns=columns)
-    
-    # Handle any missing or null values if needed (e.g., for `validated_task`)
-    df.fillna('No Task', inplace=True)
-    
+    data = fetch_from_db(BUILD_TEAM_QUERY)
+    df = pd.DataFrame(data, columns=BUILD_TEAM_COLUMNS)
+
     formatted_data = convert_data_for_llm(df)
-    
-    return formatted_data
+    if token_counter is None:
+        return formatted_data
+
+    legacy_data = convert_data_for_llm_legacy(df)
+    stats = {
+        "employees": len(df),
+        "rows_before": legacy_data.count("-" * 20),
+        "rows_after": len(df),
+        "tokens_before": token_counter(legacy_data),
+        "tokens_after": token_counter(formatted_data),
+    }
+    logger.info(f"Team builder data: {stats['tokens_before']} -> {stats['tokens_after']} tokens for {stats['employees']} employees")
+    return formatted_data, stats
+
+
+def encode_employees(df):
+    """Encodes each employee as one compact line; returns a Series of lines indexed by employee_id."""
+    if df.empty:
+        return pd.Series(dtype=str)
+
+    df = df.set_index("employee_id")
+
+    # Skills: one row per (employee, skill), deduplicated, then joined per employee
+    skills = df["skills"].explode().dropna()
+    if not skills.empty:
+        skill_frame = pd.DataFrame(skills.tolist(), index=skills.index)
+        years = skill_frame["years"].astype("Int64").astype("string").fillna("?")
+        skill_text = (skill_frame["name"].astype("string").fillna("?")
+                      + " (" + skill_frame["level"].astype("string").fillna("?")
+                      + ", " + years + "y)").astype(str)
+        skill_text = skill_text[~skill_text.reset_index().duplicated().to_numpy()]
+        skill_text = skill_text.groupby(level=0).agg("; ".join)
+    else:
+        skill_text = pd.Series(dtype=str)
+
+    tasks = df["validated_tasks"].explode().dropna().astype(str)
+    task_text = tasks[~tasks.reset_index().duplicated().to_numpy()].groupby(level=0).agg("; ".join)
+
+    lines = (df["firstname"].astype("string").fillna("") + " " + df["lastname"].astype("string").fillna("")
+             + " | " + df["role"].astype("string").fillna("-")
+             + " | " + skill_text.reindex(df.index).astype("string").fillna("-")
+             + " | " + task_text.reindex(df.index).astype("string").fillna("No Task"))
+    return lines.astype(str)
+
 
 def convert_data_for_llm(df):
-    formatted_data = ""
-    
-    for _, row in df.iterrows():
-        formatted_data += f"Employee ID: {row['employee_id']}\n"
-        formatted_data += f"Name: {row['firstname']} {row['lastname']}\n"
-        formatted_data += f"Role: {row['role']}\n"
-        formatted_data += f"Skills: {row['skill_name']} (Proficiency: {row['proficiency_level']}, Experience: {row['years_of_experience']} years)\n"
-        formatted_data += f"Validated Task: {row['validated_task']}\n"
-        formatted_data += "-" * 20 + "\n"
-    
-    return formatted_data
+    """Formats the per-employee rollup as a compact table, one line per employee."""
+    lines = encode_employees(df)
+    return BUILD_TEAM_HEADER + "\n" + "\n".join(lines.tolist()) + "\n"
+
+
+def convert_data_for_llm_legacy(df):
+    """Renders the previous row-per-(skill x validated task) format, used to measure the savings."""
+    if df.empty:
+        return ""
+    rows = df.explode("skills").explode("validated_tasks")
+    skills = pd.DataFrame([s if isinstance(s, dict) else {} for s in rows["skills"]], index=rows.index,
+                          columns=["name", "level", "years"])
+
+    def text(series):
+        return series.astype("string").fillna("No Task")
+
+    blocks = ("Employee ID: " + text(rows["employee_id"]) + "\n"
+              + "Name: " + text(rows["firstname"]) + " " + text(rows["lastname"]) + "\n"
+              + "Role: " + text(rows["role"]) + "\n"
+              + "Skills: " + text(skills["name"])
+              + " (Proficiency: " + text(skills["level"])
+              + ", Experience: " + text(skills["years"]) + " years)\n"
+              + "Validated Task: " + text(rows["validated_tasks"]) + "\n"
+              + "-" * 20 + "\n")
+    return "".join(blocks.tolist())
@@ -0,0 +1,297 @@
+"""Workload-driven index advisor.
+
+    python -m database.index_advisor [--limit 10] [--workload data/query_workload.jsonl] [--json]
+"""
+import re
+import json
+import logging
+import argparse
+from collections import defaultdict
+
+import psycopg2
+
+from database.db_utils import get_db_connection, get_database_schema
+from database.query_cache import strip_literals, STRING_LITERAL
+from database.workload_log import load_workload
+
+logger = logging.getLogger(__name__)
+
+
+ADVISOR_MAX_CANDIDATES = 50          # candidates evaluated with hypothetical indexes
+ADVISOR_MIN_BENEFIT = 0.05           # relative cost reduction below which a candidate is dropped
+
+TABLE_ALIASES = re.compile(r'\b(?:from|join)\s+"?(\w+)"?(?:\.\s*"?(\w+)"?)?(?:\s+(?:as\s+)?(?!on\b|where\b|join\b|left\b|right\b|inner\b|full\b|cross\b|group\b|order\b|limit\b)(\w+))?', re.IGNORECASE)
+JOIN_TARGET = re.compile(r'(?:=|<>|!=|<=|>=|<|>)\s*(\w+)\.\s*"?(\w+)"?', re.IGNORECASE)
+PREDICATE = re.compile(r'(?:(\w+)\.)?"?(\w+)"?\s*(=|<>|!=|<=|>=|<|>|\bin\b|\blike\b|\bilike\b|\bbetween\b|\bis\b)', re.IGNORECASE)
+CLAUSES = re.compile(r'\b(where|on|order\s+by|group\s+by|having|limit|offset|returning|set|values)\b', re.IGNORECASE)
+SQL_WORDS = {"and", "or", "not", "null", "true", "false", "case", "when", "then", "else", "end", "select", "exists"}
+
+EXISTING_INDEXES_QUERY = """
+    SELECT t.relname, array_agg(a.attname ORDER BY k.position)
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE n.nspname = 'public'
+    GROUP BY i.indexrelid, t.relname;
+"""
+
+
+### Column usage analysis
+
+def alias_map(statement):
+    """Maps aliases (and table names) used in a statement to table names."""
+    aliases = {}
+    for match in TABLE_ALIASES.finditer(statement):
+        table = (match.group(2) or match.group(1)).lower()
+        aliases[table] = table
+        if match.group(3) and match.group(3).lower() not in SQL_WORDS:
+            aliases[match.group(3).lower()] = table
+    return aliases
+
+
+def clause_sections(statement):
+    """Splits a statement into (clause keyword, text) pairs, e.g. ("where", "a = 1 AND ...")."""
+    sections = []
+    matches = list(CLAUSES.finditer(statement))
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(statement)
+        sections.append((re.sub(r"\s+", " ", match.group(1).lower()), statement[match.end():end]))
+    return sections
+
+
+def column_usage(statement, schema):
+    """Returns {table: {"eq": [...], "range": [...], "order": [...]}} for one statement."""
+    statement = strip_literals(statement)
+    aliases = alias_map(statement)
+    tables = [table for table in set(aliases.values()) if table in schema]
+    columns_of = {table: {c["column_name"] for c in schema[table]["columns"]} for table in tables}
+
+    def resolve(qualifier, column):
+        column = column.lower()
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+            return table if table in columns_of and column in columns_of[table] else None
+        owners = [table for table in tables if column in columns_of[table]]
+        return owners[0] if len(owners) == 1 else None
+
+    usage = defaultdict(lambda: {"eq": [], "range": [], "order": []})
+    for clause, text in clause_sections(statement):
+        if clause in ("where", "on", "having"):
+            for qualifier, column, operator in PREDICATE.findall(text):
+                table = resolve(qualifier, column)
+                if table is None:
+                    continue
+                kind = "eq" if operator.lower() in ("=", "in", "is") else "range"
+                if column.lower() not in usage[table][kind]:
+                    usage[table][kind].append(column.lower())
+            # Right-hand side of join conditions such as `t.employee_id = e.employee_id`
+            for qualifier, column in JOIN_TARGET.findall(text):
+                table = resolve(qualifier, column)
+                if table is not None and column.lower() not in usage[table]["eq"]:
+                    usage[table]["eq"].append(column.lower())
+        elif clause == "order by":
+            for item in text.split(","):
+                match = re.match(r'\s*(?:(\w+)\.)?"?(\w+)"?', item)
+                table = resolve(*match.groups()) if match else None
+                if table is not None and match.group(2).lower() not in usage[table]["order"]:
+                    usage[table]["order"].append(match.group(2).lower())
+    return dict(usage)
+
+
+def candidate_indexes(workload, schema, existing):
+    """Builds candidate column lists per table with the statements that would use them."""
+    candidates = defaultdict(lambda: {"count": 0, "statements": set()})
+    for shape, item in workload.items():
+        for table, usage in column_usage(item["sample"], schema).items():
+            equality = usage["eq"]
+            trailing = (usage["range"] or usage["order"])[:1]
+            column_sets = [(column,) for column in equality + usage["range"] + usage["order"]]
+            if equality and (len(equality) > 1 or trailing):
+                # Equality columns first, then one range or sort column
+                column_sets.append(tuple(equality + [c for c in trailing if c not in equality]))
+            for columns in set(column_sets):
+                if is_covered(table, columns, existing):
+                    continue
+                candidates[(table, columns)]["count"] += item["count"]
+                candidates[(table, columns)]["statements"].add(shape)
+    return candidates
+
+
+def is_covered(table, columns, existing):
+    """True if an existing index of `table` starts with `columns`."""
+    return any(tuple(index[:len(columns)]) == tuple(columns) for index in existing.get(table, []))
+
+
+def load_existing_indexes(cur):
+    cur.execute(EXISTING_INDEXES_QUERY)
+    existing = defaultdict(list)
+    for table, columns in cur.fetchall():
+        existing[table].append(list(columns))
+    return existing
+
+
+def index_statement(table, columns):
+    name = f"idx_{table}_{'_'.join(columns)}"[:63]
+    return f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)});'
+
+
+### Benefit estimation
+
+def parameterize_literals(statement):
+    """Replaces each string literal with a $n parameter; returns (statement, number of parameters)."""
+    count = 0
+
+    def parameter(match):
+        nonlocal count
+        count += 1
+        return f"${count}"
+
+    return STRING_LITERAL.sub(parameter, statement), count
+
+
+def explain_cost(cur, statement):
+    """Estimated total cost of a workload statement, or None if it cannot be planned.
+
+    Logged statements have their string literals blanked, and '' is not a valid date, timestamp or
+    number. They are therefore prepared with a parameter in place of each literal (its type is
+    inferred from the context) and the generic plan is explained. A statement whose parameter
+    types cannot be inferred is explained as is.
+    """
+    text, params = parameterize_literals(statement)
+    attempts = [("PREPARE advisor_statement AS " + text,
+                 f"EXPLAIN (FORMAT JSON) EXECUTE advisor_statement ({', '.join(['NULL'] * params)})")] if params else []
+    attempts.append((None, "EXPLAIN (FORMAT JSON) " + statement))
+
+    for prepare_sql, explain_sql in attempts:
+        cur.execute("SAVEPOINT advisor_explain;")
+        prepared = False
+        try:
+            if prepare_sql:
+                cur.execute(prepare_sql)
+                prepared = True
+            cur.execute(explain_sql)
+            cost = cur.fetchone()[0][0]["Plan"]["Total Cost"]
+            cur.execute("RELEASE SAVEPOINT advisor_explain;")
+            return cost
+        except psycopg2.Error:
+            cur.execute("ROLLBACK TO SAVEPOINT advisor_explain;")
+        finally:
+            # Prepared statements outlive savepoints; a fresh one per call also keeps hypopg indexes visible
+            if prepared:
+                cur.execute("DEALLOCATE advisor_statement;")
+    return None
+
+
+def has_hypopg(cur):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'hypopg');")
+    return cur.fetchone()[0]
+
+
+def recommend_indexes(limit=10, workload_path=None):
+    """Returns a ranked list of index recommendations for the recorded workload.
+
+    Each item: {"table", "columns", "statement", "queries", "executions", "estimated_benefit",
+    "cost_before", "cost_after", "method", "unplanned_queries"}. `method` is "hypopg" when the benefit was estimated
+    with hypothetical indexes, "usage" when candidates are ranked by how often they are used.
+    """
+    workload = load_workload(workload_path)
+    if not workload:
+        return []
+    _, schema = get_database_schema()
+
+    recommendations = []
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                existing = load_existing_indexes(cur)
+                candidates = candidate_indexes(workload, schema, existing)
+                ranked = sorted(candidates.items(), key=lambda item: item[1]["count"], reverse=True)
+                ranked = ranked[:ADVISOR_MAX_CANDIDATES]
+                if has_hypopg(cur):
+                    # Plan prepared workload statements without looking at their (NULL) parameter values
+                    cur.execute("SET LOCAL plan_cache_mode = force_generic_plan;")
+                    recommendations = evaluate_with_hypopg(cur, ranked, workload)
+                else:
+                    logger.info("hypopg is not installed, ranking index candidates by usage only")
+                    recommendations = [
+                        recommendation(table, columns, info, workload, None, None, "usage")
+                        for (table, columns), info in ranked
+                    ]
+        finally:
+            conn.rollback()
+    return recommendations[:limit]
+
+
+def evaluate_with_hypopg(cur, ranked, workload):
+    """EXPLAINs the statements of each candidate with and without a hypothetical index."""
+    baseline = {}
+    recommendations = []
+    for (table, columns), info in ranked:
+        for shape in info["statements"]:
+            if shape not in baseline:
+                baseline[shape] = explain_cost(cur, workload[shape]["sample"])
+
+        cur.execute("SELECT * FROM hypopg_create_index(%s);", (f'CREATE INDEX ON "{table}" ({", ".join(columns)})',))
+        cost_before = cost_after = 0.0
+        unplanned = 0
+        for shape in info["statements"]:
+            before = baseline[shape]
+            after = explain_cost(cur, workload[shape]["sample"]) if before is not None else None
+            if before is None or after is None:
+                unplanned += 1
+                continue
+            # Weighted by how often the statement runs
+            cost_before += before * workload[shape]["count"]
+            cost_after += min(after, before) * workload[shape]["count"]
+        cur.execute("SELECT hypopg_reset();")
+
+        if cost_before and (cost_before - cost_after) / cost_before >= ADVISOR_MIN_BENEFIT:
+            recommendations.append(recommendation(table, columns, info, workload, cost_before, cost_after, "hypopg", unplanned))
+
+    failed = [shape for shape, cost in baseline.items() if cost is None]
+    if failed:
+        logger.warning(f"{len(failed)} of {len(baseline)} workload statements could not be planned and were left out "
+                       f"of the cost estimates, e.g.: {workload[failed[0]]['sample']}")
+    recommendations.sort(key=lambda item: item["estimated_benefit"], reverse=True)
+    return recommendations
+
+
+def recommendation(table, columns, info, workload, cost_before, cost_after, method, unplanned_queries=None):
+    return {
+        "table": table,
+        "columns": list(columns),
+        "statement": index_statement(table, columns),
+        "queries": len(info["statements"]),
+        "executions": info["count"],
+        "estimated_benefit": round(cost_before - cost_after, 2) if cost_before is not None else None,
+        "cost_before": round(cost_before, 2) if cost_before is not None else None,
+        "cost_after": round(cost_after, 2) if cost_after is not None else None,
+        "method": method,
+        "unplanned_queries": unplanned_queries,   # statements of the candidate left out of the hypopg estimate
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend indexes for the recorded chatbot workload.")
+    parser.add_argument("--limit", type=int, default=10, help="number of recommendations to show")
+    parser.add_argument("--workload", help="path of the workload log (default: the one in the data directory)")
+    parser.add_argument("--json", action="store_true", help="print the recommendations as JSON")
+    args = parser.parse_args()
+
+    recommendations = recommend_indexes(limit=args.limit, workload_path=args.workload)
+    if args.json:
+        print(json.dumps(recommendations, indent=2))
+        return
+    if not recommendations:
+        print("No index recommendations for the recorded workload.")
+        return
+    for rank, item in enumerate(recommendations, start=1):
+        benefit = f"benefit {item['estimated_benefit']:,}" if item["estimated_benefit"] is not None else "benefit n/a"
+        unplanned = f", {item['unplanned_queries']} not plannable" if item["unplanned_queries"] else ""
+        print(f"{rank}. {item['statement']}  -- {item['executions']} executions, {item['queries']} queries{unplanned}, {benefit} ({item['method']})")
+
+
+if __name__ == "__main__":
+    main()
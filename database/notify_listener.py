@@ -0,0 +1,115 @@
+import select
+import logging
+import threading
+
+import psycopg2
+
+from database.db_pool import get_db_config
+
+logger = logging.getLogger(__name__)
+
+
+LISTENER_POLL_TIMEOUT = 5       # seconds between checks for new channels and shutdown
+LISTENER_RETRY_DELAY = 10       # seconds to wait before reconnecting a dropped LISTEN connection
+
+
+class NotifyListener:
+    """Single dedicated LISTEN connection dispatching Postgres notifications to per-channel callbacks."""
+
+    def __init__(self):
+        self._handlers = {}             # channel -> [callback(payload)]
+        self._listen_hooks = {}         # channel -> [on_listen()]
+        self._listening = set()         # channels LISTENed on the current connection
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel, callback, on_listen=None):
+        """Calls `callback(payload)` for every notification on `channel` (starts the listener thread).
+
+        `on_listen()` is called whenever LISTEN on the channel starts, on the first connection and
+        after every reconnect: notifications sent while nothing listened are lost, so state kept
+        fresh by them must be dropped.
+        """
+        with self._lock:
+            callbacks = self._handlers.setdefault(channel, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+            hooks = self._listen_hooks.setdefault(channel, [])
+            if on_listen is not None and on_listen not in hooks:
+                hooks.append(on_listen)
+        self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            self._listening = set()
+            try:
+                # Read on every (re)connect: the settings may have changed after a failover
+                dsn_params, _ = get_db_config()
+                # LISTEN needs a dedicated autocommit connection, so it is kept out of the pool
+                conn = psycopg2.connect(**dsn_params)
+                conn.set_session(autocommit=True)
+
+                while not self._stop.is_set():
+                    self._listen_new_channels(conn)
+                    if select.select([conn], [], [], LISTENER_POLL_TIMEOUT) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload)
+            except Exception as e:
+                logger.warning(f"Notification listener error: {e}")
+                self._stop.wait(LISTENER_RETRY_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen_new_channels(self, conn):
+        with self._lock:
+            channels = set(self._handlers) - self._listening
+        for channel in channels:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {channel};")
+            self._listening.add(channel)
+            logger.info(f"Listening for notifications on channel '{channel}'")
+            with self._lock:
+                hooks = list(self._listen_hooks.get(channel, []))
+            for hook in hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    logger.warning(f"Listen hook for '{channel}' failed: {e}")
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._handlers.get(channel, []))
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.warning(f"Notification handler for '{channel}' failed: {e}")
+
+
+_listener = NotifyListener()
+
+
+def subscribe(channel, callback, on_listen=None):
+    """Registers a callback on the process-wide notification listener."""
+    _listener.subscribe(channel, callback, on_listen)
+
+
+def notify(cur, channel, payload=""):
+    """Queues a notification on the cursor's transaction (delivered when it commits)."""
+    cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
@@ -0,0 +1,138 @@
+import os
+import glob
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import subprocess
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+
+FIXTURE_DB_NAME = "bench_db"
+FIXTURE_DOCKER_IMAGE = "postgres:16"
+FIXTURE_START_TIMEOUT = 60      # seconds to wait for the server to accept connections
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "create_tab.sql")
+
+# Durability is irrelevant for a throwaway instance and only slows the loads down
+FIXTURE_SERVER_OPTIONS = ["-c", "fsync=off", "-c", "synchronous_commit=off", "-c", "full_page_writes=off"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def find_pg_bin():
+    """Directory holding initdb/pg_ctl: $PG_BIN, the PATH, or the usual Debian/Ubuntu location."""
+    if os.environ.get("PG_BIN"):
+        return os.environ["PG_BIN"]
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    candidates = sorted(glob.glob("/usr/lib/postgresql/*/bin/initdb"))
+    return os.path.dirname(candidates[-1]) if candidates else None
+
+
+class ThrowawayPostgres:
+    """Temporary PostgreSQL server for offline benchmarks.
+
+    Uses the local initdb/pg_ctl binaries when they are installed and a Docker container
+    otherwise. Everything is deleted on stop(). Use as a context manager:
+
+        with ThrowawayPostgres() as pg:
+            conn = psycopg2.connect(**pg.dsn_params)
+    """
+
+    def __init__(self, port=None, image=FIXTURE_DOCKER_IMAGE):
+        self.port = port or free_port()
+        self.image = image
+        self.dsn_params = None
+        self._data_dir = None
+        self._pg_bin = None
+        self._container = None
+
+    def start(self):
+        self._pg_bin = find_pg_bin()
+        if self._pg_bin:
+            self._start_local()
+        elif shutil.which("docker"):
+            self._start_docker()
+        else:
+            raise RuntimeError("Neither PostgreSQL binaries (initdb/pg_ctl, or $PG_BIN) nor docker were found")
+
+        self.dsn_params = {"dbname": "postgres", "user": "postgres", "host": "127.0.0.1", "port": self.port}
+        self._wait_until_ready()
+        conn = psycopg2.connect(**self.dsn_params)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {FIXTURE_DB_NAME};")
+        conn.close()
+        self.dsn_params["dbname"] = FIXTURE_DB_NAME
+        logger.info(f"Throwaway PostgreSQL ready on port {self.port}")
+        return self
+
+    def stop(self):
+        if self._container:
+            subprocess.run(["docker", "stop", self._container], capture_output=True)
+            self._container = None
+        if self._data_dir:
+            subprocess.run([os.path.join(self._pg_bin, "pg_ctl"), "-D", self._data_dir, "-m", "immediate", "stop"],
+                           capture_output=True)
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            self._data_dir = None
+
+    def create_schema(self, schema_file=SCHEMA_FILE):
+        """Creates the application tables (create_tab.sql)."""
+        with open(schema_file, "r", encoding="utf-8") as file:
+            schema_sql = file.read()
+        conn = psycopg2.connect(**self.dsn_params)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(schema_sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _start_local(self):
+        self._data_dir = tempfile.mkdtemp(prefix="crud_chatbot_pg_")
+        subprocess.run([os.path.join(self._pg_bin, "initdb"), "-D", self._data_dir, "-U", "postgres",
+                        "-A", "trust", "--no-sync"], check=True, capture_output=True)
+        options = " ".join([f"-p {self.port}", "-c listen_addresses=127.0.0.1",
+                            f"-c unix_socket_directories={self._data_dir}"] + [
+            f"{flag} {value}" for flag, value in zip(FIXTURE_SERVER_OPTIONS[::2], FIXTURE_SERVER_OPTIONS[1::2])
+        ])
+        subprocess.run([os.path.join(self._pg_bin, "pg_ctl"), "-D", self._data_dir, "-o", options,
+                        "-l", os.path.join(self._data_dir, "server.log"), "-w", "start"],
+                       check=True, capture_output=True)
+
+    def _start_docker(self):
+        result = subprocess.run(
+            ["docker", "run", "-d", "--rm", "-e", "POSTGRES_HOST_AUTH_METHOD=trust",
+             "-p", f"127.0.0.1:{self.port}:5432", self.image] + FIXTURE_SERVER_OPTIONS,
+            check=True, capture_output=True, text=True,
+        )
+        self._container = result.stdout.strip()
+
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + FIXTURE_START_TIMEOUT
+        while True:
+            try:
+                psycopg2.connect(connect_timeout=2, **self.dsn_params).close()
+                return
+            except psycopg2.OperationalError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise
+                time.sleep(0.5)
@@ -0,0 +1,185 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from database.notify_listener import subscribe, notify
+
+logger = logging.getLogger(__name__)
+
+
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_TTL = 300                 # seconds, backstop for writes made outside the app
+QUERY_CACHE_MAX_ROWS = 5000           # larger results are not cached
+TABLE_CHANGE_CHANNEL = "table_changed"   # writers notify other processes of the tables they changed
+
+# Statements whose result depends on more than the table contents are never cached
+NON_DETERMINISTIC = re.compile(r"\b(random|now|clock_timestamp|statement_timestamp|timeofday|nextval|gen_random_uuid|uuid_generate_v4)\s*\(|\bcurrent_(date|time|timestamp|user)\b", re.IGNORECASE)
+
+STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+READ_TABLES = re.compile(r'\b(?:from|join)\s+((?:"?[\w.]+"?(?:\s+(?:as\s+)?\w+)?\s*,\s*)*"?[\w.]+"?)', re.IGNORECASE)
+WRITE_TABLES = re.compile(r'\b(?:insert\s+into|update(?:\s+only)?|delete\s+from(?:\s+only)?|truncate(?:\s+table)?|merge\s+into)\s+"?([\w.]+)"?', re.IGNORECASE)
+DDL = re.compile(r"^\s*(create|alter|drop|rename|comment)\b", re.IGNORECASE)
+SQL_KEYWORDS = {"select", "lateral", "only", "unnest", "generate_series"}
+
+
+def normalize_sql(sql_query):
+    """Collapses whitespace and case outside string literals and drops the trailing semicolon."""
+    parts = STRING_LITERAL.split(sql_query.strip().rstrip(";"))
+    normalized = []
+    for index, part in enumerate(parts):
+        if index % 2:   # string literal, keep as is
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip()
+
+
+def strip_literals(sql_query):
+    return STRING_LITERAL.sub("''", sql_query)
+
+
+def bare_table_name(name):
+    return name.strip().strip('"').split(".")[-1].lower()
+
+
+def tables_read(sql_query):
+    """Returns the set of tables referenced in FROM/JOIN clauses of a statement."""
+    tables = set()
+    for match in READ_TABLES.finditer(strip_literals(sql_query)):
+        for item in match.group(1).split(","):
+            name = bare_table_name(item.split()[0])
+            if name and name not in SQL_KEYWORDS:
+                tables.add(name)
+    return tables
+
+
+def tables_written(sql_query):
+    """Returns the set of tables a write statement modifies, or None for DDL (which may touch anything)."""
+    statement = strip_literals(sql_query)
+    if DDL.match(statement):
+        return None
+    return {bare_table_name(name) for name in WRITE_TABLES.findall(statement)}
+
+
+class QueryCache:
+    """Size-bounded LRU of SELECT results with TTL and table-level invalidation."""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL, max_rows=QUERY_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()     # key -> (expires_at, tables, value)
+        self._table_versions = {}         # table -> number of writes seen (also used by other caches)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0, "expired": 0}
+
+    def make_key(self, sql_query, schema_hash, *variant):
+        """Cache key for a statement, or None if the statement must not be cached."""
+        if NON_DETERMINISTIC.search(strip_literals(sql_query)) or not tables_read(sql_query):
+            return None
+        return (normalize_sql(sql_query), schema_hash) + tuple(variant)
+
+    def get(self, key):
+        """Returns (hit, value)."""
+        if key is None:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def put(self, key, value, row_count):
+        if key is None or row_count > self.max_rows:
+            return
+        tables = tables_read(key[0])
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tables, value)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate_tables(self, tables):
+        """Evicts every entry reading any of `tables` (None evicts everything)."""
+        with self._lock:
+            if tables is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                for table in self._table_versions:
+                    self._table_versions[table] += 1
+            else:
+                stale = [key for key, (_, read, _) in self._entries.items() if read & tables]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+                for table in tables:
+                    self._table_versions[table] = self._table_versions.get(table, 0) + 1
+            self._stats["invalidations"] += removed
+        if removed:
+            logger.debug(f"Query cache: evicted {removed} entries after a write to {tables or 'the schema'}")
+
+    def table_version(self, table):
+        """Counter bumped on every write seen for a table, usable to key derived caches."""
+        with self._lock:
+            return self._table_versions.get(table, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_query_cache = QueryCache()
+
+
+def on_table_change(payload):
+    """Notification handler for writes made by other processes."""
+    _query_cache.invalidate_tables(set(payload.split(",")) if payload else None)
+
+
+def on_listen():
+    """Writes notified while the listener was disconnected were missed: nothing cached can be trusted."""
+    _query_cache.invalidate_tables(None)
+
+
+def get_query_cache():
+    """Returns the process-wide query cache (and subscribes it to write notifications)."""
+    subscribe(TABLE_CHANGE_CHANNEL, on_table_change, on_listen)
+    return _query_cache
+
+
+def record_write(cur, sql_query):
+    """Notifies other processes of the tables a write touches; returns them (None for DDL).
+
+    Must be called on the writing transaction before it commits: the notification is only
+    delivered on commit, so a rolled back write does not invalidate anything remotely.
+    """
+    tables = tables_written(sql_query)
+    if tables == set():
+        return tables
+    notify(cur, TABLE_CHANGE_CHANNEL, ",".join(sorted(tables)) if tables else "")
+    return tables
+
+
+def invalidate_after_commit(tables_list):
+    """Invalidates the local cache once the writes recorded with record_write have committed."""
+    cache = get_query_cache()
+    for tables in tables_list:
+        if tables is None or tables:
+            cache.invalidate_tables(tables)
@@ -0,0 +1,164 @@
+import logging
+
+import psycopg2
+import streamlit as st
+
+from database.db_utils import get_db_connection, is_read_query
+
+logger = logging.getLogger(__name__)
+
+
+# Default thresholds (can be overridden in a [query_guard] section of st.secrets)
+GUARD_CONFIRM_COST = 100000          # planner cost units above which a statement needs extra confirmation
+GUARD_MAX_COST = 10000000            # planner cost units above which a statement is rejected
+GUARD_CONFIRM_ROWS = 1000            # rows affected by a write above which it needs extra confirmation
+GUARD_MAX_ROWS = 100000              # rows affected by a write above which it is rejected
+GUARD_SEQ_SCAN_ROWS = 100000         # estimated rows of a sequential scan above which it needs extra confirmation
+GUARD_DRY_RUN_TIMEOUT = 5000         # milliseconds a write dry run may take
+
+DRY_RUN_PREFIXES = ("INSERT", "UPDATE", "DELETE", "MERGE")
+VERDICTS = ("ok", "confirm", "reject")
+
+
+def get_guard_config():
+    """Reads the guard thresholds from the optional [query_guard] section of st.secrets."""
+    settings = st.secrets["query_guard"] if "query_guard" in st.secrets else {}
+    return {
+        "confirm_cost": float(settings.get("confirm_cost", GUARD_CONFIRM_COST)),
+        "max_cost": float(settings.get("max_cost", GUARD_MAX_COST)),
+        "confirm_rows": int(settings.get("confirm_rows", GUARD_CONFIRM_ROWS)),
+        "max_rows": int(settings.get("max_rows", GUARD_MAX_ROWS)),
+        "seq_scan_rows": int(settings.get("seq_scan_rows", GUARD_SEQ_SCAN_ROWS)),
+        "dry_run_timeout": int(settings.get("dry_run_timeout", GUARD_DRY_RUN_TIMEOUT)),
+    }
+
+
+def find_seq_scans(plan, found=None):
+    """Returns [(relation, estimated rows)] for every sequential scan in an EXPLAIN JSON plan."""
+    found = [] if found is None else found
+    if plan.get("Node Type") == "Seq Scan":
+        found.append((plan.get("Relation Name"), plan.get("Plan Rows", 0)))
+    for child in plan.get("Plans", []):
+        find_seq_scans(child, found)
+    return found
+
+
+def explain(cur, query):
+    """Runs EXPLAIN (FORMAT JSON) and returns the top plan node."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query)
+    result = cur.fetchone()[0]
+    return result[0]["Plan"]
+
+
+def judge(estimate, config):
+    """Sets estimate["verdict"] and estimate["reasons"] from the configured thresholds."""
+    reasons, verdict = [], "ok"
+
+    def flag(level, reason):
+        nonlocal verdict
+        reasons.append(reason)
+        if VERDICTS.index(level) > VERDICTS.index(verdict):
+            verdict = level
+
+    cost = estimate.get("total_cost")
+    if cost is not None:
+        if cost > config["max_cost"]:
+            flag("reject", f"estimated cost {cost:,.0f} exceeds the limit of {config['max_cost']:,.0f}")
+        elif cost > config["confirm_cost"]:
+            flag("confirm", f"estimated cost {cost:,.0f} is above {config['confirm_cost']:,.0f}")
+
+    affected = estimate.get("affected_rows")
+    if affected is not None:
+        if affected > config["max_rows"]:
+            flag("reject", f"{affected:,} rows affected exceeds the limit of {config['max_rows']:,}")
+        elif affected > config["confirm_rows"]:
+            flag("confirm", f"{affected:,} rows affected is above {config['confirm_rows']:,}")
+
+    for relation, rows in estimate.get("seq_scans", []):
+        if rows > config["seq_scan_rows"]:
+            flag("confirm", f"sequential scan of {relation} (~{rows:,} rows)")
+
+    if estimate.get("timed_out"):
+        flag("confirm", f"the dry run took longer than {config['dry_run_timeout']} ms")
+    elif estimate.get("error"):
+        # The database could not plan (or dry-run) the statement: running it would fail the same way
+        flag("reject", f"the database rejected the statement: {estimate['error']}")
+
+    estimate["verdict"] = verdict
+    estimate["reasons"] = reasons
+    return estimate
+
+
+def estimate_queries(queries, config=None):
+    """Estimates the cost and impact of a batch without changing any data.
+
+    Reads are EXPLAINed. INSERT/UPDATE/DELETE statements are EXPLAINed and then dry-run, in
+    order, inside one transaction that is always rolled back, so each statement sees the effect
+    of the previous ones. Sequences advanced by a dry run are not rolled back.
+
+    Returns {"verdict", "reasons", "queries": [{"query", "method", "total_cost", "estimated_rows",
+    "affected_rows", "seq_scans", "verdict", "reasons"}]}.
+    """
+    config = config or get_guard_config()
+    estimates = []
+    read_only = all(is_read_query(query) for query in queries)
+
+    with get_db_connection(read_only=read_only) as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s;", (config["dry_run_timeout"],))
+                for index, query in enumerate(queries):
+                    estimates.append(estimate_statement(cur, index, query))
+        finally:
+            conn.rollback()
+
+    for estimate in estimates:
+        judge(estimate, config)
+    verdict = max((estimate["verdict"] for estimate in estimates), key=VERDICTS.index, default="ok")
+    reasons = [reason for estimate in estimates for reason in estimate["reasons"]]
+    return {"verdict": verdict, "reasons": reasons, "queries": estimates}
+
+
+def estimate_statement(cur, index, query):
+    estimate = {"query": query, "method": "explain", "total_cost": None, "estimated_rows": None,
+                "affected_rows": None, "seq_scans": []}
+    savepoint = f"guard_stmt_{index}"
+    cur.execute(f"SAVEPOINT {savepoint};")
+    try:
+        plan = explain(cur, query)
+        estimate["total_cost"] = plan.get("Total Cost")
+        estimate["estimated_rows"] = plan.get("Plan Rows")
+        estimate["seq_scans"] = find_seq_scans(plan)
+
+        if query.lstrip(" (\n\t").upper().startswith(DRY_RUN_PREFIXES):
+            cur.execute(query)
+            estimate["method"] = "dry_run"
+            estimate["affected_rows"] = cur.rowcount
+        cur.execute(f"RELEASE SAVEPOINT {savepoint};")
+    except psycopg2.Error as e:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint};")
+        estimate["error"] = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+        estimate["timed_out"] = isinstance(e, psycopg2.errors.QueryCanceled)
+        logger.debug(f"Could not estimate statement {index}: {estimate['error']}")
+    return estimate
+
+
+def describe_estimate(guard_report):
+    """One line per statement summarising its estimate, for confirmation messages."""
+    lines = []
+    for estimate in guard_report["queries"]:
+        if estimate.get("error"):
+            lines.append(f"⚠️ No estimate: {estimate['error']}")
+            continue
+        parts = []
+        if estimate["total_cost"] is not None:
+            parts.append(f"cost {estimate['total_cost']:,.0f}")
+        if estimate["affected_rows"] is not None:
+            parts.append(f"{estimate['affected_rows']:,} rows affected")
+        elif estimate["estimated_rows"] is not None:
+            parts.append(f"~{estimate['estimated_rows']:,} rows")
+        lines.append("📐 Estimated: " + ", ".join(parts))
+    if guard_report["reasons"]:
+        lines.append(("⛔ Rejected: " if guard_report["verdict"] == "reject" else "⚠️ Needs confirmation: ")
+                     + "; ".join(guard_report["reasons"]))
+    return "\n".join(lines)
@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass
+
+import psycopg2
+
+from database.db_pool import add_connection_close_hook
+from database.db_utils import get_db_connection, rows_to_records, query_cache_key
+from database.query_cache import get_query_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    """Named, parameterized statement; `sql` uses `$1`, `$2`, ... for values."""
+    name: str
+    sql: str
+    param_types: tuple = ()
+
+
+@dataclass(frozen=True)
+class RenderedTemplate:
+    """Template with its PREPARE/EXECUTE statements."""
+    statement_name: str
+    text: str
+    prepare_sql: str
+    execute_sql: str
+
+
+class TemplateRegistry:
+    """Runs registered templates as server-side prepared statements, one PREPARE per pooled connection."""
+
+    def __init__(self):
+        self._templates = {}
+        self._prepared = {}     # id(conn) -> (backend pid, set of prepared statement names)
+        self._lock = threading.Lock()
+        self._stats = {}        # template name -> {"count", "prepares", "cache_hits", "total", "max"}
+
+    def register(self, template):
+        if template.name in self._templates:
+            raise ValueError(f"Query template '{template.name}' is already registered")
+        self._templates[template.name] = template
+        return template
+
+    def names(self):
+        return list(self._templates)
+
+    def run(self, name, params=(), use_cache=True):
+        """Executes template `name` and returns its rows as a list of dicts."""
+        template = self._templates.get(name)
+        if template is None:
+            raise KeyError(f"Unknown query template '{name}'")
+        params = tuple(params)
+        if len(params) != len(template.param_types):
+            raise ValueError(f"Template '{name}' expects {len(template.param_types)} parameters, got {len(params)}")
+        statement = self._render(template)
+
+        start = time.monotonic()
+        cache_key = query_cache_key(statement.text, "template", params) if use_cache else None
+        hit, rows = get_query_cache().get(cache_key)
+        if hit:
+            self._record(name, time.monotonic() - start, prepared=False, cache_hit=True)
+            return rows
+
+        with get_db_connection(read_only=True) as conn:
+            prepared = self._ensure_prepared(conn, template, statement)
+            with conn.cursor() as cur:
+                try:
+                    cur.execute(statement.execute_sql, params)
+                except psycopg2.errors.InvalidSqlStatementName:
+                    # The session lost its prepared statements (e.g. DISCARD ALL); prepare again
+                    conn.rollback()
+                    self.forget(conn)
+                    prepared = self._ensure_prepared(conn, template, statement)
+                    cur.execute(statement.execute_sql, params)
+                rows = rows_to_records(cur)
+            conn.commit()
+
+        get_query_cache().put(cache_key, rows, len(rows))
+        self._record(name, time.monotonic() - start, prepared=prepared, cache_hit=False)
+        return rows
+
+    def stats(self):
+        """Returns per-template execution counters (seconds)."""
+        with self._lock:
+            return {
+                name: {
+                    "count": stats["count"],
+                    "prepares": stats["prepares"],
+                    "cache_hits": stats["cache_hits"],
+                    "avg_time": round(stats["total"] / stats["count"], 6) if stats["count"] else 0.0,
+                    "max_time": round(stats["max"], 6),
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def _render(self, template):
+        statement_name = f"tpl_{template.name}"
+        types = f" ({', '.join(template.param_types)})" if template.param_types else ""
+        args = f" ({', '.join(['%s'] * len(template.param_types))})" if template.param_types else ""
+        return RenderedTemplate(
+            statement_name=statement_name,
+            text=template.sql,
+            prepare_sql=f"PREPARE {statement_name}{types} AS {template.sql}",
+            execute_sql=f"EXECUTE {statement_name}{args}",
+        )
+
+    def _ensure_prepared(self, conn, template, statement):
+        backend_pid = conn.get_backend_pid()
+        with self._lock:
+            pid, names = self._prepared.get(id(conn), (None, ()))
+            if pid == backend_pid and statement.statement_name in names:
+                return False
+        with conn.cursor() as cur:
+            cur.execute(statement.prepare_sql)
+        with self._lock:
+            pid, names = self._prepared.get(id(conn), (None, set()))
+            if pid != backend_pid:
+                names = set()
+            names.add(statement.statement_name)
+            self._prepared[id(conn)] = (backend_pid, names)
+        logger.debug(f"Prepared template '{template.name}' as {statement.statement_name} on backend {backend_pid}")
+        return True
+
+    def forget(self, conn):
+        """Drops what was prepared on `conn` (called when the pool closes or discards it)."""
+        with self._lock:
+            self._prepared.pop(id(conn), None)
+
+    def _record(self, name, elapsed, prepared, cache_hit):
+        with self._lock:
+            stats = self._stats.setdefault(name, {"count": 0, "prepares": 0, "cache_hits": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["prepares"] += int(prepared)
+            stats["cache_hits"] += int(cache_hit)
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+
+
+_registry = TemplateRegistry()
+add_connection_close_hook(_registry.forget)
+
+
+def register_template(name, sql_text, param_types=()):
+    return _registry.register(QueryTemplate(name, sql_text, tuple(param_types)))
+
+
+def run_template(name, params=(), use_cache=True):
+    """Runs a registered template by name, e.g. run_template("viz_project_budgets")."""
+    return _registry.run(name, params, use_cache=use_cache)
+
+
+def get_template_stats():
+    return _registry.stats()
+
+
+### Templates used by the UI
+
+# Quick Viz charts
+register_template("viz_salary_distribution", """
+    SELECT
+        department,
+        CONCAT(FLOOR(salary / 1000) * 1000, ' - ', (FLOOR(salary / 1000) + 1) * 1000) AS salary_range,
+        COUNT(*) AS num_employees
+    FROM employees
+    GROUP BY department, salary_range
+    ORDER BY salary_range, department
+""")
+
+register_template("viz_employees_per_role", """
+    SELECT role, COUNT(*) AS num_employees
+    FROM employees
+    GROUP BY role
+    ORDER BY num_employees DESC
+""")
+
+register_template("viz_project_budgets", """
+    SELECT proj_name, budget
+    FROM projects
+    ORDER BY budget DESC
+""")
+
+register_template("viz_work_hours_by_employee", """
+    SELECT e.firstname || ' ' || e.lastname AS employee,
+        SUM(t.work_hours) AS total_hours
+    FROM tasks t
+    JOIN employees e ON t.employee_id = e.employee_id
+    GROUP BY employee
+    ORDER BY total_hours DESC
+""")
@@ -0,0 +1,137 @@
+import time
+import logging
+import threading
+
+from psycopg2 import errors as pg_errors
+from psycopg2 import sql
+
+from database.db_utils import get_db_connection
+from database.notify_listener import notify
+from database.query_cache import TABLE_CHANGE_CHANNEL, invalidate_after_commit
+from database.query_templates import register_template, run_template
+
+logger = logging.getLogger(__name__)
+
+
+QUICK_VIZ_REFRESH_INTERVAL = 300     # seconds between background refreshes of the views
+QUICK_VIZ_REFRESH_LOCK = "quick_viz_refresh"   # advisory lock so only one process refreshes at a time
+
+RECORD_REFRESH_SQL = """
+    INSERT INTO qv_refreshes (view_name, refreshed_at) VALUES (%s, now())
+    ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+"""
+
+# Live template (database/query_templates.py) -> (materialized view in quick_viz_views.sql, columns, order)
+QUICK_VIZ_VIEWS = {
+    "viz_salary_distribution": ("qv_salary_distribution", "department, salary_range, num_employees",
+                                "salary_range, department"),
+    "viz_employees_per_role": ("qv_employees_per_role", "role, num_employees", "num_employees DESC"),
+    "viz_project_budgets": ("qv_project_budgets", "proj_name, budget", "budget DESC"),
+    "viz_work_hours_by_employee": ("qv_work_hours_by_employee", "employee, total_hours", "total_hours DESC"),
+}
+
+for _view, _columns, _order in QUICK_VIZ_VIEWS.values():
+    register_template(_view, f"SELECT {_columns}, (SELECT refreshed_at FROM qv_refreshes WHERE view_name = '{_view}') AS refreshed_at "
+                             f"FROM {_view} ORDER BY {_order}")
+
+
+def get_viz_data(template, live=False):
+    """Returns (rows, refreshed_at) for a Quick Viz chart.
+
+    Rows come from the chart's materialized view unless `live` is set or the view is not
+    installed; `refreshed_at` is None for live results.
+    """
+    view = QUICK_VIZ_VIEWS[template][0]
+    if not live:
+        try:
+            rows = run_template(view)
+        except pg_errors.UndefinedTable:
+            logger.warning(f"Materialized view {view} is missing (see quick_viz_views.sql), querying live")
+        else:
+            refreshed_at = rows[0]["refreshed_at"] if rows else None
+            return [{key: value for key, value in row.items() if key != "refreshed_at"} for row in rows], refreshed_at
+    return run_template(template), None
+
+
+class QuickVizRefresher:
+    """Background thread refreshing the Quick Viz materialized views concurrently."""
+
+    def __init__(self, refresh_interval=QUICK_VIZ_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._missing = set()     # views reported as not installed
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Refreshes every view; returns the names of the views refreshed."""
+        refreshed = []
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(hashtext(%s));", (QUICK_VIZ_REFRESH_LOCK,))
+                if not cur.fetchone()[0]:
+                    logger.debug("Quick Viz views are being refreshed by another process")
+                    return refreshed
+            conn.commit()
+            try:
+                for view, _, _ in QUICK_VIZ_VIEWS.values():
+                    if self._refresh_view(conn, view):
+                        refreshed.append(view)
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(hashtext(%s));", (QUICK_VIZ_REFRESH_LOCK,))
+                conn.commit()
+        return refreshed
+
+    def start(self):
+        """Starts the background refresher thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quick-viz-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Quick Viz refresh failed, charts keep the previous data: {e}")
+            if self._stop.wait(self.refresh_interval):
+                return
+
+    def _refresh_view(self, conn, view):
+        start = time.monotonic()
+        try:
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("SAVEPOINT refresh_view;")
+                    cur.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {};").format(sql.Identifier(view)))
+                except pg_errors.ObjectNotInPrerequisiteState:
+                    # A view that was never populated cannot be refreshed concurrently
+                    cur.execute("ROLLBACK TO SAVEPOINT refresh_view;")
+                    cur.execute(sql.SQL("REFRESH MATERIALIZED VIEW {};").format(sql.Identifier(view)))
+                cur.execute(RECORD_REFRESH_SQL, (view,))
+                notify(cur, TABLE_CHANGE_CHANNEL, view)
+            conn.commit()
+        except pg_errors.UndefinedTable:
+            conn.rollback()
+            if view not in self._missing:
+                logger.warning(f"Materialized view {view} or qv_refreshes is missing, install quick_viz_views.sql")
+                self._missing.add(view)
+            return False
+
+        self._missing.discard(view)
+        invalidate_after_commit([{view}])
+        logger.debug(f"Refreshed {view} in {time.monotonic() - start:.3f}s")
+        return True
+
+
+_refresher = QuickVizRefresher()
+
+
+def start_quick_viz_refresher():
+    """Starts the process-wide refresher (no-op if it is already running)."""
+    _refresher.start()
@@ -0,0 +1,58 @@
+-- Materialized views backing the Quick Viz charts (refreshed in the background by database/quick_viz.py).
+-- Each view has a unique index so it can be refreshed with REFRESH MATERIALIZED VIEW CONCURRENTLY
+-- without blocking readers. When a view was last computed is kept in qv_refreshes rather than in a
+-- per-row column, so a concurrent refresh only rewrites the rows whose values changed.
+-- Re-running this script recreates the views.
+
+
+CREATE TABLE IF NOT EXISTS qv_refreshes (
+    view_name TEXT PRIMARY KEY,
+    refreshed_at TIMESTAMPTZ NOT NULL
+);
+
+
+DROP MATERIALIZED VIEW IF EXISTS qv_salary_distribution;
+CREATE MATERIALIZED VIEW qv_salary_distribution AS
+    SELECT
+        department,
+        CONCAT(FLOOR(salary / 1000) * 1000, ' - ', (FLOOR(salary / 1000) + 1) * 1000) AS salary_range,
+        COUNT(*) AS num_employees
+    FROM employees
+    GROUP BY department, salary_range;
+
+CREATE UNIQUE INDEX qv_salary_distribution_key ON qv_salary_distribution (department, salary_range);
+
+
+DROP MATERIALIZED VIEW IF EXISTS qv_employees_per_role;
+CREATE MATERIALIZED VIEW qv_employees_per_role AS
+    SELECT role, COUNT(*) AS num_employees
+    FROM employees
+    GROUP BY role;
+
+CREATE UNIQUE INDEX qv_employees_per_role_key ON qv_employees_per_role (role);
+
+
+DROP MATERIALIZED VIEW IF EXISTS qv_project_budgets;
+CREATE MATERIALIZED VIEW qv_project_budgets AS
+    SELECT proj_id, proj_name, budget
+    FROM projects;
+
+CREATE UNIQUE INDEX qv_project_budgets_key ON qv_project_budgets (proj_id);
+
+
+DROP MATERIALIZED VIEW IF EXISTS qv_work_hours_by_employee;
+CREATE MATERIALIZED VIEW qv_work_hours_by_employee AS
+    SELECT e.employee_id,
+        e.firstname || ' ' || e.lastname AS employee,
+        SUM(t.work_hours) AS total_hours
+    FROM tasks t
+    JOIN employees e ON t.employee_id = e.employee_id
+    GROUP BY e.employee_id, employee;
+
+CREATE UNIQUE INDEX qv_work_hours_by_employee_key ON qv_work_hours_by_employee (employee_id);
+
+
+INSERT INTO qv_refreshes (view_name, refreshed_at)
+VALUES ('qv_salary_distribution', now()), ('qv_employees_per_role', now()),
+       ('qv_project_budgets', now()), ('qv_work_hours_by_employee', now())
+ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
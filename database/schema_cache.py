@@ -0,0 +1,165 @@
+import time
+import json
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from database.db_pool import get_connection_manager
+from database.notify_listener import subscribe
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_CACHE_TTL = 300                 # seconds before the snapshot is reloaded even without a NOTIFY
+SCHEMA_CHANGE_CHANNEL = "schema_changed"   # channel used by the DDL event trigger in schema_events.sql
+
+# The app's own objects (Quick Viz views and their metadata, the team data change log) are not part
+# of the schema shown to users and to the LLM
+INTERNAL_TABLE_PATTERNS = ["qv\\_%", "employee\\_changes"]
+
+
+# One catalog round trip for columns, primary keys and foreign keys of every user table
+SCHEMA_QUERY = """
+    SELECT
+        current_database() AS db_name,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        format_type(a.atttypid, NULL) AS data_type,
+        COALESCE(pk.is_primary_key, FALSE) AS is_primary_key,
+        fk.ref_table,
+        fk.ref_column
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN LATERAL (
+        SELECT TRUE AS is_primary_key
+        FROM pg_constraint con
+        WHERE con.conrelid = c.oid AND con.contype = 'p' AND a.attnum = ANY(con.conkey)
+        LIMIT 1
+    ) pk ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT rc.relname AS ref_table, ra.attname AS ref_column
+        FROM pg_constraint con
+        JOIN pg_class rc ON rc.oid = con.confrelid
+        JOIN pg_attribute ra ON ra.attrelid = con.confrelid
+                            AND ra.attnum = con.confkey[array_position(con.conkey, a.attnum)]
+        WHERE con.conrelid = c.oid AND con.contype = 'f' AND a.attnum = ANY(con.conkey)
+        LIMIT 1
+    ) fk ON TRUE
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relname LIKE ANY(%s)
+    ORDER BY c.relname, a.attnum;
+"""
+
+
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    """Immutable view of the database schema at one point in time."""
+    db_name: str
+    schema: dict
+    schema_hash: str
+    version: int
+    loaded_at: float = field(default_factory=time.time)
+
+    def as_tuple(self):
+        """Returns the (db_name, schema) pair used by the rest of the app."""
+        return self.db_name, self.schema
+
+
+def build_schema(rows):
+    """Groups catalog rows into {table: {columns, primary_key, primary_key_columns, foreign_keys}}."""
+    schema = {}
+    for _, table, column, data_type, is_primary_key, ref_table, ref_column in rows:
+        details = schema.setdefault(
+            table, {"columns": [], "primary_key": None, "primary_key_columns": [], "foreign_keys": []}
+        )
+        details["columns"].append({"column_name": column, "data_type": data_type})
+        if is_primary_key:
+            details["primary_key_columns"].append(column)
+        if ref_table:
+            details["foreign_keys"].append(f"{column} -> {ref_table}.{ref_column}")
+
+    for details in schema.values():
+        if details["primary_key_columns"]:
+            details["primary_key"] = ", ".join(details["primary_key_columns"])
+    return schema
+
+
+def hash_schema(schema):
+    """Stable hash of the schema content, usable as a cache key."""
+    payload = json.dumps(schema, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+class SchemaCache:
+    """In-memory schema snapshot refreshed on TTL expiry or on a DDL NOTIFY."""
+
+    def __init__(self, ttl=SCHEMA_CACHE_TTL, table_schema="public", channel=SCHEMA_CHANGE_CHANNEL):
+        self.ttl = ttl
+        self.table_schema = table_schema
+        self.channel = channel
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, force_refresh=False):
+        """Returns the current snapshot, reloading it if it expired or was invalidated."""
+        snapshot = self._snapshot
+        if snapshot is not None and not force_refresh and time.monotonic() < self._expires_at:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._snapshot is not None and not force_refresh and time.monotonic() < self._expires_at:
+                return self._snapshot
+            self._snapshot = self._load()
+            self._expires_at = time.monotonic() + self.ttl
+            return self._snapshot
+
+    def invalidate(self):
+        """Marks the snapshot as stale so the next get() reloads it."""
+        self._expires_at = 0.0
+
+    def on_schema_change(self, payload):
+        """Notification handler: invalidates the snapshot when a DDL event trigger fires."""
+        logger.info(f"Schema change notified ({payload}), invalidating snapshot")
+        self.invalidate()
+
+    def _load(self):
+        with get_connection_manager().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(SCHEMA_QUERY, (self.table_schema, INTERNAL_TABLE_PATTERNS))
+                rows = cur.fetchall()
+                if not rows:
+                    cur.execute("SELECT current_database();")
+                    db_name = cur.fetchone()[0]
+                else:
+                    db_name = rows[0][0]
+
+        schema = build_schema(rows)
+        schema_hash = hash_schema(schema)
+        # Only bump the version when the content actually changed
+        if self._snapshot is None or self._snapshot.schema_hash != schema_hash:
+            self._version += 1
+            logger.info(f"Loaded schema snapshot v{self._version} ({len(schema)} tables, hash {schema_hash})")
+        return SchemaSnapshot(db_name, schema, schema_hash, self._version)
+
+
+_schema_cache = SchemaCache()
+
+
+def get_schema_snapshot(force_refresh=False):
+    """Returns the cached SchemaSnapshot (db_name, schema, schema_hash, version)."""
+    # A DDL notified while the listener was disconnected was missed: reload on (re)connect
+    subscribe(_schema_cache.channel, _schema_cache.on_schema_change, _schema_cache.invalidate)
+    return _schema_cache.get(force_refresh=force_refresh)
+
+
+def get_schema_hash():
+    """Returns the hash of the current schema snapshot."""
+    return get_schema_snapshot().schema_hash
+
+
+def invalidate_schema_cache():
+    _schema_cache.invalidate()
@@ -0,0 +1,22 @@
+-- DDL event trigger: notifies the app when the schema changes so the cached schema snapshot is refreshed
+-- (event triggers require superuser, run once per database)
+
+
+CREATE OR REPLACE FUNCTION notify_schema_change()
+RETURNS event_trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('schema_changed', tg_tag);
+END;
+$$;
+
+DROP EVENT TRIGGER IF EXISTS schema_change_ddl_end;
+CREATE EVENT TRIGGER schema_change_ddl_end
+    ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_change();
+
+DROP EVENT TRIGGER IF EXISTS schema_change_sql_drop;
+CREATE EVENT TRIGGER schema_change_sql_drop
+    ON sql_drop
+    EXECUTE FUNCTION notify_schema_change();
@@ -0,0 +1,287 @@
+"""Synthetic data generator for scale testing.
+
+    python -m database.synthetic_data --employees 100000 [--seed 42] [--reset]
+
+Generates employees, projects, skills, tasks and work_and_vacation rows with skewed
+distributions and valid foreign keys, and loads them with COPY in chunks.
+"""
+import io
+import time
+import logging
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+COPY_CHUNK_ROWS = 100000     # rows generated and sent per COPY
+
+# Rows per employee for the other tables (at 10M employees the tasks table holds ~40M rows)
+PROJECTS_PER_EMPLOYEE = 0.02
+SKILLS_PER_EMPLOYEE = 3
+TASKS_PER_EMPLOYEE = 4
+MONTHS_OF_HISTORY = 6        # work_and_vacation rows per employee
+
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000, "10m": 10000000}
+
+FIRSTNAMES = ["John", "Jane", "Alice", "Bob", "David", "Emily", "Michael", "Sarah", "Laura", "James",
+              "Maria", "Ahmed", "Fatma", "Wei", "Yuki", "Carlos", "Olga", "Priya", "Tom", "Nina"]
+LASTNAMES = ["Doe", "Smith", "Johnson", "Williams", "Brown", "Davis", "Wilson", "Martinez", "Garcia",
+             "Miller", "Lee", "Nguyen", "Khan", "Schmidt", "Rossi", "Dubois", "Kim", "Silva", "Novak", "Ali"]
+STREETS = ["W 3rd St", "Wilshire Blvd", "S Figueroa St", "Sunset Blvd", "Ocean Ave", "Hollywood Blvd", "Westwood Blvd"]
+
+# department -> (weight, [(role, weight, median salary)], [skills])
+DEPARTMENTS = {
+    "IT": (0.40, [("Software Engineer", 0.5, 62000), ("DevOps Engineer", 0.2, 65000), ("Data Analyst", 0.3, 55000)],
+           ["Python", "Java", "SQL", "Kubernetes", "Cloud Computing", "DevOps", "Network Security", "Data Analysis"]),
+    "Sales": (0.30, [("Sales Associate", 0.6, 45000), ("Account Manager", 0.3, 58000), ("Sales Manager", 0.1, 75000)],
+              ["Sales Strategy", "Negotiation", "Customer Relations", "Marketing", "Public Speaking"]),
+    "HR": (0.10, [("HR Specialist", 0.8, 55000), ("HR Manager", 0.2, 70000)],
+           ["HR Management", "Employee Relations", "Recruiting", "Public Speaking"]),
+    "Finance": (0.12, [("Accountant", 0.7, 57000), ("Financial Analyst", 0.3, 64000)],
+                ["Accounting", "Financial Modeling", "SQL", "Data Analysis"]),
+    "Marketing": (0.08, [("Marketing Specialist", 0.7, 52000), ("Marketing Manager", 0.3, 72000)],
+                  ["Marketing", "SEO", "Content Writing", "Public Speaking"]),
+}
+PROFICIENCY_LEVELS = ["Beginner", "Intermediate", "Advanced", "Expert"]
+TASK_VERBS = ["Implement", "Review", "Plan", "Analyze", "Migrate", "Document", "Test", "Deploy", "Negotiate", "Present"]
+TASK_OBJECTS = ["network infrastructure", "sales strategy", "cloud services", "HRMS system", "quarterly report",
+                "customer onboarding", "data pipeline", "marketing campaign", "security audit", "budget forecast"]
+
+TABLE_COLUMNS = {
+    "employees": ["employee_id", "firstname", "lastname", "email", "phone", "address", "department", "role",
+                  "salary", "hire_date"],
+    "projects": ["proj_id", "proj_name", "description", "manager", "start_date", "end_date", "budget", "nb_members"],
+    "skills": ["skill_id", "employee_id", "skill_name", "proficiency_level", "years_of_experience", "availability"],
+    "tasks": ["task_id", "employee_id", "proj_id", "description", "work_hours", "validation"],
+    "work_and_vacation": ["record_id", "month_year", "employee_id", "regular_hours", "overtime_hours",
+                          "remaining_vacation", "remaining_sick_leave", "availability"],
+}
+LOAD_ORDER = ["employees", "projects", "skills", "tasks", "work_and_vacation"]
+
+# The team builder filters on work_and_vacation.availability, which create_tab.sql does not define
+PREPARE_SCHEMA_SQL = "ALTER TABLE work_and_vacation ADD COLUMN IF NOT EXISTS availability BOOLEAN NOT NULL DEFAULT TRUE;"
+
+# Distinct UUID namespaces per table so ids can be derived from row numbers (keeps foreign keys cheap)
+UUID_PREFIX = {"employees": 1, "projects": 2, "skills": 3, "tasks": 4, "work_and_vacation": 5}
+
+
+def make_uuids(table, numbers):
+    prefix = UUID_PREFIX[table]
+    return [f"00000000-0000-4000-8{prefix:03x}-{int(n):012x}" for n in numbers]
+
+
+def zipf_choice(rng, size, population, exponent=1.1):
+    """Picks `size` indexes in [0, population) with a power-law skew (index 0 most popular)."""
+    weights = 1.0 / np.arange(1, population + 1) ** exponent
+    return rng.choice(population, size=size, p=weights / weights.sum())
+
+
+class SyntheticDataGenerator:
+    """Generates the test schema tables in chunks; every table agrees on the department of employee i."""
+
+    def __init__(self, employees, seed=42):
+        self.employees = int(employees)
+        self.projects = max(1, int(self.employees * PROJECTS_PER_EMPLOYEE))
+        self.seed = seed
+        self.department_names = list(DEPARTMENTS)
+        weights = np.array([DEPARTMENTS[name][0] for name in self.department_names])
+
+        # Per-employee attributes shared by several tables, derived from the employee number
+        rng = np.random.default_rng([seed, 0])
+        self._lookup_size = min(self.employees, 1000003)
+        self._departments = rng.choice(len(weights), size=self._lookup_size, p=weights / weights.sum())
+        self._skill_bases = zipf_choice(rng, self._lookup_size, max(len(d[2]) for d in DEPARTMENTS.values()))
+
+    def row_counts(self):
+        return {
+            "employees": self.employees,
+            "projects": self.projects,
+            "skills": self.employees * SKILLS_PER_EMPLOYEE,
+            "tasks": self.employees * TASKS_PER_EMPLOYEE,
+            "work_and_vacation": self.employees * MONTHS_OF_HISTORY,
+        }
+
+    def chunks(self, table, chunk_rows=COPY_CHUNK_ROWS):
+        """Yields DataFrames with the columns of TABLE_COLUMNS[table]."""
+        total = self.row_counts()[table]
+        build = getattr(self, f"_{table}")
+        for start in range(0, total, chunk_rows):
+            rows = np.arange(start, min(start + chunk_rows, total))
+            # Seeded per table and chunk, so a given seed and chunk size always produce the same data
+            rng = np.random.default_rng([self.seed, UUID_PREFIX[table], start])
+            yield pd.DataFrame(build(rng, rows), columns=TABLE_COLUMNS[table])
+
+    def _departments_of(self, employee_numbers):
+        return self._departments[np.asarray(employee_numbers) % self._lookup_size]
+
+    def _employees(self, rng, rows):
+        size = len(rows)
+        departments = self._departments_of(rows)
+        firstnames = rng.choice(FIRSTNAMES, size)
+        lastnames = rng.choice(LASTNAMES, size)
+        roles = np.empty(size, dtype=object)
+        medians = np.empty(size)
+        for index, name in enumerate(self.department_names):
+            mask = departments == index
+            options = DEPARTMENTS[name][1]
+            weights = np.array([weight for _, weight, _ in options])
+            picks = rng.choice(len(options), size=mask.sum(), p=weights / weights.sum())
+            roles[mask] = np.array([role for role, _, _ in options], dtype=object)[picks]
+            medians[mask] = np.array([median for _, _, median in options])[picks]
+        salaries = np.round(medians * rng.lognormal(0, 0.25, size), -2)
+        hire_dates = pd.Timestamp("2005-01-01") + pd.to_timedelta(rng.integers(0, 7300, size), unit="D")
+        return {
+            "employee_id": make_uuids("employees", rows),
+            "firstname": firstnames,
+            "lastname": lastnames,
+            "email": [f"{f.lower()}.{l.lower()}.{n}@piterion.com" for f, l, n in zip(firstnames, lastnames, rows)],
+            "phone": [f"{a:03d}-{b:03d}-{c:04d}" for a, b, c in zip(rng.integers(200, 999, size),
+                                                                   rng.integers(100, 999, size),
+                                                                   rng.integers(0, 9999, size))],
+            # ~5% of addresses are missing
+            "address": [None if missing else f"{number} {street}, Los Angeles, CA"
+                        for missing, number, street in zip(rng.random(size) < 0.05, rng.integers(1, 9999, size),
+                                                           rng.choice(STREETS, size))],
+            "department": [self.department_names[d] for d in departments],
+            "role": roles,
+            "salary": salaries,
+            "hire_date": hire_dates.date,
+        }
+
+    def _projects(self, rng, rows):
+        size = len(rows)
+        start_dates = pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 2500, size), unit="D")
+        durations = pd.to_timedelta(rng.integers(30, 720, size), unit="D")
+        return {
+            "proj_id": make_uuids("projects", rows),
+            "proj_name": [f"Project {n + 1}" for n in rows],
+            "description": [f"{rng.choice(TASK_VERBS)} {rng.choice(TASK_OBJECTS)}" for _ in rows],
+            "manager": make_uuids("employees", rng.integers(0, self.employees, size)),
+            "start_date": start_dates.date,
+            # ~20% of projects are still open
+            "end_date": [None if open_ended else end.date()
+                         for open_ended, end in zip(rng.random(size) < 0.2, start_dates + durations)],
+            # Budgets are heavy-tailed: a few very large projects
+            "budget": np.round(rng.pareto(1.5, size) * 20000 + 10000, -2),
+            "nb_members": rng.integers(2, 30, size),
+        }
+
+    def _skills(self, rng, rows):
+        size = len(rows)
+        employee_numbers = rows // SKILLS_PER_EMPLOYEE
+        departments = self._departments_of(employee_numbers)
+        # Consecutive skills from a per-employee base: distinct per employee, first skills of a department most common
+        bases = self._skill_bases[employee_numbers % self._lookup_size] + rows % SKILLS_PER_EMPLOYEE
+        skill_names = np.empty(size, dtype=object)
+        for index, name in enumerate(self.department_names):
+            mask = departments == index
+            options = np.array(DEPARTMENTS[name][2], dtype=object)
+            skill_names[mask] = options[bases[mask] % len(options)]
+        return {
+            "skill_id": make_uuids("skills", rows),
+            "employee_id": make_uuids("employees", employee_numbers),
+            "skill_name": skill_names,
+            "proficiency_level": rng.choice(PROFICIENCY_LEVELS, size, p=[0.2, 0.4, 0.3, 0.1]),
+            "years_of_experience": np.minimum(rng.geometric(0.25, size) - 1, 30),
+            "availability": rng.random(size) < 0.85,
+        }
+
+    def _tasks(self, rng, rows):
+        size = len(rows)
+        # A few busy employees and popular projects get most of the tasks
+        employee_numbers = np.minimum((rng.power(0.5, size) * self.employees).astype(int), self.employees - 1)
+        work_hours = pd.array(np.round(rng.gamma(2.0, 40.0, size)).astype(int), dtype="Int64")
+        work_hours[rng.random(size) < 0.03] = pd.NA    # ~3% of tasks have no hours booked yet
+        return {
+            "task_id": make_uuids("tasks", rows),
+            "employee_id": make_uuids("employees", employee_numbers),
+            "proj_id": make_uuids("projects", zipf_choice(rng, size, self.projects)),
+            "description": [f"{verb} {obj}" for verb, obj in zip(rng.choice(TASK_VERBS, size),
+                                                                  rng.choice(TASK_OBJECTS, size))],
+            "work_hours": work_hours,
+            "validation": rng.random(size) < 0.6,
+        }
+
+    def _work_and_vacation(self, rng, rows):
+        size = len(rows)
+        employee_numbers = rows // MONTHS_OF_HISTORY
+        month_offsets = rows % MONTHS_OF_HISTORY
+        today = datetime.date.today().replace(day=1)
+        months = [(today.year * 12 + today.month - 1 - offset) for offset in range(MONTHS_OF_HISTORY)]
+        return {
+            "record_id": make_uuids("work_and_vacation", rows),
+            "month_year": [f"{months[o] // 12}-{months[o] % 12 + 1:02d}" for o in month_offsets],
+            "employee_id": make_uuids("employees", employee_numbers),
+            "regular_hours": np.full(size, 240),
+            "overtime_hours": rng.poisson(6, size),
+            "remaining_vacation": rng.integers(0, 30, size),
+            "remaining_sick_leave": rng.integers(0, 10, size),
+            "availability": rng.random(size) < 0.8,
+        }
+
+
+def copy_dataframe(cur, table, df):
+    """Streams a DataFrame into `table` with COPY ... FROM STDIN (CSV)."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+    )
+
+
+def load_synthetic_data(conn, employees, seed=42, reset=False, chunk_rows=COPY_CHUNK_ROWS):
+    """Generates and loads every table on `conn` (one transaction per table); returns per-table timings."""
+    generator = SyntheticDataGenerator(employees, seed=seed)
+    report = {}
+    with conn.cursor() as cur:
+        cur.execute(PREPARE_SCHEMA_SQL)
+        if reset:
+            cur.execute(f"TRUNCATE {', '.join(reversed(LOAD_ORDER))} CASCADE;")
+    conn.commit()
+
+    for table in LOAD_ORDER:
+        start = time.monotonic()
+        rows = 0
+        with conn.cursor() as cur:
+            for chunk in generator.chunks(table, chunk_rows):
+                copy_dataframe(cur, table, chunk)
+                rows += len(chunk)
+            cur.execute(f"ANALYZE {table};")
+        conn.commit()
+        report[table] = {"rows": rows, "seconds": round(time.monotonic() - start, 3)}
+        logger.info(f"Loaded {rows} rows into {table} in {report[table]['seconds']}s")
+    return report
+
+
+def parse_scale(value):
+    """Accepts a row count or one of the named scales (1k, 10k, 100k, 1m, 10m)."""
+    return SCALES[value.lower()] if value.lower() in SCALES else int(value)
+
+
+def main():
+    import psycopg2
+    from database.db_pool import get_db_config
+
+    parser = argparse.ArgumentParser(description="Load synthetic data into the configured database.")
+    parser.add_argument("--employees", type=parse_scale, default=1000, help="employees to generate (1k to 10m)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="truncate the tables first")
+    parser.add_argument("--dsn", help="connection string (defaults to the [postgresql] secrets)")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn) if args.dsn else psycopg2.connect(**get_db_config()[0])
+    try:
+        for table, stats in load_synthetic_data(conn, args.employees, seed=args.seed, reset=args.reset).items():
+            print(f"{table}: {stats['rows']} rows in {stats['seconds']}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+
+from psycopg2 import sql
+
+from database.db_utils import get_db_connection, get_database_schema, rows_to_records
+from database.schema_cache import get_schema_hash
+from database.query_cache import get_query_cache, QUERY_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+STATS_PERCENTILES = (0.25, 0.5, 0.75)
+
+# Label shown next to the row holding the min/max of a field: (expression, join, tables it reads)
+STATS_LABELS = {
+    "projects": ("t.proj_name", "", ("projects",)),
+    "employees": ("CONCAT(t.firstname, ' ', t.lastname)", "", ("employees",)),
+    "tasks": ("CONCAT(e.firstname, ' ', e.lastname)", "LEFT JOIN employees e ON e.employee_id = t.employee_id",
+              ("tasks", "employees")),
+    "work_and_vacation": ("CONCAT(e.firstname, ' ', e.lastname)",
+                          "LEFT JOIN employees e ON e.employee_id = t.employee_id", ("work_and_vacation", "employees")),
+}
+
+
+def build_stats_query(table_name, fields):
+    """One aggregate pass over `table_name` computing the statistics of every field in `fields`."""
+    label, join, _ = STATS_LABELS.get(table_name, ("NULL", "", (table_name,)))
+    label = sql.SQL(label)
+    percentiles = sql.SQL("ARRAY[{}]").format(sql.SQL(", ").join(sql.Literal(p) for p in STATS_PERCENTILES))
+
+    aggregates = [sql.SQL("COUNT(*) AS row_count")]
+    for index, field in enumerate(fields):
+        column = sql.SQL("t.{}").format(sql.Identifier(field))
+        alias = f"c{index}_"
+        aggregates.extend(sql.SQL(part).format(column=column, label=label, percentiles=percentiles,
+                                               alias=sql.Identifier(alias + name))
+                          for name, part in (
+            ("min", "MIN({column}) AS {alias}"),
+            ("max", "MAX({column}) AS {alias}"),
+            ("mean", "AVG({column})::float8 AS {alias}"),
+            ("stddev", "STDDEV_SAMP({column})::float8 AS {alias}"),
+            ("nulls", "COUNT(*) - COUNT({column}) AS {alias}"),
+            ("percentiles", "PERCENTILE_CONT({percentiles}) WITHIN GROUP (ORDER BY {column}) AS {alias}"),
+            ("min_label", "(ARRAY_AGG({label} ORDER BY {column}) FILTER (WHERE {column} IS NOT NULL))[1] AS {alias}"),
+            ("max_label", "(ARRAY_AGG({label} ORDER BY {column} DESC) FILTER (WHERE {column} IS NOT NULL))[1] AS {alias}"),
+        ))
+
+    return sql.SQL("SELECT {} FROM {} t {}").format(
+        sql.SQL(",\n       ").join(aggregates), sql.Identifier(table_name), sql.SQL(join)
+    )
+
+
+def parse_stats_row(row, fields):
+    """Splits the single aggregate row into {field: {min, max, mean, ...}}."""
+    statistics = {}
+    for index, field in enumerate(fields):
+        alias = f"c{index}_"
+        percentiles = row[alias + "percentiles"] or [None] * len(STATS_PERCENTILES)
+        statistics[field] = {
+            "count": row["row_count"] - row[alias + "nulls"],
+            "null_count": row[alias + "nulls"],
+            "min": row[alias + "min"],
+            "min_label": row[alias + "min_label"],
+            "max": row[alias + "max"],
+            "max_label": row[alias + "max_label"],
+            "mean": row[alias + "mean"],
+            "stddev": row[alias + "stddev"],
+            **{f"p{round(p * 100)}": value for p, value in zip(STATS_PERCENTILES, percentiles)},
+        }
+    return statistics
+
+
+class TableStatsCache:
+    """Statistics per (table, fields), kept until a write to one of the tables they read is seen."""
+
+    def __init__(self, ttl=QUERY_CACHE_TTL):
+        self.ttl = ttl      # backstop for writes made outside the app
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name, fields):
+        _, schema = get_database_schema()
+        if table_name not in schema:
+            raise ValueError(f"Unknown table: {table_name}")
+        columns = {column_info["column_name"] for column_info in schema[table_name]["columns"]}
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for {table_name}: {', '.join(unknown)}")
+        fields = tuple(fields)
+        if not fields:
+            return {}
+
+        _, _, tables = STATS_LABELS.get(table_name, ("NULL", "", (table_name,)))
+        versions = tuple(get_query_cache().table_version(table) for table in tables)
+        key = (table_name, fields)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, schema_hash, cached_versions, statistics = entry
+            if cached_versions == versions and schema_hash == get_schema_hash() and expires_at > time.monotonic():
+                return statistics
+
+        start = time.monotonic()
+        with get_db_connection(read_only=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(build_stats_query(table_name, fields))
+                row = rows_to_records(cur)[0]
+        statistics = parse_stats_row(row, fields)
+        logger.debug(f"Computed statistics of {len(fields)} field(s) of {table_name} in {time.monotonic() - start:.3f}s")
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, get_schema_hash(), versions, statistics)
+        return statistics
+
+
+_stats_cache = TableStatsCache()
+
+
+def get_table_statistics(table_name, fields):
+    """Returns {field: {count, null_count, min, min_label, max, max_label, mean, stddev, p25, p50, p75}}."""
+    return _stats_cache.get(table_name, fields)
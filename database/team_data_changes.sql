@@ -0,0 +1,50 @@
+-- Change log for the team builder snapshot: every change to an employee, their skills, tasks
+-- or availability records the employee_id so only that employee is re-fetched and re-encoded.
+-- Old entries can be pruned safely, e.g.  DELETE FROM employee_changes WHERE changed_at < now() - interval '1 day';
+
+
+CREATE TABLE IF NOT EXISTS employee_changes (
+    change_id BIGSERIAL PRIMARY KEY,
+    employee_id UUID NOT NULL,
+    source_table TEXT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION log_employee_change()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO employee_changes (employee_id, source_table) VALUES (OLD.employee_id, TG_TABLE_NAME);
+        RETURN OLD;
+    END IF;
+
+    INSERT INTO employee_changes (employee_id, source_table) VALUES (NEW.employee_id, TG_TABLE_NAME);
+    -- An UPDATE that moves a row to another employee changes both of them
+    IF TG_OP = 'UPDATE' AND OLD.employee_id IS DISTINCT FROM NEW.employee_id THEN
+        INSERT INTO employee_changes (employee_id, source_table) VALUES (OLD.employee_id, TG_TABLE_NAME);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS employees_change_log ON employees;
+CREATE TRIGGER employees_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON employees
+    FOR EACH ROW EXECUTE FUNCTION log_employee_change();
+
+DROP TRIGGER IF EXISTS skills_change_log ON skills;
+CREATE TRIGGER skills_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON skills
+    FOR EACH ROW EXECUTE FUNCTION log_employee_change();
+
+DROP TRIGGER IF EXISTS tasks_change_log ON tasks;
+CREATE TRIGGER tasks_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION log_employee_change();
+
+DROP TRIGGER IF EXISTS work_and_vacation_change_log ON work_and_vacation;
+CREATE TRIGGER work_and_vacation_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON work_and_vacation
+    FOR EACH ROW EXECUTE FUNCTION log_employee_change();
@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+
+import pandas as pd
+from psycopg2 import errors as pg_errors
+
+from database.db_utils import (
+    get_db_connection, rows_to_records, encode_employees, convert_data_for_llm_legacy,
+    BUILD_TEAM_QUERY, BUILD_TEAM_QUERY_FOR_EMPLOYEES, BUILD_TEAM_COLUMNS, BUILD_TEAM_HEADER,
+)
+
+logger = logging.getLogger(__name__)
+
+
+TEAM_DATA_REFRESH_INTERVAL = 60   # seconds between background refreshes
+FULL_RELOAD_INTERVAL = 3600       # seconds between full reloads (also used when there is no change log)
+CHANGE_ID_OVERLAP = 1000          # change ids re-read below the watermark (see TeamDataStore)
+
+WATERMARK_QUERY = "SELECT COALESCE(MAX(change_id), 0) FROM employee_changes;"
+CHANGES_QUERY = """
+    SELECT change_id, employee_id::text
+    FROM employee_changes
+    WHERE change_id > %s;
+"""
+
+
+@dataclass(frozen=True)
+class TeamDataSnapshot:
+    """Immutable, ready-to-prompt view of the available employees."""
+    text: str
+    stats: dict
+    watermark: int = None
+    refreshed_at: float = field(default_factory=time.time)
+
+
+class TeamDataStore:
+    """Keeps the team builder DATA up to date by re-encoding only employees that changed.
+
+    Changes are read from the trigger-maintained `employee_changes` log (team_data_changes.sql).
+    Change ids are drawn when a row is inserted, not when its transaction commits, so a change
+    can become visible after a higher id was already read: every refresh re-reads the last
+    `change_id_overlap` ids below the watermark and skips the ones it has already applied.
+    Without the log the store falls back to periodic full reloads. A new snapshot is built on the
+    side and swapped in with a single reference assignment, so readers never see a partial update.
+    """
+
+    def __init__(self, token_counter=None, refresh_interval=TEAM_DATA_REFRESH_INTERVAL,
+                 full_reload_interval=FULL_RELOAD_INTERVAL, change_id_overlap=CHANGE_ID_OVERLAP):
+        self.token_counter = token_counter
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.change_id_overlap = change_id_overlap
+        self._lines = {}         # employee_id -> (sort key, encoded line)
+        self._applied = set()    # change ids within the overlap window already reflected in _lines
+        self._snapshot = None
+        self._has_change_log = True
+        self._last_full_reload = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """Returns the current snapshot, loading it on first use."""
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self, full=False):
+        """Applies pending changes (or reloads everything) and swaps in a new snapshot."""
+        with self._refresh_lock:
+            due = time.monotonic() - self._last_full_reload > self.full_reload_interval
+            if full or self._snapshot is None or due:
+                self._full_reload()
+            elif self._has_change_log:
+                self._incremental_refresh()
+        return self._snapshot
+
+    def start(self):
+        """Starts the background refresher thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="team-data-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Team data refresh failed, keeping the previous snapshot: {e}")
+
+    def _full_reload(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                # Same snapshot for the watermark and the data, so no change can fall in between
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                watermark = self._read_watermark(cur)
+                applied = set()
+                if watermark is not None:
+                    cur.execute(CHANGES_QUERY, (watermark - self.change_id_overlap,))
+                    applied = {change_id for change_id, _ in cur.fetchall()}
+                cur.execute(BUILD_TEAM_QUERY)
+                df = pd.DataFrame(rows_to_records(cur), columns=BUILD_TEAM_COLUMNS)
+
+        self._lines = self._encode(df)
+        self._applied = applied
+        stats = {"employees": len(df), "refresh": "full", "changed_employees": len(df)}
+        if self.token_counter is not None:
+            stats["tokens_before"] = self.token_counter(convert_data_for_llm_legacy(df))
+        self._publish(stats, watermark)
+        self._last_full_reload = time.monotonic()
+
+    def _incremental_refresh(self):
+        previous = self._snapshot
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                cur.execute(CHANGES_QUERY, (previous.watermark - self.change_id_overlap,))
+                changes = [(change_id, employee_id) for change_id, employee_id in cur.fetchall()
+                           if change_id not in self._applied]
+                if not changes:
+                    return
+                changed_ids = sorted({employee_id for _, employee_id in changes})
+                watermark = max(previous.watermark, max(change_id for change_id, _ in changes))
+                cur.execute(BUILD_TEAM_QUERY_FOR_EMPLOYEES, (changed_ids,))
+                df = pd.DataFrame(rows_to_records(cur), columns=BUILD_TEAM_COLUMNS)
+
+        # Copy, patch and swap: the published snapshot is never mutated in place
+        lines = dict(self._lines)
+        for employee_id in changed_ids:
+            lines.pop(employee_id, None)   # deleted or no longer available employees drop out
+        lines.update(self._encode(df))
+        self._lines = lines
+        low = watermark - self.change_id_overlap
+        self._applied = {change_id for change_id in self._applied if change_id > low}
+        self._applied.update(change_id for change_id, _ in changes if change_id > low)
+
+        stats = {
+            "employees": len(lines),
+            "refresh": "incremental",
+            "changed_employees": len(changed_ids),
+            "tokens_before": previous.stats.get("tokens_before"),
+        }
+        self._publish(stats, watermark)
+
+    def _read_watermark(self, cur):
+        try:
+            cur.execute("SAVEPOINT watermark;")
+            cur.execute(WATERMARK_QUERY)
+            self._has_change_log = True
+            return cur.fetchone()[0]
+        except pg_errors.UndefinedTable:
+            cur.execute("ROLLBACK TO SAVEPOINT watermark;")
+            if self._has_change_log:
+                logger.warning("No employee_changes table, team data falls back to periodic full reloads")
+            self._has_change_log = False
+            return None
+
+    def _encode(self, df):
+        if df.empty:
+            return {}
+        lines = encode_employees(df)
+        sort_keys = zip(df["lastname"].fillna(""), df["firstname"].fillna(""), df["employee_id"].astype(str))
+        sort_keys = {key[2]: key for key in sort_keys}
+        return {str(employee_id): (sort_keys[str(employee_id)], line) for employee_id, line in lines.items()}
+
+    def _publish(self, stats, watermark):
+        ordered = [line for _, line in sorted(self._lines.values())]
+        text = BUILD_TEAM_HEADER + "\n" + "\n".join(ordered) + "\n"
+        if self.token_counter is not None:
+            stats["tokens_after"] = self.token_counter(text)
+        self._snapshot = TeamDataSnapshot(text, stats, watermark)
+        logger.info(f"Team data snapshot refreshed ({stats['refresh']}, {stats['changed_employees']} employees re-encoded)")
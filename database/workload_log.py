@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+from database.db_config import get_data_path
+from database.query_cache import normalize_sql, strip_literals
+
+logger = logging.getLogger(__name__)
+
+
+WORKLOAD_LOG_FILE = "query_workload.jsonl"     # in the data directory
+WORKLOAD_LOG_MAX_BYTES = 5 * 1024 * 1024       # the log is rotated to <file>.1 above this size
+WORKLOAD_MAX_STATEMENTS = 5000                 # most recent statements analysed by the index advisor
+
+_log_lock = threading.Lock()
+
+
+def workload_log_path():
+    return get_data_path(WORKLOAD_LOG_FILE)
+
+
+def record_statement(sql_query, source):
+    """Appends a statement to the workload log (never raises: recording must not break a query).
+
+    String literals are blanked and the statement normalized before writing: the advisor only
+    needs the shape, and values from user questions (names, emails) must not end up on disk.
+    """
+    if not sql_query or not sql_query.strip():
+        return
+    entry = {"sql": normalize_sql(strip_literals(sql_query)), "source": source, "ts": time.time()}
+    try:
+        path = workload_log_path()
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) > WORKLOAD_LOG_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        logger.debug(f"Could not record statement in the workload log: {e}")
+
+
+def tail_lines(path, max_lines):
+    """Last `max_lines` lines of the log and its rotated predecessor, read without loading them all."""
+    lines = deque(maxlen=max_lines)
+    for part in (path + ".1", path):
+        try:
+            with open(part, "r", encoding="utf-8") as file:
+                lines.extend(file)
+        except FileNotFoundError:
+            continue
+    return list(lines)
+
+
+def load_workload(path=None, max_statements=WORKLOAD_MAX_STATEMENTS):
+    """Groups the logged statements by shape: {normalized sql: {"count", "sample", "sources"}}."""
+    lines = tail_lines(path or workload_log_path(), max_statements)
+
+    workload = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        for statement in (q.strip() for q in entry["sql"].split(";")):
+            if not statement:
+                continue
+            shape = normalize_sql(strip_literals(statement))
+            item = workload.setdefault(shape, {"count": 0, "sample": statement, "sources": Counter()})
+            item["sources"][entry.get("source", "unknown")] += 1
+
+    for item in workload.values():
+        # A generated statement is logged again when it runs: count executions, or generations if it never ran
+        executions = sum(count for source, count in item["sources"].items() if source != "llm")
+        item["count"] = executions or item["sources"]["llm"]
+    return workload
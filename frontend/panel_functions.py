@@ -11,7 +11,7 @@ import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Now you can import the function
-from database.db_utils import get_database_schema, get_database_data, fetch_from_db
+from database.db_utils import get_database_schema, get_database_data, get_table_page, fetch_from_db
 
 # Set up logging configuration
 logging.basicConfig(level=logging.DEBUG,  # Set logging level to DEBUG (you can change this as needed)
@@ -66,48 +66,76 @@ def show_schema_modal():
 
 # Function to display database data modal
 def show_db_modal():
-    db_data, schema = get_database_data()
+    if not st.session_state.db_modal_open:
+        return
 
-    if isinstance(db_data, dict) and st.session_state.db_modal_open:
-        modal_html = f"""
-        <div style="position: fixed; top: 30%; left: 27%; width: 70%; height: 50%; 
-                    background-color: white; padding: 20px; border-radius: 10px; 
-                    box-shadow: 0 4px 8px rgba(0,0,0,0.2); z-index: 100; overflow: auto;">
-            <h2>View Database</h2>
-            <div style="position: absolute; top: 10px; right: 10px; background-color: white; padding: 10px; border: 1px solid #ddd; border-radius: 5px;">
-                <div><span style="background-color: #DBEDF3; padding: 2px 5px; border-radius: 3px;">Primary Key</span></div>
-                <div><span style="background-color: #E0E0E0; padding: 2px 5px; border-radius: 3px;">Foreign Key</span></div>
-            </div>
-        """
-        tab_names = list(db_data.keys())  
-        selected_table = st.selectbox("Select Table", tab_names)  
-
-        table_schema = schema.get(selected_table, {})
-        modal_html += f"<h4>Table: {selected_table}</h4>"
-        modal_html += "<table style='width:100%; border-collapse: collapse;'>"
-        modal_html += "<thead><tr>"
-
-        for column in db_data[selected_table]["columns"]:
-            header_style = ""
-            if column == table_schema.get("primary_key"):
-                header_style = "background-color: #DBEDF3; color: black;"
-            elif any(fk.startswith(column) for fk in table_schema.get("foreign_keys", [])):
-                header_style = "background-color: #E0E0E0; color: black;"
-            modal_html += f"<th style='border: 1px solid #ddd; padding: 8px; text-align: left; {header_style}'>{column}</th>"
-
-        modal_html += "</tr></thead><tbody>"
-
-        for row in db_data[selected_table]["rows"]:
-            modal_html += "<tr>"
-            for cell in row:
-                modal_html += f"<td style='border: 1px solid #ddd; padding: 8px;'>{cell}</td>"
-            modal_html += "</tr>"
-
-        modal_html += "</tbody></table><hr></div></div>"
-        st.markdown(modal_html, unsafe_allow_html=True)
-
-        if st.button("Hide Data ❌", key="close-db-modal"):
-            st.session_state.db_modal_open = False
+    db_name, schema = get_database_schema()
+    if not isinstance(schema, dict):
+        st.error("Could not load the database schema.")
+        return
+
+    modal_html = f"""
+    <div style="position: fixed; top: 30%; left: 27%; width: 70%; height: 50%; 
+                background-color: white; padding: 20px; border-radius: 10px; 
+                box-shadow: 0 4px 8px rgba(0,0,0,0.2); z-index: 100; overflow: auto;">
+        <h2>View Database</h2>
+        <div style="position: absolute; top: 10px; right: 10px; background-color: white; padding: 10px; border: 1px solid #ddd; border-radius: 5px;">
+            <div><span style="background-color: #DBEDF3; padding: 2px 5px; border-radius: 3px;">Primary Key</span></div>
+            <div><span style="background-color: #E0E0E0; padding: 2px 5px; border-radius: 3px;">Foreign Key</span></div>
+        </div>
+    """
+    tab_names = list(schema.keys())  
+    selected_table = st.selectbox("Select Table", tab_names)  
+
+    # Cursor stack per table so the viewer can page forward and back
+    if "db_page_cursors" not in st.session_state:
+        st.session_state.db_page_cursors = {}
+    cursors = st.session_state.db_page_cursors.setdefault(selected_table, [None])
+
+    try:
+        page = get_table_page(selected_table, cursor=cursors[-1])
+    except Exception as e:
+        st.error(f"Error fetching data from database: {e}")
+        return
+
+    table_schema = schema.get(selected_table, {})
+    primary_keys = table_schema.get("primary_key_columns") or [table_schema.get("primary_key")]
+    approx_rows = page["approx_row_count"]
+    modal_html += f"<h4>Table: {selected_table}</h4>"
+    modal_html += f"<p>Page {len(cursors)} · ~{approx_rows if approx_rows is not None else '?'} rows</p>"
+    modal_html += "<table style='width:100%; border-collapse: collapse;'>"
+    modal_html += "<thead><tr>"
+
+    for column in page["columns"]:
+        header_style = ""
+        if column in primary_keys:
+            header_style = "background-color: #DBEDF3; color: black;"
+        elif any(fk.startswith(column) for fk in table_schema.get("foreign_keys", [])):
+            header_style = "background-color: #E0E0E0; color: black;"
+        modal_html += f"<th style='border: 1px solid #ddd; padding: 8px; text-align: left; {header_style}'>{column}</th>"
+
+    modal_html += "</tr></thead><tbody>"
+
+    for row in page["rows"]:
+        modal_html += "<tr>"
+        for cell in row.values():
+            modal_html += f"<td style='border: 1px solid #ddd; padding: 8px;'>{cell}</td>"
+        modal_html += "</tr>"
+
+    modal_html += "</tbody></table><hr></div></div>"
+    st.markdown(modal_html, unsafe_allow_html=True)
+
+    # Rendered inside a sidebar column, where columns cannot be nested again
+    if len(cursors) > 1 and st.button("⬅️ Previous", key="db-page-prev"):
+        cursors.pop()
+        st.rerun()
+    if page["next_cursor"] and st.button("Next ➡️", key="db-page-next"):
+        cursors.append(page["next_cursor"])
+        st.rerun()
+
+    if st.button("Hide Data ❌", key="close-db-modal"):
+        st.session_state.db_modal_open = False
+        st.session_state.db_page_cursors = {}
 
         
         
@@ -137,12 +165,24 @@ OPENAI_PRICING = {
 
 import re
 
+def remaining_budget():
+    """Session budget left, sent with LLM requests so the backend can check its estimate before calling OpenAI."""
+    return max(0.0, st.session_state.get("session_budget", 1.0) - st.session_state.get("total_cost", 0.0))
+
+
 def calculate_cost(response_data):
     """Calculates and updates the session cost based on token usage."""
     request_cost = 0
     if "model" not in response_data.keys():
         logger.debug(f" \n \n !!Warning: Model not identified!")
         return  request_cost
+    if response_data.get("cache_hit"):
+        # Served from the LLM response cache, nothing billed
+        return request_cost
+    if response_data.get("usage_missing"):
+        # The completion did not report its token usage, there is nothing to price
+        logger.debug(f" \n \n !!Warning: No token usage for response {response_data.get('response_id')}")
+        return request_cost
     #model = "-".join(response_data['model'].split("-")[:3]) 
     model= response_data['model']
     prompt_tokens = response_data['prompt_tokens']
@@ -169,51 +209,6 @@ def calculate_cost(response_data):
     return round(request_cost, 6)  
 
 
-### Function for the 3M Analyser
-
-def fetch_min_max_for_field(table, field):
-    """Fetch the Min, Max, and corresponding name for Min, Max."""
-    if table == "projects":
-        # For projects, we need to get the project name along with the min/max value
-        query = f"""
-            SELECT proj_name, {field} 
-            FROM {table} 
-            WHERE {field} = (SELECT MIN({field}) FROM {table})
-            OR {field} = (SELECT MAX({field}) FROM {table});
-        """
-    elif table == "employees":
-        # For employees, we need to get the employee name along with the min/max value
-        query = f"""
-            SELECT CONCAT(firstname, ' ', lastname) AS employee_name, {field} 
-            FROM {table} 
-            WHERE {field} = (SELECT MIN({field}) FROM {table})
-            OR {field} = (SELECT MAX({field}) FROM {table});
-        """
-    elif table == "tasks" or table == "work_and_vacation":
-        # For tasks and work_and_vacation, replace NULL with 0 for hour fields and get the corresponding names
-        query = f"""
-            SELECT CONCAT(e.firstname, ' ', e.lastname) AS employee_name, 
-                   COALESCE(t.{field}, 0) AS {field} 
-            FROM {table} t
-            JOIN employees e ON e.employee_id = t.employee_id
-            WHERE COALESCE(t.{field}, 0) = (SELECT MIN(COALESCE({field}, 0)) FROM {table})
-            OR COALESCE(t.{field}, 0) = (SELECT MAX(COALESCE({field}, 0)) FROM {table});
-        """
-    else:
-        # Handle other cases as needed
-        query = f"""
-            SELECT {field} 
-            FROM {table} 
-            WHERE {field} = (SELECT MIN({field}) FROM {table})
-            OR {field} = (SELECT MAX({field}) FROM {table});
-        """
-
-    return fetch_from_db(query)
-
-
-
-
-
 def show_team_builder_modal():
     """Displays the Team Builder modal window with the response."""
     if "team_composition" in st.session_state:
@@ -272,7 +267,7 @@ def handle_team_building():
                 # API call to build the team
                 response  = requests.post(
                     "http://localhost:5000/build_team",
-                    json={"description": st.session_state["project_description"] ,  "model": st.session_state["model"], "temperature": st.session_state.temperature, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key}
+                    json={"description": st.session_state["project_description"] ,  "model": st.session_state["model"], "temperature": st.session_state.temperature, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key, "remaining_budget": remaining_budget()}
                 )
                 result = response.json()
 
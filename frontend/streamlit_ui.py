@@ -8,14 +8,18 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import plotly.express as px
 import datetime
+import json
 import uuid
 from tabulate import tabulate    
 
 # Add the parent directory to sys.path so the 'database' module can be found
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database.db_utils import get_database_schema, get_database_data, fetch_from_db
-from frontend.panel_functions import show_db_modal, show_schema_modal, calculate_cost, fetch_min_max_for_field, show_team_builder_modal, load_chat_sessions, save_chat_sessions, handle_team_building, clear_history
+from database.db_utils import get_database_schema, get_database_data, fetch_from_db, fetch_dataframe
+from database.table_stats import get_table_statistics
+from database.quick_viz import get_viz_data, start_quick_viz_refresher
+from database.arrow_utils import ARROW_AVAILABLE, ARROW_STREAM_MIMETYPE, ipc_to_table, table_to_dataframe
+from frontend.panel_functions import show_db_modal, show_schema_modal, calculate_cost, remaining_budget, show_team_builder_modal, load_chat_sessions, save_chat_sessions, handle_team_building, clear_history
 
 # Set up logging configuration
 logging.basicConfig(level=logging.DEBUG,  # Set logging level to DEBUG (you can change this as needed)
@@ -29,6 +33,9 @@ logger = logging.getLogger(__name__)
 # Set Streamlit page configuration
 st.set_page_config(page_title="crud_chatbot", layout="wide")
 
+# Keep the Quick Viz materialized views fresh in the background (started once per process)
+start_quick_viz_refresher()
+
 # Custom CSS for layout and input field styling
 st.markdown(""" 
     <style>
@@ -161,8 +168,43 @@ def format_dict(data: dict):
 
     
     
+def parse_backend_response(response):
+    """Decodes a backend response; Arrow IPC results become a DataFrame under 'fetched_data'."""
+    if response.headers.get("Content-Type", "").startswith(ARROW_STREAM_MIMETYPE):
+        table, result = ipc_to_table(response.content)
+        result["fetched_data"] = table_to_dataframe(table) if table.num_rows else "No results found."
+        return result
+    return response.json()
+
+
+def stream_backend_response(api_url, payload, placeholder):
+    """Posts to a Server-Sent Events route and renders the SQL as it is generated.
+
+    Returns (result, status_code) from the final "result" event.
+    """
+    response = requests.post(api_url, json=payload, stream=True)
+    if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+        return response.json(), response.status_code
+
+    generated, result, event = "", {}, None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+            if event == "token":
+                generated += data["text"]
+                placeholder.markdown(f"Generating:  `{generated}`  \n🎯 Certainty so far: {data['avg_prob'] * 100:.1f}%")
+            elif event == "result":
+                result = data
+    return result, result.pop("status", 500)
+
+
 def format_bot_response(fetched_data):
-    if isinstance(fetched_data, str):
+    if isinstance(fetched_data, pd.DataFrame):
+        # Columnar results are rendered as a markdown table straight from the DataFrame
+        return fetched_data.to_markdown(index=False)
+    elif isinstance(fetched_data, str):
         # If the response is a string, return it as-is
         return fetched_data
     elif isinstance(fetched_data, list):
@@ -266,6 +308,9 @@ if "show_buttons" not in st.session_state:  # to display buttons for select quer
 if "confirmation_needed" not in st.session_state:
     st.session_state.confirmation_needed = False
 
+if "next_page_token" not in st.session_state:  # continuation token of the last SELECT result
+    st.session_state.next_page_token = None
+
 if "team_builder_response_data" not in st.session_state:
     st.session_state.team_builder_response_data = None
       
@@ -303,6 +348,7 @@ if selected_session != st.session_state.active_session:
     st.session_state.generated_query = st.session_state.chat_sessions[selected_session].get("generated_query", "")
     st.session_state.response_data = st.session_state.chat_sessions[selected_session].get("response_data", {})
     st.session_state.total_cost = st.session_state.chat_sessions[selected_session].get("total_cost", 0.0)
+    st.session_state.next_page_token = st.session_state.chat_sessions[selected_session].get("next_page_token")
 
 
 
@@ -371,107 +417,87 @@ with st.sidebar:
     
     # Populate numeric_fields based on the schema
     for table, details in schema.items():
-        numeric_fields[table] = [column_info['column_name'] for column_info in details['columns'] if column_info['data_type'] in ['integer', 'numeric', 'float', 'decimal']]
+        numeric_fields[table] = [column_info['column_name'] for column_info in details['columns'] if column_info['data_type'] in ['integer', 'bigint', 'smallint', 'numeric', 'real', 'double precision', 'float', 'decimal']]
 
     with st.expander("🔍 **3M Analyser: Min - Max - Mean**", expanded=False):
         # Table selection
         table = st.selectbox("Select Table", list(numeric_fields.keys()), key="table_select_3M")
 
-        # Field selection based on chosen table
-        field = st.selectbox("Select Numeric Field", numeric_fields[table])
-
         # Execute Query Button
         if st.button("Compute 3M"):
-            # Fetch Min, Max values and corresponding names
-            results = fetch_min_max_for_field(table, field)
-
-            if results:
-                min_name, min_val = results[0]
-                max_name, max_val = results[1]
+            if not numeric_fields[table]:
+                st.info(f"Table {table} has no numeric fields.")
+            else:
+                # One aggregate pass for every numeric field of the table (cached until the table changes)
+                statistics = get_table_statistics(table, numeric_fields[table])
 
-                # Fetch Mean Value (we will compute Mean separately)
-                sql_query = f"""
-                    SELECT AVG({field}) 
-                    FROM {table}
-                """
-                mean_result = fetch_from_db(sql_query)
-                mean_val = mean_result[0][0] if mean_result else 0
+                stats_df = pd.DataFrame.from_dict(statistics, orient="index")
+                stats_df.index = [field.replace('_', ' ').title() for field in stats_df.index]
+                stats_df = stats_df.rename(columns={
+                    "count": "Count", "null_count": "Nulls", "min": "Minimum", "min_label": "Min (name)",
+                    "max": "Maximum", "max_label": "Max (name)", "mean": "Mean", "stddev": "Std Dev",
+                    "p25": "P25", "p50": "Median", "p75": "P75",
+                })
 
                 # Display results
-                st.write(f"### {field.replace('_', ' ').title()} Statistics")
-                st.write(f"**Minimum:** {min_val} ({min_name})")
-                st.write(f"**Maximum:** {max_val} ({max_name})")
-                st.write(f"**Mean:** {mean_val:.2f}")
+                st.write(f"### {table.replace('_', ' ').title()} Statistics")
+                st.dataframe(stats_df.round(2))
                     
                     
     ### Section "Quick Viz"
 
     with st.expander("📊 **Quick Viz**", expanded=False):
 
-        db_name, schema = get_database_schema()
-
-        # Predefined human-readable queries and their SQL queries
+        # Predefined human-readable queries and their query templates (see database/query_templates.py)
         queries = {
             "📈 Salary distribution by department": {
-                "sql": """
-                    SELECT 
-                        department, 
-                        CONCAT(FLOOR(salary / 1000) * 1000, ' - ', (FLOOR(salary / 1000) + 1) * 1000) AS salary_range, 
-                        COUNT(*) AS num_employees
-                    FROM employees
-                    GROUP BY department, salary_range
-                    ORDER BY salary_range, department;
-
-                """,
+                "template": "viz_salary_distribution",
                 "columns": ["Department", "Salary Range", "Num Employees"],
-                "chart_type": "bar"
+                "chart_type": "bar",
+                "live": False
             },
             "📊 Number of employees per role": {
-                "sql": """
-                    SELECT role, COUNT(*) AS num_employees 
-                    FROM employees
-                    GROUP BY role
-                    ORDER BY num_employees DESC
-                """,
+                "template": "viz_employees_per_role",
                 "columns": ["Role", "Num Employees"],
-                "chart_type": "pie"
+                "chart_type": "pie",
+                "live": False
             },
             "📉 Project budget distribution": {
-                "sql": """
-                    SELECT proj_name, budget 
-                    FROM projects
-                    ORDER BY budget DESC
-                """,
+                "template": "viz_project_budgets",
                 "columns": ["Project Name", "Budget"],
-                "chart_type": "line"
+                "chart_type": "line",
+                "live": False
             },
             "⏳ Work hours by employee": {
-                "sql": """
-                    SELECT e.firstname || ' ' || e.lastname AS employee, 
-                        SUM(t.work_hours) AS total_hours
-                    FROM tasks t
-                    JOIN employees e ON t.employee_id = e.employee_id
-                    GROUP BY employee
-                    ORDER BY total_hours DESC
-                """,
+                "template": "viz_work_hours_by_employee",
                 "columns": ["Employee", "Total Hours"],
-                "chart_type": "bar"
+                "chart_type": "bar",
+                "live": False
             }
         }
 
         # Select predefined query
         selected_query = st.selectbox("Choose a query", list(queries.keys()), key="viz_query")
+        # Charts read pre-aggregated materialized views unless they opt into a live query
+        live = st.checkbox("Query live data", value=queries[selected_query]["live"], key="viz_live")
 
         if st.button("Generate Quick Visualization"):
-            sql_query = queries[selected_query]["sql"]
+            template = queries[selected_query]["template"]
             chart_type = queries[selected_query]["chart_type"]
             column_names = queries[selected_query]["columns"]
 
-            results = fetch_from_db(sql_query)
+            rows, refreshed_at = get_viz_data(template, live=live)
+            df = pd.DataFrame(rows)
+
+            if refreshed_at is not None:
+                age = datetime.datetime.now(refreshed_at.tzinfo) - refreshed_at
+                st.caption(f"Data as of {refreshed_at:%Y-%m-%d %H:%M:%S} ({int(age.total_seconds() // 60)} min ago)")
+            else:
+                st.caption("Live data")
 
-            if results:
-                # Convert results to DataFrame with correct column names
-                df = pd.DataFrame(results, columns=column_names)
+            if not df.empty:
+                # Rename result columns to their display names
+                df.columns = column_names
                 st.write(df)
                 # Generate appropriate chart
                 if chart_type == "bar":
@@ -543,13 +569,10 @@ with st.sidebar:
         if st.button("Run"):
             if sql_query.strip():
                 try:
-                    # Assuming fetch_from_db executes the query and returns results
-                    results = fetch_from_db(sql_query)
+                    # Results are built into a DataFrame from Arrow when pyarrow is installed
+                    results_df = fetch_dataframe(sql_query)
 
-                    if results:
-                        # Convert the list of results to a pandas DataFrame
-                        results_df = pd.DataFrame(results)
-                        
+                    if not results_df.empty:
                         # Check if the results are duplicated and only display unique rows
                         unique_results = results_df.drop_duplicates()
 
@@ -751,18 +774,17 @@ if user_input:
         thinking_placeholder = st.empty()
         thinking_placeholder.markdown("Thinking...")
 
-    # Backend API call
-    api_url = "http://127.0.0.1:5000/crud"
-    payload = {"message": user_input, "model": st.session_state.model, "temperature": st.session_state.temperature, "max_tokens": st.session_state.max_tokens, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key}
-    response = requests.post(api_url, json=payload)
+    # Backend API call, streamed: the SQL is shown while it is generated
+    api_url = "http://127.0.0.1:5000/crud/stream"
+    payload = {"message": user_input, "model": st.session_state.model, "temperature": st.session_state.temperature, "max_tokens": st.session_state.max_tokens, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key, "session_id": st.session_state.active_session, "remaining_budget": remaining_budget()}
+    result, status_code = stream_backend_response(api_url, payload, thinking_placeholder)
     # Remove "Thinking..." message
     thinking_placeholder.empty()
 
     # Process response
     bot_response = "Error: Could not fetch response from backend."
-    if response.status_code == 200:
+    if status_code == 200:
         #st.session_state.show_buttons = True  this allow to display button even for non select sueries
-        result = response.json()
         st.session_state.response_data = result["response_data"]     
         
         if "fetched_data" in result:
@@ -770,7 +792,13 @@ if user_input:
             bot_response = format_bot_response(fetched_data)
             st.session_state.show_buttons = True   
             st.session_state.generated_query = result["generated_query"]
+            st.session_state.next_page_token = result.get("page", {}).get("next_token")
                 
+        elif result.get("rejected"):
+            # Over the cost/impact limits: shown with its estimate, nothing to confirm
+            bot_response = f"Generated Query:  `{result['generated_query']}`  {result['confirmation_message']}"
+            st.session_state.show_buttons = False
+
         elif "generated_query" in result:
             st.session_state.confirmation_needed = True  
             st.session_state.generated_query = result["generated_query"]      
@@ -779,7 +807,12 @@ if user_input:
             
         st.session_state.response_data = result["response_data"]        
         st.session_state.total_cost += calculate_cost(result["response_data"])
-        st.session_state.api_calls += 1
+        if not result["response_data"].get("cache_hit"):
+            st.session_state.api_calls += 1
+
+    elif status_code == 402:
+        # Refused before calling OpenAI: the estimated cost is above the remaining session budget
+        bot_response = result["response"]
     
     # Add Bot response to UI    
     st.session_state.messages.append({"role": "assistant", "content": bot_response})
@@ -802,6 +835,7 @@ if user_input:
     st.session_state.chat_sessions[st.session_state.active_session]["generated_query"] = st.session_state.generated_query
     st.session_state.chat_sessions[st.session_state.active_session]["response_data"] = st.session_state.response_data
     st.session_state.chat_sessions[st.session_state.active_session]["total_cost"] = st.session_state.total_cost
+    st.session_state.chat_sessions[st.session_state.active_session]["next_page_token"] = st.session_state.next_page_token
 
 
     save_chat_sessions()
@@ -819,6 +853,28 @@ if st.session_state.get("show_buttons", False):
         with show_more_button:
             if st.button("⏬ More", use_container_width=True):
                 st.json(format_dict(st.session_state.response_data))
+
+    # Next page of the last SELECT result, fetched only when asked for
+    if st.session_state.get("next_page_token") and st.button("➕ Load more rows", use_container_width=True):
+        headers = {"Accept": f"{ARROW_STREAM_MIMETYPE}, application/json"} if ARROW_AVAILABLE else {}
+        page_response = requests.post(
+            "http://127.0.0.1:5000/crud/page",
+            json={"generated_query": st.session_state.generated_query, "page_token": st.session_state.next_page_token, "session_id": st.session_state.active_session},
+            headers=headers
+        )
+        if page_response.status_code == 200:
+            page_result = parse_backend_response(page_response)
+            bot_response = format_bot_response(page_result["fetched_data"])
+            st.session_state.next_page_token = page_result.get("page", {}).get("next_token")
+        else:
+            bot_response = "Error: Could not fetch more rows."
+            st.session_state.next_page_token = None
+
+        st.session_state.messages.append({"role": "assistant", "content": bot_response})
+        st.session_state.chat_sessions[st.session_state.active_session]["messages"].append({"role": "assistant", "content": bot_response})
+        st.session_state.chat_sessions[st.session_state.active_session]["next_page_token"] = st.session_state.next_page_token
+        save_chat_sessions()
+        st.rerun()
                 
     
 
@@ -834,10 +890,21 @@ if st.session_state.confirmation_needed and st.session_state.generated_query:
             rerun = st.button("🔄 Regenerate", use_container_width=True )
         with col5:
             more = st.button("⏬ More", use_container_width=True)
-    if confirm:
+
+        # Expensive per the query guard: the server only runs it with `confirm_estimate`, sent after an explicit acknowledgement
+        query_estimate = (st.session_state.response_data or {}).get("query_estimate") or {}
+        estimate_acknowledged = False
+        if query_estimate.get("verdict") == "confirm":
+            st.warning("This query is expensive: " + "; ".join(query_estimate.get("reasons", [])))
+            estimate_acknowledged = st.checkbox("I have read the estimate and want to run it anyway",
+                                                key=f"ack_estimate_{hash(st.session_state.generated_query)}")
+    if confirm and query_estimate.get("verdict") == "confirm" and not estimate_acknowledged:
+        st.warning("Tick the acknowledgement above to run an expensive query.")
+    elif confirm:
         execute_response = requests.post(
-            "http://127.0.0.1:5000/execute", json={"generated_query": st.session_state.generated_query, "confirm": True}
+            "http://127.0.0.1:5000/execute", json={"generated_query": st.session_state.generated_query, "confirm": True, "confirm_estimate": estimate_acknowledged, "session_id": st.session_state.active_session, "message": st.session_state.user_input, "from_template": "template_match" in (st.session_state.response_data or {})}
         )
+        execute_result = execute_response.json() if execute_response.headers.get("Content-Type", "").startswith("application/json") else {}
         
         # Remove only the last assistant response (generated query)
         #for i in range(len(st.session_state.messages) - 1, -1, -1):
@@ -845,7 +912,17 @@ if st.session_state.confirmation_needed and st.session_state.generated_query:
                 #del st.session_state.messages[i]
                 #break     
             
-        st.session_state.messages.append({"role": "assistant", "content": "Query executed successfully." if execute_response.status_code == 200 else "Error executing query."})
+        if "response" in execute_result:
+            execute_message = execute_result["response"]
+        else:
+            execute_message = "Query executed successfully." if execute_response.status_code == 200 else "Error executing query."
+            # Confirmed SELECTs (e.g. an expensive one) come back with their rows
+            for entry in execute_result.get("queries", []):
+                if "fetched_data" in entry:
+                    execute_message += "\n\n" + format_bot_response(entry["fetched_data"])
+                    if entry.get("fetch_report", {}).get("truncated"):
+                        execute_message += f"\n\n⚠️ Showing the first {entry['fetch_report']['row_count']} rows."
+        st.session_state.messages.append({"role": "assistant", "content": execute_message})
         st.session_state.show_buttons = False  # Display buttons
         st.session_state.confirmation_needed = False
         st.session_state.generated_query = None
@@ -880,7 +957,7 @@ if st.session_state.confirmation_needed and st.session_state.generated_query:
             
                 
             # Resend the request
-            response = requests.post( "http://127.0.0.1:5000/crud" , json= {"message": st.session_state.user_input , "model": st.session_state.model, "temperature": st.session_state.temperature, "max_tokens": st.session_state.max_tokens, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key} )
+            response = requests.post( "http://127.0.0.1:5000/crud" , json= {"message": st.session_state.user_input , "model": st.session_state.model, "temperature": st.session_state.temperature, "max_tokens": st.session_state.max_tokens, "certainty_threshold": st.session_state.certainty_threshold ,  "api_key": st.session_state.api_key, "session_id": st.session_state.active_session, "refresh_cache": True, "remaining_budget": remaining_budget()} )
             
             # Remove "Regenerating..." message                          
             thinking_placeholder.empty()
@@ -900,7 +977,11 @@ if st.session_state.confirmation_needed and st.session_state.generated_query:
                     #with st.expander("Display Response Data"):
                         #st.json(result["response_data"])
                         
-                if "generated_query" in result:
+                if result.get("rejected"):
+                    st.session_state.confirmation_needed = False
+                    bot_response = f"Regenerated Query: `{result['generated_query']}` \n {result['confirmation_message']}"
+
+                elif "generated_query" in result:
                     st.session_state.generated_query = result["generated_query"]
                     st.session_state.response_data = result["response_data"] 
                     st.session_state.confirmation_needed = True  
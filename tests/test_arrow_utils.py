@@ -0,0 +1,34 @@
+import datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from database.arrow_utils import rows_to_record_batch, batches_to_table, table_to_ipc, ipc_to_table, table_to_dataframe
+
+
+def test_rows_are_converted_column_by_column():
+    batch = rows_to_record_batch(["name", "hired"], [("Ann", datetime.date(2024, 1, 2)), ("Bob", None)])
+    assert batch.schema.names == ["name", "hired"]
+    assert batch.column(0).to_pylist() == ["Ann", "Bob"]
+    assert batch.column(1).type == pa.date32()
+
+
+def test_batches_with_an_all_null_column_are_promoted_to_the_later_type():
+    first = rows_to_record_batch(["salary"], [(None,)])
+    second = rows_to_record_batch(["salary"], [(1000,)])
+    table = batches_to_table([first, second])
+    assert table.column("salary").type == pa.int64()
+    assert table.column("salary").to_pylist() == [None, 1000]
+
+
+def test_empty_results_keep_their_columns():
+    assert batches_to_table([], ["a", "b"]).schema.names == ["a", "b"]
+
+
+def test_ipc_round_trip_carries_the_response_metadata():
+    table = batches_to_table([rows_to_record_batch(["id"], [(1,), (2,)])])
+    decoded, metadata = ipc_to_table(table_to_ipc(table, {"page": {"next_token": "abc"}}))
+    assert decoded.column("id").to_pylist() == [1, 2]
+    assert metadata == {"page": {"next_token": "abc"}}
+    assert list(table_to_dataframe(decoded)["id"]) == [1, 2]
@@ -0,0 +1,32 @@
+import psycopg2
+
+from database.batch_executor import group_statements, run_statement
+
+
+def test_group_statements_keeps_consecutive_writes_together_and_reads_alone():
+    queries = ["INSERT INTO a VALUES (1)", "UPDATE a SET x = 1", "SELECT * FROM a", "SELECT 1", "DELETE FROM a"]
+    groups = group_statements(queries)
+    assert [(group["read"], [index for index, _ in group["items"]]) for group in groups] == [
+        (False, [0, 1]), (True, [2]), (True, [3]), (False, [4]),
+    ]
+
+
+def test_group_statements_of_an_empty_batch():
+    assert group_statements([]) == []
+
+
+class FailingCursor:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement):
+        self.executed.append(statement)
+        if statement.startswith("UPDATE"):
+            raise psycopg2.Error("boom")
+
+
+def test_run_statement_rolls_back_to_its_savepoint_on_error():
+    cur = FailingCursor()
+    entry = run_statement(None, cur, 3, "UPDATE a SET x = 1", use_savepoint=True)
+    assert not entry["success"]
+    assert cur.executed == ["SAVEPOINT batch_stmt_3;", "UPDATE a SET x = 1", "ROLLBACK TO SAVEPOINT batch_stmt_3;"]
@@ -0,0 +1,148 @@
+import psycopg2
+import pytest
+from psycopg2 import extensions as pg_extensions
+from psycopg2 import pool as pg_pool
+
+from database import db_pool
+from database.db_pool import ConnectionManager
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        if self.conn.unhealthy:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.unhealthy = False
+        self.status = pg_extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = pg_extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakePool:
+    """Minimal ThreadedConnectionPool: reuses idle connections, opens new ones on demand."""
+
+    def __init__(self, minconn, maxconn, **dsn_params):
+        self._pool, self._used = [], {}
+        self.opened = 0
+        self.closed = False
+
+    def getconn(self):
+        if self._pool:
+            conn = self._pool.pop()
+        else:
+            self.opened += 1
+            conn = FakeConnection(self.opened)
+        self._used[id(conn)] = conn
+        return conn
+
+    def putconn(self, conn, close=False):
+        del self._used[id(conn)]
+        if close:
+            conn.closed = 1
+        else:
+            self._pool.append(conn)
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def make_manager(monkeypatch):
+    monkeypatch.setattr(pg_pool, "ThreadedConnectionPool", FakePool)
+    monkeypatch.setattr(db_pool, "_close_hooks", [])
+
+    def make(**options):
+        return ConnectionManager({"dbname": "test"}, **options)
+    return make
+
+
+def test_connections_are_reused(make_manager):
+    manager = make_manager()
+    with manager.connection() as first:
+        pass
+    with manager.connection() as second:
+        assert second is first
+    stats = manager.stats()
+    assert (stats["opened"], stats["borrowed"], stats["returned"], stats["in_use"], stats["idle"]) == (1, 2, 2, 0, 1)
+
+
+def test_connections_past_their_lifetime_are_replaced(make_manager):
+    manager = make_manager(max_lifetime=60)
+    with manager.connection() as first:
+        pass
+    manager._created_at[id(first)] -= 120
+    with manager.connection() as second:
+        assert second is not first
+    assert first.closed and manager.stats()["recycled"] == 1
+
+
+def test_idle_connections_failing_the_ping_are_replaced(make_manager):
+    manager = make_manager(health_check_interval=60)
+    with manager.connection() as first:
+        pass
+    manager._last_used[id(first)] -= 120
+    first.unhealthy = True
+    with manager.connection() as second:
+        assert second is not first
+    assert manager.stats()["health_check_failures"] == 1
+
+
+def test_open_transactions_are_rolled_back_on_return(make_manager):
+    manager = make_manager()
+    with manager.connection() as conn:
+        conn.status = pg_extensions.TRANSACTION_STATUS_INERROR
+    assert conn.rollbacks == 1 and not conn.closed
+
+
+def test_connections_that_failed_are_discarded_and_hooks_called(make_manager):
+    forgotten = []
+    db_pool.add_connection_close_hook(forgotten.append)
+    manager = make_manager()
+    with pytest.raises(psycopg2.OperationalError):
+        with manager.connection() as conn:
+            raise psycopg2.OperationalError("connection lost")
+    assert conn.closed and forgotten == [conn]
+
+
+def test_borrowers_wait_for_a_free_connection_then_give_up(make_manager):
+    manager = make_manager(maxconn=1, acquire_timeout=0.01)
+    conn = manager.getconn()
+    with pytest.raises(pg_pool.PoolError):
+        manager.getconn()
+    manager.putconn(conn)
+    manager.putconn(manager.getconn())
+    assert manager.stats()["acquire_timeouts"] == 1
+
+
+def test_close_forgets_every_connection(make_manager):
+    forgotten = []
+    db_pool.add_connection_close_hook(forgotten.append)
+    manager = make_manager()
+    idle, busy = manager.getconn(), manager.getconn()
+    manager.putconn(idle)
+    manager.close()
+    assert {id(conn) for conn in forgotten} == {id(idle), id(busy)}
+    assert manager._pool.closed
@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+from psycopg2 import pool as pg_pool
+
+from database.db_router import QueryRouter
+from database.db_utils import is_read_query
+
+
+class FakeConnection:
+    closed = 0
+
+
+class FakeManager:
+    def __init__(self, fail_on_acquire=False):
+        self.fail_on_acquire = fail_on_acquire
+
+    @contextmanager
+    def connection(self):
+        if self.fail_on_acquire:
+            raise pg_pool.PoolError("no connection")
+        yield FakeConnection()
+
+
+def router_with_replica(replica):
+    return QueryRouter(FakeManager(), [("replica_0", replica)])
+
+
+def test_statement_errors_do_not_mark_the_replica_down():
+    router = router_with_replica(FakeManager())
+    with pytest.raises(psycopg2.extensions.QueryCanceledError):
+        with router.connection(read_only=True):
+            raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+    assert router._choose(read_only=True)[0] == "replica_0"
+    assert router.latency_stats()["replica_0"]["errors"] == 1
+
+
+def test_acquire_failures_mark_the_replica_down():
+    router = router_with_replica(FakeManager(fail_on_acquire=True))
+    with pytest.raises(pg_pool.PoolError):
+        with router.connection(read_only=True):
+            pass
+    assert router._choose(read_only=True)[0] == "primary"
+
+
+def test_lost_connections_mark_the_replica_down():
+    router = router_with_replica(FakeManager())
+    with pytest.raises(psycopg2.OperationalError):
+        with router.connection(read_only=True) as conn:
+            conn.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    assert router._choose(read_only=True)[0] == "primary"
+
+
+def test_writes_pin_the_session_to_the_primary():
+    router = router_with_replica(FakeManager())
+    router.mark_write()
+    assert router._choose(read_only=True)[0] == "primary"
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT * FROM employees",
+    "  (SELECT 1) UNION (SELECT 2)",
+    "WITH e AS (SELECT * FROM employees) SELECT * FROM e",
+    "WITH e AS (SELECT * FROM employees WHERE note = 'delete me') SELECT * FROM e",
+    "VALUES (1), (2)",
+])
+def test_reads(statement):
+    assert is_read_query(statement)
+
+
+@pytest.mark.parametrize("statement", [
+    "UPDATE employees SET role = 'x'",
+    "WITH d AS (DELETE FROM employees RETURNING *) SELECT * FROM d",
+    "with moved as (insert into archive select * from tasks returning *) select count(*) from moved",
+    "WITH u AS (UPDATE tasks SET validation = TRUE RETURNING *) SELECT * FROM u",
+])
+def test_writes(statement):
+    assert not is_read_query(statement)
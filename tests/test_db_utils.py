@@ -0,0 +1,162 @@
+import pytest
+
+from database.db_utils import (
+    new_fetch_report, take_within_caps, capped_row_batches, finish_page, plan_page, mask_nested, keyset_order,
+)
+
+
+class FakeCursor:
+    """Serves `rows` through fetchmany like a named psycopg2 cursor."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_take_within_caps_stops_at_max_rows():
+    report = new_fetch_report(max_rows=2, max_bytes=None)
+    assert take_within_caps([(1,), (2,), (3,)], report) == [(1,), (2,)]
+    assert report["truncated"] and report["limit_reason"] == "max_rows"
+    assert report["row_count"] == 2
+
+
+def test_take_within_caps_stops_before_the_row_that_exceeds_max_bytes():
+    report = new_fetch_report(max_rows=None, max_bytes=10)
+    assert take_within_caps([("abcd",), ("efgh",), ("ijkl",)], report) == [("abcd",), ("efgh",)]
+    assert report["limit_reason"] == "max_bytes"
+    assert report["byte_count"] == 8
+
+
+def test_capped_row_batches_yields_itersize_batches_until_the_cap():
+    cursor = FakeCursor((i,) for i in range(10))
+    report = new_fetch_report(max_rows=5, max_bytes=None)
+    assert list(capped_row_batches(cursor, 2, report)) == [[(0,), (1,)], [(2,), (3,)], [(4,)]]
+    assert report["truncated"]
+    # Rows past the cap are never fetched
+    assert cursor.fetches == 3
+
+
+def test_capped_row_batches_reads_everything_under_the_caps():
+    report = new_fetch_report()
+    assert list(capped_row_batches(FakeCursor([(1,), (2,), (3,)]), 2, report)) == [[(1,), (2,)], [(3,)]]
+    assert not report["truncated"] and report["row_count"] == 3
+
+
+def offset_plan(page_size):
+    return {"sql": "SELECT 1", "page_size": page_size, "page_token": None, "columnar": False, "fingerprint": "f",
+            "state": {"query": "f", "offset": 0, "keys": None}, "order": None, "method": "offset", "cache_key": None}
+
+
+def test_finish_page_continues_after_a_page_cut_by_the_byte_cap(monkeypatch):
+    monkeypatch.setattr("database.db_utils.record_statement", lambda *args: None)
+    report = new_fetch_report(max_rows=None, max_bytes=4)
+    rows = take_within_caps([("ab",), ("cd",), ("ef",)], report)
+    result, page = finish_page(offset_plan(10), ["value"], rows, report)
+    assert result == [{"value": "ab"}, {"value": "cd"}]
+    assert page["has_more"] and page["next_token"] and page["limit_reason"] == "max_bytes"
+
+
+def test_finish_page_rejects_a_single_row_above_the_byte_cap():
+    report = new_fetch_report(max_rows=None, max_bytes=1)
+    rows = take_within_caps([("too large",)], report)
+    with pytest.raises(ValueError):
+        finish_page(offset_plan(10), ["value"], rows, report)
+
+
+def test_page_cursors_round_trip_key_values():
+    from database.db_utils import encode_page_cursor, decode_page_cursor
+    cursor = encode_page_cursor(["Smith", 42])
+    assert decode_page_cursor(cursor) == ["Smith", 42]
+    # Opaque and URL safe
+    assert "Smith" not in cursor and set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+def test_page_cursors_encode_dates_and_uuids_as_text():
+    import datetime
+    import uuid
+    from database.db_utils import encode_page_cursor, decode_page_cursor
+    key = uuid.UUID("12345678-1234-5678-1234-567812345678")
+    assert decode_page_cursor(encode_page_cursor([datetime.date(2024, 1, 31), key])) == ["2024-01-31", str(key)]
+
+
+def test_get_table_page_rejects_unknown_tables(monkeypatch):
+    from database.db_utils import get_table_page
+    monkeypatch.setattr("database.db_utils.get_database_schema", lambda: ("test_db", {"employees": {}}))
+    with pytest.raises(ValueError):
+        get_table_page('employees"; DROP TABLE employees; --')
+
+
+SCHEMA = {
+    "employees": {"primary_key_columns": ["employee_id"]},
+    "tasks": {"primary_key_columns": ["task_id"]},
+    "skills": {"primary_key_columns": []},
+}
+
+
+@pytest.fixture
+def schema(monkeypatch):
+    monkeypatch.setattr("database.db_utils.get_database_schema", lambda: ("test_db", SCHEMA))
+    monkeypatch.setattr("database.db_utils.get_schema_hash", lambda: "h")
+    monkeypatch.setattr("database.db_utils.record_statement", lambda *args: None)
+
+
+def test_mask_nested_blanks_literals_and_subqueries_keeping_offsets():
+    sql_query = "SELECT (SELECT 1 ORDER BY x) FROM t WHERE a = 'order by b' ORDER BY c"
+    masked = mask_nested(sql_query)
+    assert len(masked) == len(sql_query)
+    assert masked.lower().count("order by") == 1
+    assert masked.endswith("ORDER BY c")
+
+
+@pytest.mark.parametrize("sql_query, expected", [
+    ("SELECT * FROM employees ORDER BY lastname, employee_id", (["lastname", "employee_id"], False)),
+    ("SELECT * FROM employees e ORDER BY e.employee_id DESC", (["employee_id"], True)),
+    ("SELECT * FROM employees e JOIN tasks t ON t.employee_id = e.employee_id ORDER BY e.employee_id, t.task_id",
+     (["employee_id", "task_id"], False)),
+    # Not unique, mixed directions, expressions, own LIMIT, no primary key, no ORDER BY
+    ("SELECT * FROM employees ORDER BY lastname", None),
+    ("SELECT * FROM employees ORDER BY lastname DESC, employee_id", None),
+    ("SELECT * FROM employees ORDER BY lower(lastname), employee_id", None),
+    ("SELECT * FROM employees ORDER BY employee_id LIMIT 10", None),
+    ("SELECT * FROM skills ORDER BY name", None),
+    ("SELECT * FROM employees", None),
+])
+def test_keyset_order(schema, sql_query, expected):
+    assert keyset_order(sql_query) == expected
+
+
+def test_keyset_order_ignores_order_by_inside_subqueries(schema):
+    sql_query = "SELECT * FROM (SELECT * FROM employees ORDER BY employee_id) e"
+    assert keyset_order(sql_query) is None
+
+
+def test_pages_of_a_uniquely_ordered_query_continue_by_keyset(schema):
+    sql_query = "SELECT employee_id, lastname FROM employees ORDER BY employee_id;"
+    plan = plan_page(sql_query, 2, None, False)
+    assert plan["method"] == "keyset" and plan["sql"] == sql_query.rstrip(";")
+    _, page = finish_page(plan, ["employee_id", "lastname"], [(1, "Lee"), (2, "Ray"), (3, "Moe")])
+    assert page["has_more"] and page["row_count"] == 2
+
+    following = plan_page(sql_query, 2, page["next_token"], False)
+    assert following["method"] == "keyset"
+    assert following["state"]["keys"] == [2] and following["state"]["offset"] == 2
+    _, last = finish_page(following, ["employee_id", "lastname"], [(3, "Moe")])
+    assert not last["has_more"] and last["next_token"] is None
+
+
+def test_other_queries_are_paged_by_offset(schema):
+    plan = plan_page("SELECT * FROM skills", 2, None, False)
+    assert plan["method"] == "offset"
+    _, page = finish_page(plan, ["name"], [("a",), ("b",), ("c",)])
+    assert plan_page("SELECT * FROM skills", 2, page["next_token"], False)["state"]["offset"] == 2
+
+
+def test_page_tokens_are_bound_to_their_query(schema):
+    _, page = finish_page(plan_page("SELECT * FROM skills", 1, None, False), ["name"], [("a",), ("b",)])
+    with pytest.raises(ValueError):
+        plan_page("SELECT * FROM employees", 1, page["next_token"], False)
@@ -0,0 +1,103 @@
+import json
+
+import psycopg2
+import pytest
+
+from database import workload_log
+from database.index_advisor import column_usage, candidate_indexes, parameterize_literals, explain_cost
+from database.workload_log import record_statement, load_workload
+
+SCHEMA = {
+    "employees": {"columns": [{"column_name": name} for name in ("employee_id", "lastname", "role", "hire_date")]},
+    "tasks": {"columns": [{"column_name": name} for name in ("task_id", "employee_id", "work_hours")]},
+}
+
+
+def test_column_usage_collects_predicates_joins_and_sort_columns():
+    statement = ("SELECT * FROM tasks t JOIN employees e ON t.employee_id = e.employee_id "
+                 "WHERE e.role = 'Developer' AND e.hire_date > '2024-01-01' ORDER BY e.lastname")
+    assert column_usage(statement, SCHEMA) == {
+        "tasks": {"eq": ["employee_id"], "range": [], "order": []},
+        "employees": {"eq": ["employee_id", "role"], "range": ["hire_date"], "order": ["lastname"]},
+    }
+
+
+def test_candidate_indexes_put_equality_columns_first_and_skip_covered_ones():
+    workload = {"q": {"count": 3, "sample": "SELECT * FROM employees WHERE role = '' AND hire_date > ''"}}
+    candidates = candidate_indexes(workload, SCHEMA, {"employees": [["employee_id"], ["role"]]})
+    assert set(candidates) == {("employees", ("hire_date",)), ("employees", ("role", "hire_date"))}
+    assert candidates[("employees", ("role", "hire_date"))]["count"] == 3
+
+
+def test_parameterize_literals():
+    assert parameterize_literals("SELECT * FROM employees WHERE hire_date > '' AND role = 'it''s'") == \
+        ("SELECT * FROM employees WHERE hire_date > $1 AND role = $2", 2)
+    assert parameterize_literals("SELECT 1") == ("SELECT 1", 0)
+
+
+class PlannerCursor:
+    """Records statements; fails EXPLAINs of blank literals compared to a date, like Postgres does."""
+
+    def __init__(self, fail_prepare=False):
+        self.executed = []
+        self.fail_prepare = fail_prepare
+
+    def execute(self, statement):
+        self.executed.append(statement)
+        if statement.startswith("PREPARE") and self.fail_prepare:
+            raise psycopg2.Error("could not determine data type of parameter $1")
+        if statement.startswith("EXPLAIN") and "> ''" in statement:
+            raise psycopg2.Error('invalid input syntax for type date: ""')
+
+    def fetchone(self):
+        return [[{"Plan": {"Total Cost": 42.0}}]]
+
+
+def test_explain_cost_plans_blank_literals_as_prepared_parameters():
+    cur = PlannerCursor()
+    assert explain_cost(cur, "SELECT * FROM employees WHERE hire_date > ''") == 42.0
+    assert cur.executed == [
+        "SAVEPOINT advisor_explain;",
+        "PREPARE advisor_statement AS SELECT * FROM employees WHERE hire_date > $1",
+        "EXPLAIN (FORMAT JSON) EXECUTE advisor_statement (NULL)",
+        "RELEASE SAVEPOINT advisor_explain;",
+        "DEALLOCATE advisor_statement;",
+    ]
+
+
+def test_explain_cost_reports_unplannable_statements_as_none():
+    cur = PlannerCursor(fail_prepare=True)
+    assert explain_cost(cur, "SELECT * FROM employees WHERE hire_date > ''") is None
+    assert "DEALLOCATE advisor_statement;" not in cur.executed
+    assert cur.executed.count("ROLLBACK TO SAVEPOINT advisor_explain;") == 2
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_recorded_statements_are_normalized_without_literals(data_dir):
+    record_statement("SELECT *   FROM employees WHERE lastname = 'Smith';", "llm")
+    record_statement("select * from employees where lastname = 'Jones'", "fetch")
+    entries = [json.loads(line) for line in (data_dir / "query_workload.jsonl").read_text().splitlines()]
+    assert [entry["sql"] for entry in entries] == ["select * from employees where lastname = ''"] * 2
+
+    workload = load_workload()
+    assert list(workload) == ["select * from employees where lastname = ''"]
+    # Executions are counted; the generation of a statement that then ran is not
+    assert workload["select * from employees where lastname = ''"]["count"] == 1
+
+
+def test_the_workload_log_is_rotated_and_read_from_the_tail(data_dir, monkeypatch):
+    monkeypatch.setattr(workload_log, "WORKLOAD_LOG_MAX_BYTES", 200)
+    for index in range(10):
+        record_statement(f"SELECT * FROM tasks WHERE work_hours > {index}", "fetch")
+    kept = [data_dir / "query_workload.jsonl.1", data_dir / "query_workload.jsonl"]
+    lines = sum(len(path.read_text().splitlines()) for path in kept)
+    # Older rotations are dropped, the current file and its predecessor are read
+    assert 0 < lines < 10
+    assert len(load_workload()) == lines
+    assert list(load_workload(max_statements=3))[-1] == "select * from tasks where work_hours > 9"
+    assert len(load_workload(max_statements=3)) == 3
@@ -0,0 +1,57 @@
+import pytest
+
+from backend.llm_cache import LLMResponseCache, normalize_question
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(path=str(tmp_path / "llm_cache.sqlite3"), max_entries=2)
+
+
+def test_questions_differing_in_spacing_or_punctuation_share_a_key(cache):
+    key = cache.make_key("Who  works on Apollo?", "gpt-4o", 0.2, 500, "h")
+    assert key == cache.make_key(" Who works on Apollo ", "gpt-4o", 0.2, 500, "h")
+    # Case is kept: names end up in SQL literals
+    assert normalize_question("who works on apollo?") != normalize_question("Who works on Apollo?")
+
+
+def test_the_key_depends_on_model_settings_and_schema(cache):
+    key = cache.make_key("q", "gpt-4o", 0.2, 500, "h")
+    assert key != cache.make_key("q", "gpt-4o-mini", 0.2, 500, "h")
+    assert key != cache.make_key("q", "gpt-4o", 0.5, 500, "h")
+    assert key != cache.make_key("q", "gpt-4o", 0.2, 800, "h")
+    assert key != cache.make_key("q", "gpt-4o", 0.2, 500, "h2")
+
+
+def test_responses_round_trip_through_the_file(cache, tmp_path):
+    cache.put("k", {"sql": "SELECT 1", "certainty": 0.9})
+    assert cache.get("k") == (True, {"sql": "SELECT 1", "certainty": 0.9})
+    # Another process using the same file sees it too
+    assert LLMResponseCache(path=cache.path).get("k")[0]
+    assert cache.get("other") == (False, None)
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl=-1)
+    cache.put("k", 1)
+    assert cache.get("k") == (False, None)
+
+
+def test_a_broken_cache_file_only_costs_a_miss(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+    cache = LLMResponseCache(path=str(path))
+    assert cache.get("k") == (False, None)
+    cache.put("k", 1)
+    assert cache.stats()["errors"] == 2
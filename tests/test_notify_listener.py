@@ -0,0 +1,51 @@
+from database.notify_listener import NotifyListener
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.executed.append(statement)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+
+def test_listen_hooks_run_on_every_new_connection(monkeypatch):
+    listener = NotifyListener()
+    monkeypatch.setattr(listener, "start", lambda: None)
+    calls = []
+    listener.subscribe("table_changed", lambda payload: None, on_listen=lambda: calls.append("cleared"))
+
+    first = FakeConnection()
+    listener._listen_new_channels(first)
+    listener._listen_new_channels(first)        # already listening: no new LISTEN, no hook
+    assert first.executed == ["LISTEN table_changed;"]
+    assert calls == ["cleared"]
+
+    # A reconnect starts from an empty set of LISTENed channels
+    listener._listening = set()
+    listener._listen_new_channels(FakeConnection())
+    assert calls == ["cleared", "cleared"]
+
+
+def test_notifications_are_dispatched_to_every_callback(monkeypatch):
+    listener = NotifyListener()
+    monkeypatch.setattr(listener, "start", lambda: None)
+    received = []
+    listener.subscribe("table_changed", received.append)
+    listener.subscribe("table_changed", received.append)     # subscribing twice is a no-op
+    listener._dispatch("table_changed", "employees,tasks")
+    assert received == ["employees,tasks"]
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.openai_pool import OpenAIClientPool
+
+
+@pytest.fixture
+def pool():
+    pool = OpenAIClientPool(max_clients=2)
+    yield pool
+    pool.close()
+
+
+def test_clients_are_reused_per_api_key_over_one_http_pool(pool):
+    client = pool.get("sk-a")
+    assert pool.get("sk-a") is client
+    other = pool.get("sk-b")
+    assert other is not client
+    assert other._client is client._client is pool._http_client
+    assert pool.stats()["clients_created"] == 2 and pool.stats()["client_hits"] == 1
+
+
+def test_least_recently_used_keys_are_dropped(pool):
+    first = pool.get("sk-a")
+    pool.get("sk-b")
+    pool.get("sk-a")
+    pool.get("sk-c")
+    assert pool.stats()["clients"] == 2 and pool.stats()["evictions"] == 1
+    assert pool.get("sk-a") is first
+    assert pool.stats()["clients_created"] == 3
+
+
+def test_idle_clients_are_dropped(pool):
+    pool.idle_ttl = -1
+    first = pool.get("sk-a")
+    assert pool.get("sk-a") is not first
+
+
+class FakeStream:
+    """Stands in for an httpcore network stream (weak-referenceable)."""
+
+
+def test_responses_on_a_seen_connection_count_as_reused(pool):
+    stream = FakeStream()
+
+    def response(network_stream, http_version="HTTP/1.1"):
+        return SimpleNamespace(extensions={"network_stream": network_stream}, http_version=http_version)
+
+    pool._on_response(response(stream))
+    pool._on_response(response(stream, "HTTP/2"))
+    pool._on_response(response(None))
+    stats = pool.stats()
+    assert (stats["requests"], stats["new_connections"], stats["reused_connections"]) == (3, 1, 1)
+    assert stats["http2_requests"] == 1
+    assert stats["connection_reuse_rate"] == round(1 / 3, 4)
@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend import openai_utils
+
+SQL = "SELECT firstname FROM employees;"
+TOKENS = ["SELECT", " firstname", " FROM", " employees;"]
+
+
+class MemoryCache:
+    def __init__(self):
+        self.entries = {}
+
+    def make_key(self, *parts):
+        return repr(parts)
+
+    def get(self, key):
+        return (key in self.entries), self.entries.get(key)
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+
+def logprobs(tokens):
+    return SimpleNamespace(content=[SimpleNamespace(token=token, logprob=-0.01) for token in tokens])
+
+
+def usage():
+    return SimpleNamespace(prompt_tokens=100, completion_tokens=4, total_tokens=104, prompt_tokens_details=None)
+
+
+def response():
+    choice = SimpleNamespace(message=SimpleNamespace(content=SQL), logprobs=logprobs(TOKENS), finish_reason="stop")
+    return SimpleNamespace(id="r1", model="gpt-4o-mini", choices=[choice], usage=usage())
+
+
+def chunks():
+    for index, token in enumerate(TOKENS):
+        choice = SimpleNamespace(delta=SimpleNamespace(content=token), logprobs=logprobs([token]),
+                                 finish_reason="stop" if index == len(TOKENS) - 1 else None)
+        yield SimpleNamespace(id="r1", model="gpt-4o-mini", choices=[choice], usage=None)
+    yield SimpleNamespace(id="r1", model="gpt-4o-mini", choices=[], usage=usage())
+
+
+class FakeCompletions:
+    def __init__(self, asynchronous=False):
+        self.asynchronous = asynchronous
+        self.calls = 0
+
+    def create(self, stream=False, **arguments):
+        self.calls += 1
+        result = list(chunks()) if stream else response()
+        if not self.asynchronous:
+            return iter(result) if stream else result
+
+        async def stream_chunks():
+            for chunk in result:
+                yield chunk
+
+        async def awaitable():
+            return stream_chunks() if stream else result
+        return awaitable()
+
+
+class FakeClient:
+    def __init__(self, asynchronous=False):
+        self.chat = SimpleNamespace(completions=FakeCompletions(asynchronous))
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    cache = MemoryCache()
+    clients = {"sync": FakeClient(), "async": FakeClient(asynchronous=True)}
+    monkeypatch.setattr(openai_utils, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(openai_utils, "get_schema_hash", lambda: "schema")
+    monkeypatch.setattr(openai_utils, "record_statement", lambda *args: None)
+    monkeypatch.setattr(openai_utils, "record_prompt_usage", lambda endpoint, usage: 0)
+    monkeypatch.setattr(openai_utils, "fit_query_prompt",
+                        lambda prompt, model, max_tokens, remaining_budget: ([{"role": "user", "content": prompt}], {"schema_tables": []}))
+    monkeypatch.setattr(openai_utils, "get_openai_client", lambda api_key: clients["sync"])
+    monkeypatch.setattr(openai_utils, "get_async_openai_pool", lambda: SimpleNamespace(get=lambda api_key: clients["async"]))
+    return clients
+
+
+ARGS = ("list employee names", "gpt-4o-mini", 0.5, 100, 0.9, "key")
+
+
+async def run_async_stream(events):
+    return [event async for event in events]
+
+
+def variants():
+    return {
+        "sync": lambda refresh: openai_utils.query_openai(*ARGS, refresh_cache=refresh),
+        "stream": lambda refresh: list(openai_utils.stream_query_openai(*ARGS, refresh_cache=refresh))[-1][1],
+        "async": lambda refresh: asyncio.run(openai_utils.query_openai_async(*ARGS, refresh_cache=refresh)),
+        "async_stream": lambda refresh: asyncio.run(run_async_stream(
+            openai_utils.stream_query_openai_async(*ARGS, refresh_cache=refresh)))[-1][1],
+    }
+
+
+@pytest.mark.parametrize("variant", ["sync", "stream", "async", "async_stream"])
+def test_query_variants_share_the_same_flow(fake_openai, variant):
+    sql_query, response_data = variants()[variant](True)
+    assert sql_query == SQL
+    assert response_data["total_tokens"] == 104 and not response_data["cache_hit"]
+    assert response_data["min_prob"] == 0.99 and response_data["valid_prob_threshold"]
+
+    # The answer was stored: the next call is a cache hit without a completion
+    calls = sum(client.chat.completions.calls for client in fake_openai.values())
+    sql_query, response_data = variants()[variant](False)
+    assert sql_query == SQL and response_data["cache_hit"] and response_data["total_tokens"] == 0
+    assert sum(client.chat.completions.calls for client in fake_openai.values()) == calls
+
+
+def test_streamed_completion_reports_the_certainty_so_far():
+    completion = openai_utils.StreamedCompletion(0.9)
+    events = [completion.add(chunk) for chunk in chunks()]
+    assert [event["text"] for event in events if event] == TOKENS
+    assert events[-1] is None and completion.usage.total_tokens == 104
+    assert completion.finish_reason == "stop"
+
+
+def test_budget_refusals_are_streamed_as_a_single_done_event():
+    answer = (None, {"error": "over budget", "budget_exceeded": True})
+    assert list(openai_utils.answer_events(answer)) == [("done", answer)]
+
+
+def test_a_stream_ending_without_its_usage_chunk_is_still_answered(fake_openai, monkeypatch):
+    monkeypatch.setattr(fake_openai["sync"].chat.completions, "create", lambda **arguments: iter(list(chunks())[:-1]))
+    events = list(openai_utils.stream_query_openai(*ARGS, refresh_cache=True))
+    assert [event for event, _ in events] == ["token"] * len(TOKENS) + ["done"]
+    sql_query, response_data = events[-1][1]
+    assert sql_query == SQL
+    assert response_data["usage_missing"] and response_data["total_tokens"] == 0
+    assert response_data["finish_reason"] == openai_utils.finish_reason_dict["stop"]
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from backend import openai_utils, prompt_cache
+from backend.prompt_cache import PromptCacheStats, cached_prompt_tokens
+
+
+def usage(prompt_tokens, cached_tokens=None):
+    details = None if cached_tokens is None else SimpleNamespace(cached_tokens=cached_tokens)
+    return SimpleNamespace(prompt_tokens=prompt_tokens, prompt_tokens_details=details)
+
+
+def test_cached_tokens_default_to_zero_without_details():
+    assert cached_prompt_tokens(usage(2000, 1536)) == 1536
+    assert cached_prompt_tokens(usage(2000)) == 0
+    assert cached_prompt_tokens(SimpleNamespace(prompt_tokens=10, prompt_tokens_details=SimpleNamespace(cached_tokens=None))) == 0
+    assert cached_prompt_tokens(None) == 0
+
+
+def test_hit_rates_per_endpoint():
+    stats = PromptCacheStats()
+    stats.record("/crud", 2000, 0)
+    stats.record("/crud", 2000, 1500)
+    stats.record("/build_team", 100, 0)
+    assert stats.stats() == {
+        "/crud": {"requests": 2, "cached_requests": 1, "prompt_tokens": 4000, "cached_tokens": 1500,
+                  "token_hit_rate": 0.375, "request_hit_rate": 0.5},
+        "/build_team": {"requests": 1, "cached_requests": 0, "prompt_tokens": 100, "cached_tokens": 0,
+                        "token_hit_rate": 0.0, "request_hit_rate": 0.0},
+    }
+
+
+def test_record_prompt_usage_returns_the_cached_tokens(monkeypatch):
+    stats = PromptCacheStats()
+    monkeypatch.setattr(prompt_cache, "_stats", stats)
+    assert prompt_cache.record_prompt_usage("/crud", usage(2048, 1024)) == 1024
+    assert prompt_cache.record_prompt_usage("/crud", None) == 0
+    assert stats.stats()["/crud"]["requests"] == 1
+
+
+def test_query_prompts_on_the_same_tables_share_their_system_prompt(monkeypatch):
+    monkeypatch.setattr(openai_utils, "get_relevant_schema_text", lambda prompt, max_tables: ("employees(...)\n", ["employees"]))
+    monkeypatch.setattr(openai_utils, "full_schema_tokens", lambda schema_hash, model: 100)
+    monkeypatch.setattr(openai_utils, "get_schema_hash", lambda: "h")
+    first, _ = openai_utils.build_query_prompt("Who earns the most?", "gpt-4o-mini")
+    second, _ = openai_utils.build_query_prompt("List the developers", "gpt-4o-mini")
+    # The question goes in the user message: the system prompt is a byte-identical, cacheable prefix
+    assert first == second
+    assert first.startswith(openai_utils.QUERY_INSTRUCTIONS)
+
+
+def test_team_builder_messages_put_the_description_last():
+    messages = openai_utils.team_builder_messages("Build a web shop", "DATA")
+    assert messages[0] == {"role": "system", "content": openai_utils.TEAM_BUILDER_INSTRUCTIONS + "DATA"}
+    assert "Build a web shop" in messages[1]["content"]
@@ -0,0 +1,88 @@
+from database import query_cache
+from database.query_cache import QueryCache, normalize_sql, tables_read, tables_written
+
+
+def test_normalize_sql_keeps_string_literals():
+    assert normalize_sql("SELECT  *\nFROM Employees WHERE name = 'Ann  LEE';") == \
+        "select * from employees where name = 'Ann  LEE'"
+
+
+def test_tables_read_covers_joins_aliases_and_comma_lists():
+    sql_query = """
+        SELECT e.name FROM public.employees e, skills s
+        JOIN "Projects" AS p ON p.id = e.project_id
+        WHERE e.note = 'from fake_table'
+    """
+    assert tables_read(sql_query) == {"employees", "projects", "skills"}
+
+
+def test_tables_written():
+    assert tables_written("INSERT INTO employees (name) VALUES ('x')") == {"employees"}
+    assert tables_written("UPDATE ONLY public.projects SET budget = 1") == {"projects"}
+    assert tables_written("DELETE FROM skills WHERE name = 'update tasks set x = 1'") == {"skills"}
+    assert tables_written("ALTER TABLE employees ADD COLUMN age int") is None
+    assert tables_written("SELECT 1") == set()
+
+
+def test_statements_without_tables_or_with_volatile_functions_are_not_cached():
+    cache = QueryCache()
+    assert cache.make_key("SELECT now()", "h") is None
+    assert cache.make_key("SELECT * FROM employees WHERE hired < current_date", "h") is None
+    assert cache.make_key("SELECT 1", "h") is None
+    assert cache.make_key("SELECT * FROM employees WHERE note = 'now()'", "h") is not None
+
+
+def test_equivalent_statements_share_a_key_per_schema():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM employees;", "h1")
+    assert key == cache.make_key("select *   from EMPLOYEES", "h1")
+    assert key != cache.make_key("SELECT * FROM employees", "h2")
+
+
+def test_writes_evict_only_entries_reading_the_table():
+    cache = QueryCache()
+    employees = cache.make_key("SELECT * FROM employees", "h")
+    projects = cache.make_key("SELECT * FROM projects", "h")
+    cache.put(employees, ["row"], 1)
+    cache.put(projects, ["row"], 1)
+    cache.invalidate_tables({"employees"})
+    assert cache.get(employees) == (False, None)
+    assert cache.get(projects) == (True, ["row"])
+    assert cache.table_version("employees") == 1
+
+
+def test_lru_eviction_and_row_limit():
+    cache = QueryCache(max_entries=2, max_rows=10)
+    keys = [cache.make_key(f"SELECT * FROM t{index}", "h") for index in range(3)]
+    cache.put(keys[0], "a", 1)
+    cache.put(keys[1], "b", 1)
+    cache.get(keys[0])
+    cache.put(keys[2], "c", 1)
+    assert cache.get(keys[1]) == (False, None)
+    assert cache.get(keys[0]) == (True, "a")
+    cache.put(cache.make_key("SELECT * FROM big", "h"), "rows", 11)
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_misses():
+    cache = QueryCache(ttl=-1)
+    key = cache.make_key("SELECT * FROM employees", "h")
+    cache.put(key, "rows", 1)
+    assert cache.get(key) == (False, None)
+    assert cache.stats()["expired"] == 1
+
+
+def test_a_listener_reconnect_clears_the_cache(monkeypatch):
+    cache = QueryCache()
+    monkeypatch.setattr(query_cache, "_query_cache", cache)
+    key = cache.make_key("SELECT * FROM employees", "h")
+    cache.put(key, "rows", 1)
+    query_cache.on_listen()
+    assert cache.get(key) == (False, None)
+
+
+def test_notified_writes_invalidate_the_listed_tables(monkeypatch):
+    cache = QueryCache()
+    monkeypatch.setattr(query_cache, "_query_cache", cache)
+    query_cache.on_table_change("employees,projects")
+    assert cache.table_version("employees") == cache.table_version("projects") == 1
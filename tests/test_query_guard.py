@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+from database import query_guard
+from database.query_guard import describe_estimate, estimate_queries, find_seq_scans, judge
+
+CONFIG = {"confirm_cost": 100, "max_cost": 1000, "confirm_rows": 10, "max_rows": 100,
+          "seq_scan_rows": 50, "dry_run_timeout": 5000}
+
+
+def estimate(**values):
+    base = {"total_cost": 1.0, "estimated_rows": 1, "affected_rows": None, "seq_scans": []}
+    base.update(values)
+    return base
+
+
+def test_seq_scans_are_found_in_nested_plans():
+    plan = {"Node Type": "Hash Join", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "employees", "Plan Rows": 500},
+        {"Node Type": "Hash", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "projects", "Plan Rows": 3}]},
+    ]}
+    assert find_seq_scans(plan) == [("employees", 500), ("projects", 3)]
+
+
+@pytest.mark.parametrize("values, verdict", [
+    ({}, "ok"),
+    ({"total_cost": 500.0}, "confirm"),
+    ({"total_cost": 5000.0}, "reject"),
+    ({"affected_rows": 20}, "confirm"),
+    ({"affected_rows": 200}, "reject"),
+    ({"seq_scans": [("employees", 60), ("projects", 3)]}, "confirm"),
+    ({"error": "canceling statement", "timed_out": True}, "confirm"),
+    ({"error": "relation \"x\" does not exist", "timed_out": False}, "reject"),
+])
+def test_verdicts(values, verdict):
+    assert judge(estimate(**values), CONFIG)["verdict"] == verdict
+
+
+def test_the_worst_threshold_wins_and_every_reason_is_kept():
+    result = judge(estimate(total_cost=500.0, affected_rows=200), CONFIG)
+    assert result["verdict"] == "reject"
+    assert len(result["reasons"]) == 2
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.conn.executed.append(statement)
+        if statement.startswith("EXPLAIN"):
+            query = statement[len("EXPLAIN (FORMAT JSON) "):]
+            if "missing" in query:
+                raise psycopg2.ProgrammingError('relation "missing" does not exist\nLINE 1: ...')
+            self.result = [{"Plan": {"Node Type": "Seq Scan", "Relation Name": "employees",
+                                     "Total Cost": 12.5, "Plan Rows": 40}}]
+        elif statement.startswith("UPDATE"):
+            self.rowcount = 7
+
+    def fetchone(self):
+        return (self.result,)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.rolled_back = False
+        self.read_only = None
+
+    @contextmanager
+    def connect(self, read_only=False):
+        self.read_only = read_only
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_writes_are_dry_run_and_always_rolled_back(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(query_guard, "get_db_connection", conn.connect)
+    report = estimate_queries(["UPDATE employees SET role = 'x'", "SELECT * FROM employees"], CONFIG)
+    update, select = report["queries"]
+    assert (update["method"], update["affected_rows"]) == ("dry_run", 7)
+    assert (select["method"], select["affected_rows"], select["estimated_rows"]) == ("explain", None, 40)
+    assert "UPDATE employees SET role = 'x'" in conn.executed
+    assert conn.rolled_back and conn.read_only is False
+    assert report["verdict"] == "ok"
+
+
+def test_statements_that_cannot_be_planned_are_rejected(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(query_guard, "get_db_connection", conn.connect)
+    report = estimate_queries(["SELECT * FROM missing"], CONFIG)
+    assert report["verdict"] == "reject"
+    assert report["queries"][0]["error"] == 'relation "missing" does not exist'
+    assert "ROLLBACK TO SAVEPOINT guard_stmt_0;" in conn.executed
+    assert conn.read_only is True
+
+
+def test_describe_estimate():
+    report = {"verdict": "reject", "reasons": ["too big"], "queries": [
+        estimate(total_cost=1234.0, affected_rows=5000),
+        estimate(total_cost=2.0, estimated_rows=3),
+        {"error": "syntax error"},
+    ]}
+    assert describe_estimate(report).splitlines() == [
+        "📐 Estimated: cost 1,234, 5,000 rows affected",
+        "📐 Estimated: cost 2, ~3 rows",
+        "⚠️ No estimate: syntax error",
+        "⛔ Rejected: too big",
+    ]
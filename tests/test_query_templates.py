@@ -0,0 +1,66 @@
+import threading
+
+from database import db_pool
+from database.query_templates import TemplateRegistry, QueryTemplate
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.conn.executed.append(statement)
+
+
+class FakeConnection:
+    def __init__(self, pid):
+        self.pid = pid
+        self.executed = []
+
+    def get_backend_pid(self):
+        return self.pid
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def prepare(registry, conn, template):
+    return registry._ensure_prepared(conn, template, registry._render(template))
+
+
+def test_templates_are_prepared_once_per_connection():
+    registry = TemplateRegistry()
+    template = QueryTemplate("viz_roles", "SELECT role FROM employees WHERE role = $1", ("text",))
+    conn = FakeConnection(pid=1)
+    assert prepare(registry, conn, template)
+    assert not prepare(registry, conn, template)
+    assert conn.executed == ["PREPARE tpl_viz_roles (text) AS SELECT role FROM employees WHERE role = $1"]
+    assert registry._render(template).execute_sql == "EXECUTE tpl_viz_roles (%s)"
+
+
+def test_a_new_backend_behind_the_same_connection_object_is_prepared_again():
+    registry = TemplateRegistry()
+    template = QueryTemplate("viz_roles", "SELECT role FROM employees")
+    conn = FakeConnection(pid=1)
+    prepare(registry, conn, template)
+    conn.pid = 2
+    assert prepare(registry, conn, template)
+
+
+def test_discarded_connections_are_forgotten(monkeypatch):
+    registry = TemplateRegistry()
+    monkeypatch.setattr(db_pool, "_close_hooks", [registry.forget])
+    conn = FakeConnection(pid=1)
+    prepare(registry, conn, QueryTemplate("viz_roles", "SELECT role FROM employees"))
+
+    # ConnectionManager._forget runs for every connection the pool closes or replaces
+    manager = db_pool.ConnectionManager.__new__(db_pool.ConnectionManager)
+    manager._lock, manager._created_at, manager._last_used = threading.Lock(), {id(conn): 0.0}, {id(conn): 0.0}
+    manager._forget(conn)
+    assert registry._prepared == {}
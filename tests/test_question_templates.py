@@ -0,0 +1,104 @@
+import pytest
+
+from backend import question_templates
+from backend.question_templates import (
+    QuestionTemplateStore, build_template, fill_template, fixed_words, is_read_only, match_pattern,
+)
+
+QUESTION = "What is the salary of John Doe?"
+SQL = "SELECT salary FROM employees WHERE firstname = 'John' AND lastname = 'Doe';"
+
+
+def template_of(question, sql_query):
+    pattern, sql_template, slots = build_template(question, sql_query)
+    return {"pattern": pattern, "sql": sql_template, "slots": slots}
+
+
+def test_literals_found_in_the_question_become_slots():
+    template = template_of(QUESTION, SQL)
+    assert template["pattern"][:5] == ["what", "is", "the", "salary", "of"]
+    assert template["sql"] == "SELECT salary FROM employees WHERE firstname = '{0}' AND lastname = '{1}';"
+    assert fixed_words(template) == 5
+
+
+def test_sql_without_literals_from_the_question_is_not_templated():
+    assert build_template("How many employees are there?", "SELECT COUNT(*) FROM employees;") is None
+    # A date spelled differently in the question is not a slot
+    assert build_template("Who was hired on March 3rd 2020?",
+                          "SELECT * FROM employees WHERE hire_date = '2020-03-03';") is None
+
+
+def test_a_question_differing_only_in_slot_values_is_filled():
+    template = template_of(QUESTION, SQL)
+    values = match_pattern(template["pattern"], "What is the salary of Jane Smith?")
+    assert values == {0: "Jane", 1: "Smith"}
+    assert fill_template(template, values) == \
+        "SELECT salary FROM employees WHERE firstname = 'Jane' AND lastname = 'Smith';"
+
+
+@pytest.mark.parametrize("question", [
+    "What is not the salary of Jane Smith?",     # added word
+    "What was the salary of Jane Smith?",        # changed word
+    "What is the salary of Jane?",               # missing slot value
+])
+def test_any_change_outside_the_slots_does_not_match(question):
+    assert match_pattern(template_of(QUESTION, SQL)["pattern"], question) is None
+
+
+def test_like_patterns_numbers_and_case_are_kept():
+    template = template_of("Projects with budget above 5000 named like apollo",
+                           "SELECT * FROM projects WHERE budget > 5000 AND proj_name ILIKE '%Apollo%'")
+    values = match_pattern(template["pattern"], "Projects with budget above 120 named like zeus")
+    assert fill_template(template, values) == "SELECT * FROM projects WHERE budget > 120 AND proj_name ILIKE '%Zeus%'"
+    # A number slot only takes numbers
+    values = match_pattern(template["pattern"], "Projects with budget above lots named like zeus")
+    assert fill_template(template, values) is None
+
+
+def test_quotes_in_values_are_escaped():
+    template = template_of("Tasks of Smith", "SELECT * FROM tasks t JOIN employees e USING (employee_id) WHERE lastname = 'Smith'")
+    values = match_pattern(template["pattern"], "Tasks of O'Brien")
+    assert fill_template(template, values).endswith("lastname = 'O''Brien'")
+
+
+def test_only_read_only_sql_is_templated():
+    assert is_read_only("SELECT 1; SELECT 2;")
+    assert not is_read_only("SELECT 1; DELETE FROM employees WHERE lastname = 'Doe'")
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(question_templates, "get_schema_hash", lambda: "h")
+    return QuestionTemplateStore(path=str(tmp_path / "templates.json"), max_templates=2)
+
+
+def test_the_store_learns_and_persists_templates(store):
+    assert store.learn(QUESTION, SQL, {"model": "gpt-4o", "min_prob": 0.9, "avg_prob": 0.95})
+    assert not store.learn("Delete John Doe", "DELETE FROM employees WHERE firstname = 'John' AND lastname = 'Doe'")
+    sql_query, template = QuestionTemplateStore(path=store.path).match("What is the salary of Jane Smith?")
+    assert "'Jane'" in sql_query and template["model"] == "gpt-4o"
+
+
+def test_templates_of_another_schema_are_ignored(store, monkeypatch):
+    store.learn(QUESTION, SQL)
+    monkeypatch.setattr(question_templates, "get_schema_hash", lambda: "h2")
+    assert store.match("What is the salary of Jane Smith?") is None
+
+
+def test_the_most_specific_template_wins(store):
+    store.learn("Salary of Doe", "SELECT salary FROM employees WHERE lastname = 'Doe'")
+    store.learn("Salary of Doe in Sales", "SELECT salary FROM employees WHERE lastname = 'Doe' AND department = 'Sales'")
+    # The first template matches too, with "Smith in Marketing" as its last name
+    sql_query, template = store.match("Salary of Smith in Marketing")
+    assert template["example"] == "Salary of Doe in Sales"
+    assert sql_query.endswith("lastname = 'Smith' AND department = 'Marketing'")
+
+
+def test_least_recently_used_templates_are_dropped(store):
+    store.learn("Salary of Doe", "SELECT salary FROM employees WHERE lastname = 'Doe'")
+    store.learn("Role of Doe", "SELECT role FROM employees WHERE lastname = 'Doe'")
+    store.match("Salary of Smith")
+    store.learn("Email of Doe", "SELECT email FROM employees WHERE lastname = 'Doe'")
+    assert store.match("Role of Smith") is None
+    assert store.match("Salary of Smith") is not None
+    assert store.stats()["templates"] == 2
@@ -0,0 +1,46 @@
+import pytest
+from psycopg2 import errors as pg_errors
+
+from database import quick_viz
+from database.quick_viz import get_viz_data
+
+
+@pytest.fixture
+def templates(monkeypatch):
+    calls = []
+    results = {}
+
+    def run_template(name):
+        calls.append(name)
+        result = results[name]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(quick_viz, "run_template", run_template)
+    return calls, results
+
+
+def test_charts_read_the_materialized_view(templates):
+    calls, results = templates
+    results["qv_employees_per_role"] = [{"role": "Developer", "num_employees": 3, "refreshed_at": "10:00"},
+                                        {"role": "Manager", "num_employees": 1, "refreshed_at": "10:00"}]
+    rows, refreshed_at = get_viz_data("viz_employees_per_role")
+    assert rows == [{"role": "Developer", "num_employees": 3}, {"role": "Manager", "num_employees": 1}]
+    assert refreshed_at == "10:00"
+    assert calls == ["qv_employees_per_role"]
+
+
+def test_live_charts_skip_the_view(templates):
+    calls, results = templates
+    results["viz_employees_per_role"] = [{"role": "Developer", "num_employees": 3}]
+    assert get_viz_data("viz_employees_per_role", live=True) == ([{"role": "Developer", "num_employees": 3}], None)
+    assert calls == ["viz_employees_per_role"]
+
+
+def test_a_missing_view_falls_back_to_the_live_query(templates):
+    calls, results = templates
+    results["qv_project_budgets"] = pg_errors.UndefinedTable()
+    results["viz_project_budgets"] = [{"proj_name": "Apollo", "budget": 10}]
+    assert get_viz_data("viz_project_budgets") == ([{"proj_name": "Apollo", "budget": 10}], None)
+    assert calls == ["qv_project_budgets", "viz_project_budgets"]
@@ -0,0 +1,43 @@
+from database.schema_cache import SchemaCache, SchemaSnapshot, build_schema, hash_schema
+
+ROWS = [
+    ("test_db", "employees", "employee_id", "uuid", True, None, None),
+    ("test_db", "employees", "lastname", "text", False, None, None),
+    ("test_db", "tasks", "task_id", "integer", True, None, None),
+    ("test_db", "tasks", "employee_id", "uuid", False, "employees", "employee_id"),
+]
+
+
+def test_build_schema_groups_columns_keys_and_foreign_keys():
+    schema = build_schema(ROWS)
+    assert schema["employees"] == {
+        "columns": [{"column_name": "employee_id", "data_type": "uuid"}, {"column_name": "lastname", "data_type": "text"}],
+        "primary_key": "employee_id",
+        "primary_key_columns": ["employee_id"],
+        "foreign_keys": [],
+    }
+    assert schema["tasks"]["foreign_keys"] == ["employee_id -> employees.employee_id"]
+
+
+def test_hash_schema_only_changes_with_the_content():
+    assert hash_schema(build_schema(ROWS)) == hash_schema(build_schema(list(ROWS)))
+    changed = ROWS[:-1] + [("test_db", "tasks", "employee_id", "bigint", False, None, None)]
+    assert hash_schema(build_schema(changed)) != hash_schema(build_schema(ROWS))
+
+
+def test_the_snapshot_is_reloaded_after_invalidation_or_expiry(monkeypatch):
+    cache = SchemaCache(ttl=300)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return SchemaSnapshot("test_db", build_schema(ROWS), hash_schema(build_schema(ROWS)), len(loads))
+
+    monkeypatch.setattr(cache, "_load", load)
+    assert cache.get().version == 1
+    assert cache.get().version == 1
+    cache.invalidate()
+    assert cache.get().version == 2
+    cache.ttl = -1
+    cache.get(force_refresh=True)
+    assert cache.get().version == 4
@@ -0,0 +1,43 @@
+from backend import token_utils
+from backend.schema_retriever import SchemaRetriever, tokenize
+from database.schema_cache import SchemaSnapshot, build_schema
+
+ROWS = [
+    ("test_db", "employees", "employee_id", "uuid", True, None, None),
+    ("test_db", "employees", "salary", "numeric", False, None, None),
+    ("test_db", "projects", "proj_id", "integer", True, None, None),
+    ("test_db", "projects", "budget", "numeric", False, None, None),
+    ("test_db", "tasks", "task_id", "integer", True, None, None),
+    ("test_db", "tasks", "employee_id", "uuid", False, "employees", "employee_id"),
+    ("test_db", "tasks", "work_hours", "numeric", False, None, None),
+    ("test_db", "skills", "skill_name", "text", False, None, None),
+]
+
+
+def retriever():
+    schema = build_schema(ROWS)
+    return SchemaRetriever(SchemaSnapshot("test_db", schema, "hash", 1))
+
+
+def test_tokenize_splits_identifiers_strips_plurals_and_expands_synonyms():
+    assert tokenize("work_hours") == ["work", "hour", "hour"]
+    assert tokenize("Which staff earn most?") == ["which", "staff", "employee", "earn", "salary", "most"]
+
+
+def test_retrieve_keeps_the_matching_tables_and_their_referenced_tables():
+    assert retriever().retrieve("total work hours per task") == ["tasks", "employees"]
+    assert retriever().retrieve("what is the budget of each project") == ["projects"]
+
+
+def test_retrieve_falls_back_to_every_table_without_a_match():
+    assert retriever().retrieve("hello there") == ["employees", "projects", "tasks", "skills"]
+
+
+def test_render_marks_keys_and_references():
+    assert retriever().render(["tasks"]) == "tasks(task_id integer PK, employee_id uuid FK->employees.employee_id, work_hours numeric)"
+
+
+def test_count_tokens_without_a_tokenizer_estimates_from_characters(monkeypatch):
+    monkeypatch.setattr(token_utils, "tiktoken", None)
+    assert token_utils.count_tokens("x" * 40) == 10
+    assert token_utils.count_tokens("") == 0
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from database.synthetic_data import SyntheticDataGenerator, TABLE_COLUMNS, LOAD_ORDER, load_synthetic_data, parse_scale
+
+
+def generate(generator, table, chunk_rows=50):
+    return pd.concat(generator.chunks(table, chunk_rows), ignore_index=True)
+
+
+def test_every_table_has_its_row_count_and_columns():
+    generator = SyntheticDataGenerator(120)
+    for table, expected in generator.row_counts().items():
+        df = generate(generator, table)
+        assert len(df) == expected
+        assert list(df.columns) == TABLE_COLUMNS[table]
+        assert df.iloc[:, 0].is_unique
+
+
+def test_foreign_keys_point_at_generated_rows():
+    generator = SyntheticDataGenerator(120)
+    employee_ids = set(generate(generator, "employees")["employee_id"])
+    project_ids = set(generate(generator, "projects")["proj_id"])
+    tasks = generate(generator, "tasks")
+    assert set(tasks["employee_id"]) <= employee_ids
+    assert set(tasks["proj_id"]) <= project_ids
+    assert set(generate(generator, "skills")["employee_id"]) <= employee_ids
+    assert set(generate(generator, "projects")["manager"]) <= employee_ids
+
+
+def test_skills_are_distinct_per_employee():
+    skills = generate(SyntheticDataGenerator(200), "skills")
+    assert not skills.duplicated(["employee_id", "skill_name"]).any()
+
+
+def test_the_same_seed_and_chunk_size_give_the_same_data():
+    first = generate(SyntheticDataGenerator(80, seed=7), "employees")
+    assert first.equals(generate(SyntheticDataGenerator(80, seed=7), "employees"))
+    assert not first.equals(generate(SyntheticDataGenerator(80, seed=8), "employees"))
+
+
+def test_parse_scale():
+    assert parse_scale("10K") == 10000
+    assert parse_scale("2500") == 2500
+    with pytest.raises(ValueError):
+        parse_scale("lots")
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.conn.statements.append(statement)
+
+    def copy_expert(self, statement, buffer):
+        self.conn.copied.append((statement.split()[1], len(buffer.read().splitlines())))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.copied = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_tables_are_copied_in_foreign_key_order_one_transaction_each():
+    conn = FakeConnection()
+    report = load_synthetic_data(conn, 30, reset=True, chunk_rows=40)
+    assert list(report) == LOAD_ORDER
+    assert list(dict.fromkeys(table for table, _ in conn.copied)) == LOAD_ORDER
+    # 30 employees x 6 months of history, in chunks of at most 40 rows
+    assert [rows for table, rows in conn.copied if table == "work_and_vacation"] == [40, 40, 40, 40, 20]
+    assert report["work_and_vacation"]["rows"] == 180
+    assert conn.statements[1].startswith("TRUNCATE work_and_vacation, tasks")
+    assert conn.commits == 1 + len(LOAD_ORDER)
@@ -0,0 +1,97 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pytest
+
+from database import table_stats
+from database.query_cache import QueryCache
+from database.table_stats import TableStatsCache, parse_stats_row
+
+Column = namedtuple("Column", "name")
+
+SCHEMA = {"projects": {"columns": [{"column_name": "proj_name"}, {"column_name": "budget"}, {"column_name": "hours"}]}}
+
+
+def stats_row(**columns):
+    row = {"row_count": 4}
+    for prefix in ("c0_", "c1_"):
+        row.update({prefix + "min": 1, prefix + "max": 9, prefix + "mean": 5.0, prefix + "stddev": 2.5,
+                    prefix + "nulls": 1, prefix + "percentiles": [2.0, 5.0, 8.0],
+                    prefix + "min_label": "Apollo", prefix + "max_label": "Zeus"})
+    row.update(columns)
+    return row
+
+
+def test_one_row_is_split_per_field():
+    statistics = parse_stats_row(stats_row(c1_max=20, c1_nulls=4, c1_percentiles=None), ["budget", "hours"])
+    assert statistics["budget"] == {
+        "count": 3, "null_count": 1, "min": 1, "min_label": "Apollo", "max": 9, "max_label": "Zeus",
+        "mean": 5.0, "stddev": 2.5, "p25": 2.0, "p50": 5.0, "p75": 8.0,
+    }
+    # A field that is NULL everywhere has no percentiles
+    assert statistics["hours"]["count"] == 0
+    assert statistics["hours"]["max"] == 20
+    assert (statistics["hours"]["p25"], statistics["hours"]["p50"], statistics["hours"]["p75"]) == (None, None, None)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = 0
+
+    @contextmanager
+    def connect(self, read_only=False):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = [Column(name) for name in stats_row()]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.conn.queries += 1
+
+    def fetchall(self):
+        return [tuple(stats_row().values())]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    conn = FakeConnection()
+    query_cache = QueryCache()
+    monkeypatch.setattr(table_stats, "get_database_schema", lambda: ("db", SCHEMA))
+    monkeypatch.setattr(table_stats, "get_schema_hash", lambda: "h")
+    monkeypatch.setattr(table_stats, "get_query_cache", lambda: query_cache)
+    monkeypatch.setattr(table_stats, "get_db_connection", conn.connect)
+    monkeypatch.setattr(table_stats, "build_stats_query", lambda table_name, fields: "SELECT ...")
+    return conn, query_cache
+
+
+def test_statistics_are_cached_until_the_table_is_written(database):
+    conn, query_cache = database
+    cache = TableStatsCache()
+    first = cache.get("projects", ["budget", "hours"])
+    assert cache.get("projects", ["budget", "hours"]) is first
+    assert conn.queries == 1
+
+    query_cache.invalidate_tables({"projects"})
+    cache.get("projects", ["budget", "hours"])
+    assert conn.queries == 2
+
+
+def test_unknown_tables_and_columns_are_rejected(database):
+    cache = TableStatsCache()
+    with pytest.raises(ValueError, match="Unknown table"):
+        cache.get("missing", ["budget"])
+    with pytest.raises(ValueError, match="salary"):
+        cache.get("projects", ["budget", "salary"])
+    assert cache.get("projects", []) == {}
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from database.db_utils import BUILD_TEAM_COLUMNS, BUILD_TEAM_HEADER, convert_data_for_llm, convert_data_for_llm_legacy, encode_employees
+
+
+def employees():
+    return pd.DataFrame([
+        ["e1", "Developer", "Ann", "Lee",
+         [{"name": "Python", "level": "Expert", "years": 5}, {"name": "SQL", "level": "Advanced", "years": None}],
+         ["API design", "Code review"]],
+        ["e2", None, "Bob", "Ray", [], []],
+    ], columns=BUILD_TEAM_COLUMNS)
+
+
+def test_each_employee_is_encoded_on_one_line():
+    lines = encode_employees(employees())
+    assert lines["e1"] == "Ann Lee | Developer | Python (Expert, 5y); SQL (Advanced, ?y) | API design; Code review"
+    assert lines["e2"] == "Bob Ray | - | - | No Task"
+
+
+def test_the_compact_format_has_a_header_and_one_line_per_employee():
+    text = convert_data_for_llm(employees())
+    assert text.splitlines()[0] == BUILD_TEAM_HEADER
+    assert len(text.splitlines()) == 3
+
+
+def test_the_compact_format_is_smaller_than_the_legacy_one():
+    df = employees()
+    legacy = convert_data_for_llm_legacy(df)
+    # One legacy block per (skill x validated task) pair, one for employees with neither
+    assert legacy.count("-" * 20) == 5
+    assert len(convert_data_for_llm(df)) < len(legacy)
+
+
+def test_no_employees():
+    assert convert_data_for_llm(pd.DataFrame(columns=BUILD_TEAM_COLUMNS)) == BUILD_TEAM_HEADER + "\n\n"
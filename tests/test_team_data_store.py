@@ -0,0 +1,149 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+from database import team_data_store
+from database.db_utils import BUILD_TEAM_COLUMNS, BUILD_TEAM_HEADER
+from database.team_data_store import TeamDataStore
+
+Column = namedtuple("Column", "name")
+
+
+class FakeDatabase:
+    """Answers the store's queries from an in-memory change log and employee table."""
+
+    def __init__(self):
+        self.changes = []       # (change_id, employee_id)
+        self.employees = {}     # employee_id -> row in BUILD_TEAM_COLUMNS order
+        self.built_for = []     # employee ids asked for by each partial rebuild
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.description = None
+        if statement == team_data_store.WATERMARK_QUERY:
+            self.rows = [(max((change_id for change_id, _ in self.db.changes), default=0),)]
+        elif statement == team_data_store.CHANGES_QUERY:
+            self.rows = [change for change in self.db.changes if change[0] > params[0]]
+        elif statement == team_data_store.BUILD_TEAM_QUERY:
+            self._employees(sorted(self.db.employees))
+        elif statement == team_data_store.BUILD_TEAM_QUERY_FOR_EMPLOYEES:
+            self.db.built_for.append(list(params[0]))
+            self._employees(employee_id for employee_id in params[0] if employee_id in self.db.employees)
+        else:
+            self.rows = []
+
+    def _employees(self, employee_ids):
+        self.description = [Column(name) for name in BUILD_TEAM_COLUMNS]
+        self.rows = [self.db.employees[employee_id] for employee_id in employee_ids]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+def employee(employee_id, firstname, lastname, role="Developer"):
+    return [employee_id, role, firstname, lastname, [], []]
+
+
+def make_store(monkeypatch, db, **kwargs):
+    monkeypatch.setattr(team_data_store, "get_db_connection", db.connection)
+    return TeamDataStore(**kwargs)
+
+
+def lines(snapshot):
+    return snapshot.text.splitlines()[1:]
+
+
+def test_the_first_load_encodes_every_employee_sorted_by_name(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Zoe", "Young"), "e2": employee("e2", "Ann", "Lee")}
+    db.changes = [(1, "e1"), (2, "e2")]
+    snapshot = make_store(monkeypatch, db).get()
+    assert snapshot.text.splitlines()[0] == BUILD_TEAM_HEADER
+    assert lines(snapshot) == ["Ann Lee | Developer | - | No Task", "Zoe Young | Developer | - | No Task"]
+    assert snapshot.watermark == 2
+    assert snapshot.stats["refresh"] == "full"
+
+
+def test_only_changed_employees_are_re_encoded(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Ann", "Lee"), "e2": employee("e2", "Bob", "Ray")}
+    db.changes = [(1, "e1"), (2, "e2")]
+    store = make_store(monkeypatch, db)
+    store.get()
+
+    db.employees["e2"] = employee("e2", "Bob", "Ray", role="Manager")
+    db.employees["e3"] = employee("e3", "Cid", "Moe")
+    db.changes += [(3, "e2"), (4, "e3")]
+    snapshot = store.refresh()
+    assert db.built_for == [["e2", "e3"]]
+    assert snapshot.stats == {"employees": 3, "refresh": "incremental", "changed_employees": 2, "tokens_before": None}
+    assert lines(snapshot) == ["Ann Lee | Developer | - | No Task", "Cid Moe | Developer | - | No Task",
+                               "Bob Ray | Manager | - | No Task"]
+    assert snapshot.watermark == 4
+
+
+def test_employees_no_longer_returned_drop_out(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Ann", "Lee"), "e2": employee("e2", "Bob", "Ray")}
+    db.changes = [(1, "e1")]
+    store = make_store(monkeypatch, db)
+    store.get()
+
+    del db.employees["e2"]
+    db.changes.append((2, "e2"))
+    assert lines(store.refresh()) == ["Ann Lee | Developer | - | No Task"]
+
+
+def test_a_change_committed_late_below_the_watermark_is_still_applied(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Ann", "Lee"), "e2": employee("e2", "Bob", "Ray")}
+    db.changes = [(1, "e1"), (3, "e1")]
+    store = make_store(monkeypatch, db)
+    store.get()
+
+    # Change 2 was drawn before 3 but its transaction committed after the first load
+    db.employees["e2"] = employee("e2", "Bob", "Ray", role="Manager")
+    db.changes.append((2, "e2"))
+    snapshot = store.refresh()
+    assert db.built_for == [["e2"]]
+    assert snapshot.watermark == 3
+    assert "Bob Ray | Manager | - | No Task" in lines(snapshot)
+
+
+def test_changes_already_applied_are_not_applied_again(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Ann", "Lee")}
+    db.changes = [(1, "e1")]
+    store = make_store(monkeypatch, db)
+    first = store.get()
+    assert store.refresh() is first
+    assert db.built_for == []
+
+
+def test_the_token_counter_reports_both_formats(monkeypatch):
+    db = FakeDatabase()
+    db.employees = {"e1": employee("e1", "Ann", "Lee")}
+    snapshot = make_store(monkeypatch, db, token_counter=len).get()
+    assert snapshot.stats["tokens_after"] == len(snapshot.text)
+    assert snapshot.stats["tokens_before"] > 0
@@ -0,0 +1,84 @@
+import pytest
+
+from backend import openai_utils, token_budget
+from backend.token_budget import (model_pricing, estimate_request, within_budget, prompt_tokens_allowed,
+                                  truncate_lines, count_message_tokens)
+from database.team_data_store import TeamDataSnapshot
+
+MODEL = "gpt-4o-mini"
+
+
+def count_characters(text, model=None):
+    return len(text)
+
+
+@pytest.fixture(autouse=True)
+def character_tokens(monkeypatch):
+    # One token per character keeps the arithmetic exact without a tokenizer
+    monkeypatch.setattr(token_budget, "count_tokens", count_characters)
+    monkeypatch.setattr(openai_utils, "count_tokens", count_characters)
+
+
+def test_model_pricing_resolves_aliases_to_the_latest_snapshot():
+    assert model_pricing("gpt-4o-mini") == model_pricing("gpt-4o-mini-2024-07-18")
+    assert model_pricing("gpt-4o") == model_pricing("gpt-4o-2024-08-06")
+    assert model_pricing("unknown-model") is None
+
+
+def test_estimate_request_prices_the_prompt_and_the_full_completion():
+    messages = [{"role": "user", "content": "x" * 997}]
+    estimate = estimate_request(messages, MODEL, 100)
+    assert estimate["prompt_tokens"] == count_message_tokens(messages, MODEL) == 1003
+    assert estimate["cost"] == round((1003 * 0.15 + 100 * 0.60) / 1000000, 6)
+
+
+def test_within_budget_without_a_budget_or_a_price():
+    assert within_budget({"cost": 1.0}, None)
+    assert within_budget({"cost": None}, 0.0)
+    assert not within_budget({"cost": 1.0}, 0.5)
+
+
+def test_prompt_tokens_allowed_leaves_room_for_the_completion():
+    assert prompt_tokens_allowed(MODEL, 100, 0.001) == int((1000 - 60) / 0.15)
+    assert prompt_tokens_allowed(MODEL, 100, 0.0) == 0
+    assert prompt_tokens_allowed(MODEL, 100, None) is None
+
+
+def test_truncate_lines_keeps_the_header_and_the_lines_that_fit():
+    text = "header\nline one\nline two\nline three\n"
+    assert truncate_lines(text, 6 + 9 + 9, MODEL) == ("header\nline one\nline two\n", 2, 1)
+    assert truncate_lines(text, 0, MODEL) == ("header\n", 0, 3)
+
+
+def snapshot(employees):
+    lines = [f"Employee {index:02d} | Developer | Python (Expert, 5y) | No Task" for index in range(employees)]
+    return TeamDataSnapshot(text="Name | Role | Skills | Validated tasks\n" + "\n".join(lines) + "\n", stats={})
+
+
+def budget_for_employees(team_data, employees):
+    """Remaining budget that leaves room for the prompt with `employees` DATA lines."""
+    lines = team_data.text.split("\n")
+    data_text = "\n".join(lines[:employees + 1]) + "\n"
+    messages = openai_utils.team_builder_messages("A small web project", data_text)
+    return estimate_request(messages, MODEL, openai_utils.TEAM_BUILDER_MAX_TOKENS)["cost"] + 0.000001
+
+
+@pytest.mark.parametrize("total, needed", [(1, 1), (4, 1), (5, 2), (20, 5), (40, 10), (500, 10)])
+def test_min_team_data_employees_is_relative_to_small_snapshots(total, needed):
+    assert openai_utils.min_team_data_employees(total) == needed
+
+
+def test_small_snapshots_are_cut_to_the_budget(monkeypatch):
+    team_data = snapshot(6)
+    monkeypatch.setattr(openai_utils.team_data_store, "get", lambda: team_data)
+    messages, _, budget_info = openai_utils.build_team_prompt("A small web project", MODEL, budget_for_employees(team_data, 3))
+    assert messages is not None
+    assert budget_info["data_employees_dropped"] == 3
+
+
+def test_refuses_with_the_real_reason_when_too_few_employees_fit(monkeypatch):
+    team_data = snapshot(40)
+    monkeypatch.setattr(openai_utils.team_data_store, "get", lambda: team_data)
+    messages, _, budget_info = openai_utils.build_team_prompt("A small web project", MODEL, budget_for_employees(team_data, 4))
+    assert messages is None and budget_info["budget_exceeded"]
+    assert "only 4 of the 40 available employees fit" in budget_info["error"]